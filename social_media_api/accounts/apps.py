@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class AccountsConfig(AppConfig):
     name = 'accounts'
+
+    def ready(self):
+        import accounts.signals
+        from django.core import checks
+        from social_media_api.caches import check_shared_cache
+        checks.register(check_shared_cache, checks.Tags.caches)
@@ -0,0 +1,208 @@
+"""
+Authentication classes that resolve the request user from a cache instead of
+the database.
+
+A user snapshot (every concrete column except the password and the follow
+counters) is kept in a small per-worker LRU in front of the shared Django
+cache, and DRF token keys are mapped to user ids the same way. Saving or
+deleting a user and deleting a token clear both layers in this process and
+the shared cache; other workers drop their local copy within
+AUTH_USER_LOCAL_TTL seconds.
+
+The shared layer is only as shared as the default cache. When that is
+process-local, its entries are kept no longer than the local ones, so a
+deactivated user or deleted token is still refused everywhere within
+AUTH_USER_LOCAL_TTL seconds.
+
+Users are rebuilt with Model.from_db, so the omitted fields are ordinary
+deferred fields and load from the database if something reads them.
+"""
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import router
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from social_media_api.caches import is_process_local
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+
+SHARED_TTL = getattr(settings, 'AUTH_USER_CACHE_TTL', 300)
+LOCAL_TTL = getattr(settings, 'AUTH_USER_LOCAL_TTL', 5)
+LOCAL_SIZE = getattr(settings, 'AUTH_USER_LOCAL_SIZE', 10_000)
+REPORT_EVERY = getattr(settings, 'AUTH_USER_CACHE_REPORT_EVERY', 10_000)
+
+# The counters are written with queryset.update(), which sends no post_save,
+# so they are left deferred rather than served stale.
+SNAPSHOT_FIELDS = [
+    field.attname for field in User._meta.concrete_fields
+    if field.attname not in ('password', 'followers_count', 'following_count')
+]
+
+
+def shared_ttl():
+    return min(SHARED_TTL, LOCAL_TTL) if is_process_local() else SHARED_TTL
+
+
+def user_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def token_key(key):
+    return f'auth:token:{key}'
+
+
+class LocalCache:
+    """Thread-safe LRU with a fixed time-to-live per entry."""
+
+    def __init__(self, size=LOCAL_SIZE, ttl=LOCAL_TTL):
+        self.size, self.ttl = size, ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class CacheMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.local_hits = self.shared_hits = self.misses = 0
+
+    def record(self, outcome):
+        with self.lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+            total = self.local_hits + self.shared_hits + self.misses
+        if REPORT_EVERY and total % REPORT_EVERY == 0:
+            logger.info('auth user cache: %s', self.snapshot())
+
+    def snapshot(self):
+        with self.lock:
+            total = self.local_hits + self.shared_hits + self.misses
+            return {
+                'lookups': total,
+                'local_hits': self.local_hits,
+                'shared_hits': self.shared_hits,
+                'misses': self.misses,
+                'hit_rate': (self.local_hits + self.shared_hits) / total if total else 0.0,
+            }
+
+
+local_cache = LocalCache()
+metrics = CacheMetrics()
+
+
+def _cached(key, load):
+    value = local_cache.get(key)
+    if value is not None:
+        metrics.record('local_hits')
+        return value
+    value = cache.get(key)
+    if value is not None:
+        metrics.record('shared_hits')
+    else:
+        metrics.record('misses')
+        value = load()
+        if value is None:
+            return None
+        cache.set(key, value, shared_ttl())
+    local_cache.set(key, value)
+    return value
+
+
+def get_cached_user(user_id):
+    """Return the user with `user_id` from the cache, or None if there is none."""
+    values = _cached(
+        user_key(user_id),
+        lambda: User.objects.filter(pk=user_id).values_list(*SNAPSHOT_FIELDS).first(),
+    )
+    if values is None:
+        return None
+    return User.from_db(router.db_for_read(User), SNAPSHOT_FIELDS, values)
+
+
+def get_cached_token_user_id(key):
+    return _cached(token_key(key), lambda: Token.objects.filter(key=key).values_list('user_id', flat=True).first())
+
+
+def invalidate_user(user_id):
+    local_cache.delete(user_key(user_id))
+    cache.delete(user_key(user_id))
+
+
+def invalidate_token(key):
+    local_cache.delete(token_key(key))
+    cache.delete(token_key(key))
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        # Revocation checks compare against the password hash, which the
+        # snapshot deliberately leaves out.
+        if jwt_settings.CHECK_REVOKE_TOKEN or jwt_settings.USER_ID_FIELD != User._meta.pk.name:
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+
+        user = get_cached_user(user_id)
+        if user is None:
+            raise exceptions.AuthenticationFailed(_('User not found'), code='user_not_found')
+        if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User is inactive'), code='user_inactive')
+        return user
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    def authenticate_credentials(self, key):
+        user_id = get_cached_token_user_id(key)
+        user = get_cached_user(user_id) if user_id is not None else None
+        if user is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+
+        token = Token(key=key, user_id=user_id)
+        token.user = user
+        return (user, token)
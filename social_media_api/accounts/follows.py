@@ -0,0 +1,62 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import m2m_changed
+
+User = get_user_model()
+Follow = User.following.through
+
+BULK_FOLLOW_LIMIT = 100
+
+
+def _lock(user):
+    # Serialize a user's own follow writes so the ids reported to the
+    # m2m_changed receivers (counters, feed, graph) match what was written.
+    User.objects.select_for_update().filter(pk=user.pk).values_list('pk').first()
+
+
+def _send(user, action, pk_set):
+    m2m_changed.send(
+        sender=Follow, instance=user, action=action, reverse=False,
+        model=User, pk_set=pk_set, using=transaction.get_connection().alias,
+    )
+
+
+@transaction.atomic
+def follow_many(user, user_ids):
+    """
+    Follow every existing id in `user_ids`. Returns (followed, missing):
+    the ids newly followed and the ids that are not users.
+    """
+    requested = set(user_ids) - {user.pk}
+    valid = set(User.objects.filter(pk__in=requested).values_list('pk', flat=True))
+    _lock(user)
+    already = set(
+        Follow.objects.filter(from_user_id=user.pk, to_user_id__in=valid).values_list('to_user_id', flat=True)
+    )
+    new = valid - already
+    if new:
+        _send(user, 'pre_add', new)
+        Follow.objects.bulk_create(
+            [Follow(from_user_id=user.pk, to_user_id=user_id) for user_id in new], ignore_conflicts=True
+        )
+        _send(user, 'post_add', new)
+    return new, requested - valid
+
+
+@transaction.atomic
+def unfollow_many(user, user_ids):
+    """Unfollow the given ids; returns the ids that were actually followed."""
+    _lock(user)
+    followed = set(
+        Follow.objects.filter(from_user_id=user.pk, to_user_id__in=set(user_ids)).values_list('to_user_id', flat=True)
+    )
+    if followed:
+        user.following.remove(*followed)
+    return followed
+
+
+def following_status(user, user_ids):
+    followed = set(
+        Follow.objects.filter(from_user_id=user.pk, to_user_id__in=user_ids).values_list('to_user_id', flat=True)
+    )
+    return {user_id: user_id in followed for user_id in user_ids}
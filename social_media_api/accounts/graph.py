@@ -0,0 +1,384 @@
+"""
+Compact in-memory index of the follow graph.
+
+The accounts_user_following through table is loaded into two CSR (compressed
+sparse row) adjacency arrays indexed directly by user id:
+
+    following of u = out_indices[out_indptr[u]:out_indptr[u + 1]]  (sorted)
+    followers of u = in_indices[in_indptr[u]:in_indptr[u + 1]]     (sorted)
+
+Follows and unfollows since the last build are kept in small per-user delta
+sets layered over the arrays, and folded in once they grow past
+COMPACT_THRESHOLD. Arrays and deltas together form an immutable Snapshot that
+each change replaces wholesale, so a query never sees a half-applied one.
+
+Each process holds its own copy and applies the follows it handles itself.
+Follows handled by other processes arrive by reloading: once the copy is
+older than FOLLOW_GRAPH_MAX_AGE, a background thread replaces it with the
+file written by `manage.py rebuild_follow_graph` (FOLLOW_GRAPH_PATH) if that
+is newer, or else with a fresh build from the database, and replays this
+process's own changes made since. Until the first copy is ready, get_graph()
+returns None rather than building it inside a request; only the file is
+loaded inline, as that is a read of a few arrays.
+"""
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+Follow = User.following.through
+
+COMPACT_THRESHOLD = getattr(settings, 'FOLLOW_GRAPH_COMPACT_THRESHOLD', 100_000)
+SUGGESTION_FANOUT = getattr(settings, 'FOLLOW_GRAPH_SUGGESTION_FANOUT', 1000)
+MAX_AGE = getattr(settings, 'FOLLOW_GRAPH_MAX_AGE', 5 * 60)
+EMPTY = np.empty(0, dtype=np.int64)
+
+
+def _csr(sources, targets, size):
+    order = np.lexsort((targets, sources))
+    # int32 neighbour ids halve the footprint until user ids outgrow them.
+    indices = targets[order].astype(np.int32 if size <= 2**31 else np.int64)
+    indptr = np.zeros(size + 1, dtype=np.int64)
+    np.cumsum(np.bincount(sources, minlength=size), out=indptr[1:])
+    return indptr, indices
+
+
+def _with(deltas, key, value):
+    deltas[key] = deltas.get(key, frozenset()) | {value}
+
+
+def _without(deltas, key, value):
+    values = deltas.get(key)
+    if values and value in values:
+        if len(values) > 1:
+            deltas[key] = values - {value}
+        else:
+            del deltas[key]
+
+
+class Snapshot:
+    """
+    The CSR arrays and the deltas layered over them. Never modified once
+    built: FollowGraph swaps in a new one, so a query that holds a snapshot
+    sees one consistent graph however many lookups it makes.
+    """
+
+    def __init__(self, out_indptr, out_indices, in_indptr, in_indices,
+                 added=None, removed=None, added_in=None, removed_in=None, pending=0):
+        self.out_indptr, self.out_indices = out_indptr, out_indices
+        self.in_indptr, self.in_indices = in_indptr, in_indices
+        self.added = added or {}  # follower -> frozenset of followed
+        self.removed = removed or {}
+        self.added_in = added_in or {}  # followed -> frozenset of followers
+        self.removed_in = removed_in or {}
+        self.pending = pending
+
+    @classmethod
+    def from_edges(cls, sources, targets):
+        sources = np.asarray(sources, dtype=np.int64)
+        targets = np.asarray(targets, dtype=np.int64)
+        size = int(max(sources.max(initial=-1), targets.max(initial=-1))) + 1
+        out_indptr, out_indices = _csr(sources, targets, size)
+        in_indptr, in_indices = _csr(targets, sources, size)
+        return cls(out_indptr, out_indices, in_indptr, in_indices)
+
+    def applied(self, follower_ids, followed_ids, delta):
+        """A snapshot with follow (delta=1) or unfollow (delta=-1) edges recorded."""
+        # Shallow copies: only the touched users' sets are replaced.
+        added, removed = dict(self.added), dict(self.removed)
+        added_in, removed_in = dict(self.added_in), dict(self.removed_in)
+        pending = self.pending
+        for follower_id, followed_id in zip(follower_ids, followed_ids):
+            if delta > 0:
+                _without(removed, follower_id, followed_id)
+                _without(removed_in, followed_id, follower_id)
+                _with(added, follower_id, followed_id)
+                _with(added_in, followed_id, follower_id)
+            else:
+                _without(added, follower_id, followed_id)
+                _without(added_in, followed_id, follower_id)
+                _with(removed, follower_id, followed_id)
+                _with(removed_in, followed_id, follower_id)
+            pending += 1
+        return Snapshot(self.out_indptr, self.out_indices, self.in_indptr, self.in_indices,
+                        added, removed, added_in, removed_in, pending)
+
+    def compacted(self):
+        """A snapshot with the deltas folded into the arrays."""
+        if not self.pending:
+            return self
+        size = len(self.out_indptr) - 1
+        sources = np.repeat(np.arange(size, dtype=np.int64), np.diff(self.out_indptr))
+        targets = self.out_indices
+        removed = [(u, v) for u, vs in self.removed.items() for v in vs]
+        if removed:
+            drop = np.array(removed, dtype=np.int64)
+            keys = sources * (1 << 32) + targets
+            keep = ~np.isin(keys, drop[:, 0] * (1 << 32) + drop[:, 1])
+            sources, targets = sources[keep], targets[keep]
+        added = [(u, v) for u, vs in self.added.items() for v in vs]
+        if added:
+            # Changes replayed after a reload may already be in the arrays.
+            extra = np.array(added, dtype=np.int64)
+            keys = np.unique(np.concatenate([sources * (1 << 32) + targets, extra[:, 0] * (1 << 32) + extra[:, 1]]))
+            sources, targets = keys >> 32, keys & ((1 << 32) - 1)
+        return Snapshot.from_edges(sources, targets)
+
+    # -- queries -------------------------------------------------------
+
+    def _row(self, indptr, indices, user_id, added, removed):
+        row = indices[indptr[user_id]:indptr[user_id + 1]] if 0 <= user_id < len(indptr) - 1 else EMPTY
+        if removed.get(user_id):
+            row = row[~np.isin(row, list(removed[user_id]))]
+        if added.get(user_id):
+            row = np.union1d(row, np.fromiter(added[user_id], dtype=np.int64))
+        return row
+
+    def following(self, user_id):
+        return self._row(self.out_indptr, self.out_indices, user_id, self.added, self.removed)
+
+    def followers(self, user_id):
+        return self._row(self.in_indptr, self.in_indices, user_id, self.added_in, self.removed_in)
+
+    def is_following(self, user_id, other_id):
+        if other_id in self.added.get(user_id, ()):
+            return True
+        if other_id in self.removed.get(user_id, ()) or not 0 <= user_id < len(self.out_indptr) - 1:
+            return False
+        row = self.out_indices[self.out_indptr[user_id]:self.out_indptr[user_id + 1]]
+        position = np.searchsorted(row, other_id)
+        return bool(position < len(row) and row[position] == other_id)
+
+    def suggestions(self, user_id, limit, fanout):
+        followed = self.following(user_id)
+        if not len(followed):
+            return []
+        candidates = np.concatenate([self.following(int(f)) for f in followed[:fanout]])
+        candidates = candidates[~np.isin(candidates, followed)]
+        candidates = candidates[candidates != user_id]
+        if not len(candidates):
+            return []
+        ids, counts = np.unique(candidates, return_counts=True)
+        top = np.lexsort((ids, -counts))[:limit]
+        return [(int(ids[i]), int(counts[i])) for i in top]
+
+
+class FollowGraph:
+    """
+    The current Snapshot. Writers build the next snapshot under `lock` and
+    publish it with a single assignment; readers take one reference to
+    `snapshot` and never lock. `built_at` is when the edges were read from
+    the database: every follow committed before then is in the arrays.
+    """
+
+    def __init__(self, snapshot, built_at=None):
+        self.snapshot = snapshot
+        self.built_at = time.time() if built_at is None else built_at
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_edges(cls, sources, targets, built_at=None):
+        return cls(Snapshot.from_edges(sources, targets), built_at)
+
+    @classmethod
+    def from_database(cls, chunk_size=100_000):
+        built_at = time.time()
+        edges = Follow.objects.order_by().values_list('from_user_id', 'to_user_id')
+        sources, targets = [], []
+        batch = []
+        for edge in edges.iterator(chunk_size=chunk_size):
+            batch.append(edge)
+            if len(batch) >= chunk_size:
+                array = np.array(batch, dtype=np.int64)
+                sources.append(array[:, 0])
+                targets.append(array[:, 1])
+                batch = []
+        if batch:
+            array = np.array(batch, dtype=np.int64)
+            sources.append(array[:, 0])
+            targets.append(array[:, 1])
+        return cls.from_edges(np.concatenate(sources or [EMPTY]), np.concatenate(targets or [EMPTY]), built_at)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            snapshot = Snapshot(data['out_indptr'], data['out_indices'], data['in_indptr'], data['in_indices'])
+            # Files written before built_at was stored date from their mtime.
+            built_at = float(data['built_at']) if 'built_at' in data.files else os.path.getmtime(path)
+            return cls(snapshot, built_at)
+
+    def save(self, path):
+        with self.lock:
+            self.snapshot = snapshot = self.snapshot.compacted()
+        # Written through a file object, as np.savez appends .npz to bare
+        # names, and renamed into place so readers never see half a file.
+        path = Path(path)
+        partial = path.with_name(f'.{path.name}.partial')
+        with open(partial, 'wb') as output:
+            np.savez(output, out_indptr=snapshot.out_indptr, out_indices=snapshot.out_indices,
+                     in_indptr=snapshot.in_indptr, in_indices=snapshot.in_indices, built_at=self.built_at)
+        os.replace(partial, path)
+
+    @property
+    def nbytes(self):
+        snapshot = self.snapshot
+        return sum(array.nbytes for array in (
+            snapshot.out_indptr, snapshot.out_indices, snapshot.in_indptr, snapshot.in_indices
+        ))
+
+    @property
+    def edge_count(self):
+        return len(self.snapshot.out_indices)
+
+    # -- deltas --------------------------------------------------------
+
+    def apply(self, follower_ids, followed_ids, delta):
+        """Record follow (delta=1) or unfollow (delta=-1) edges."""
+        with self.lock:
+            snapshot = self.snapshot.applied(follower_ids, followed_ids, delta)
+            if snapshot.pending >= COMPACT_THRESHOLD:
+                snapshot = snapshot.compacted()
+            self.snapshot = snapshot
+
+    # -- queries -------------------------------------------------------
+
+    def following(self, user_id):
+        return self.snapshot.following(user_id)
+
+    def followers(self, user_id):
+        return self.snapshot.followers(user_id)
+
+    def is_following(self, user_id, other_id):
+        return self.snapshot.is_following(user_id, other_id)
+
+    def following_status(self, user_id, other_ids):
+        """Vectorized is_following for many ids; returns a boolean array."""
+        return np.isin(np.asarray(other_ids, dtype=np.int64), self.snapshot.following(user_id), assume_unique=False)
+
+    def mutual_followers(self, viewer_id, user_id):
+        """People the viewer follows who also follow `user_id`."""
+        snapshot = self.snapshot
+        return np.intersect1d(snapshot.following(viewer_id), snapshot.followers(user_id), assume_unique=True)
+
+    def suggestions(self, user_id, limit=20, fanout=SUGGESTION_FANOUT):
+        """
+        Friend-of-friend suggestions ranked by how many of the user's
+        followees follow them. Returns [(user_id, mutual_count), ...].
+        """
+        return self.snapshot.suggestions(user_id, limit, fanout)
+
+
+_graph = None
+_graph_lock = threading.Lock()
+_reloading = False
+_checked_at = 0.0
+_loaded_mtime = None
+# This process's own changes, replayed onto each reloaded graph: [(time, follower_ids, followed_ids, delta)].
+_recent = []
+
+
+def graph_path():
+    path = getattr(settings, 'FOLLOW_GRAPH_PATH', None)
+    return Path(path) if path else None
+
+
+def _file_mtime(path):
+    try:
+        return path.stat().st_mtime if path else None
+    except FileNotFoundError:
+        return None
+
+
+def _install(graph, mtime=None):
+    """Make `graph` current, with this process's changes since it was built. Call under _graph_lock."""
+    global _graph, _loaded_mtime, _recent
+    _recent = [change for change in _recent if change[0] >= graph.built_at]
+    for _, follower_ids, followed_ids, delta in _recent:
+        graph.apply(follower_ids, followed_ids, delta)
+    _graph = graph
+    if mtime is not None:
+        _loaded_mtime = mtime
+
+
+def refresh_graph():
+    """Replace the graph with the snapshot file if that changed and is newer, else with a database build."""
+    global _reloading
+    try:
+        path = graph_path()
+        mtime = _file_mtime(path)
+        graph = None
+        if mtime is not None and mtime != _loaded_mtime:
+            graph = FollowGraph.load(path)
+            if _graph is not None and graph.built_at <= _graph.built_at:
+                graph = None
+        if graph is None and (_graph is None or time.time() - _graph.built_at > MAX_AGE):
+            graph = FollowGraph.from_database()
+            mtime = None
+        if graph is not None:
+            with _graph_lock:
+                _install(graph, mtime)
+    except Exception:
+        logger.exception("Follow graph reload failed")
+    finally:
+        _reloading = False
+
+
+def _reload_in_background():
+    def run():
+        try:
+            refresh_graph()
+        finally:
+            connection.close()
+
+    threading.Thread(target=run, name='follow-graph-reload', daemon=True).start()
+
+
+def get_graph():
+    """
+    The process's follow graph, or None while the first copy is built in
+    the background. A copy older than MAX_AGE keeps serving while a fresher
+    one is loaded.
+    """
+    global _reloading, _checked_at
+    graph = _graph
+    if graph is not None and (time.time() - graph.built_at <= MAX_AGE or time.monotonic() - _checked_at < MAX_AGE):
+        return graph
+    with _graph_lock:
+        if _reloading:
+            return _graph
+        if _graph is None:
+            path = graph_path()
+            mtime = _file_mtime(path)
+            if mtime is not None:
+                _install(FollowGraph.load(path), mtime)
+                if time.time() - _graph.built_at <= MAX_AGE:
+                    return _graph
+        _checked_at = time.monotonic()
+        _reloading = True
+    _reload_in_background()
+    return _graph
+
+
+def set_graph(graph):
+    global _graph
+    _graph = graph
+
+
+def record_follow_change(follower_ids, followed_ids, delta):
+    # Only keep a graph current if this process has loaded one or is loading it.
+    with _graph_lock:
+        if _graph is None and not _reloading:
+            return
+        _recent.append((time.time(), follower_ids, followed_ids, delta))
+        graph = _graph
+    if graph is not None:
+        graph.apply(follower_ids, followed_ids, delta)
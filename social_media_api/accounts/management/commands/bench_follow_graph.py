@@ -0,0 +1,60 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from accounts.graph import FollowGraph
+
+
+def percentile(samples, q):
+    return float(np.percentile(samples, q)) * 1e6
+
+
+class Command(BaseCommand):
+    help = "Measure follow graph index memory and query latency on a synthetic power-law graph."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--edges', type=int, default=20_000_000)
+        parser.add_argument('--exponent', type=float, default=2.1, help="Zipf exponent for followee popularity.")
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        users, edges = options['users'], options['edges']
+
+        began = time.perf_counter()
+        # Followers are uniform, followees are drawn from a heavy-tailed
+        # popularity ranking so a few accounts collect most follows.
+        sources = rng.integers(1, users, size=edges, dtype=np.int64)
+        ranks = rng.zipf(options['exponent'], size=edges) % (users - 1)
+        targets = rng.permutation(np.arange(1, users, dtype=np.int64))[ranks]
+        keep = sources != targets
+        keys = np.unique(sources[keep] * (1 << 32) + targets[keep])
+        sources, targets = keys >> 32, keys & ((1 << 32) - 1)
+        generated = time.perf_counter() - began
+
+        began = time.perf_counter()
+        graph = FollowGraph.from_edges(sources, targets)
+        built = time.perf_counter() - began
+        self.stdout.write(
+            f"{graph.edge_count} edges, {users} users: generated in {generated:.1f}s, "
+            f"built in {built:.1f}s, {graph.nbytes / 2**20:.1f} MiB"
+        )
+
+        viewers = rng.integers(1, users, size=options['queries'])
+        others = rng.integers(1, users, size=options['queries'])
+        queries = {
+            'is_following': lambda a, b: graph.is_following(int(a), int(b)),
+            'mutual_followers': lambda a, b: graph.mutual_followers(int(a), int(b)),
+            'suggestions': lambda a, b: graph.suggestions(int(a), limit=20),
+        }
+        self.stdout.write(f"{'query':<18}{'p50 us':>10}{'p99 us':>10}")
+        for name, query in queries.items():
+            samples = []
+            for a, b in zip(viewers, others):
+                began = time.perf_counter()
+                query(a, b)
+                samples.append(time.perf_counter() - began)
+            self.stdout.write(f"{name:<18}{percentile(samples, 50):>10.1f}{percentile(samples, 99):>10.1f}")
@@ -0,0 +1,154 @@
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import nullcontext
+from itertools import islice
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.authtoken.models import Token
+
+User = get_user_model()
+
+FIELDS = ('username', 'email', 'first_name', 'last_name', 'bio')
+
+
+def _init_worker():
+    # Needed when the pool spawns rather than forks its workers.
+    django.setup()
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+    else:
+        for line in stream:
+            if line.strip():
+                yield json.loads(line)
+
+
+def batched(rows, size):
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Import users (and an API token each) from CSV or JSON Lines. Passwords are "
+        "hashed in a process pool while the previous batch is being inserted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or .jsonl file, or - for stdin.")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="Defaults to the file extension.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--workers', type=int, default=os.cpu_count())
+        parser.add_argument(
+            '--hashed', action='store_true',
+            help="The password column already holds Django password hashes; store it unchanged.",
+        )
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if path.endswith(('.jsonl', '.ndjson')) else 'csv')
+        if path == '-' and not options['format']:
+            raise CommandError("Pass --format when reading from stdin.")
+        self.totals = {'created': 0, 'skipped': 0, 'invalid': 0}
+        self.row_number = 0
+        self.began = time.perf_counter()
+
+        stream = sys.stdin if path == '-' else open(path, newline='', encoding='utf-8')
+        # Pre-hashed passwords need no hashing, so no pool either.
+        if options['hashed']:
+            pool = nullcontext()
+        else:
+            pool = ProcessPoolExecutor(options['workers'], initializer=_init_worker)
+        try:
+            with pool:
+                self.run(read_rows(stream, fmt), pool, options)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+
+        elapsed = time.perf_counter() - self.began
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {self.totals['created']} users, skipped {self.totals['skipped']} existing, "
+            f"{self.totals['invalid']} invalid rows in {elapsed:.1f}s "
+            f"({self.totals['created'] / elapsed if elapsed else 0:.0f} rows/s)."
+        ))
+
+    def run(self, rows, pool, options):
+        workers = options['workers'] or 1
+        previous = None
+        for batch in batched(rows, options['batch_size']):
+            batch = self.clean(batch, options['hashed'])
+            passwords = [row['password'] for row in batch]
+            if options['hashed']:
+                hashes = iter(passwords)
+            else:
+                chunksize = max(1, len(passwords) // (workers * 4))
+                hashes = pool.map(make_password, passwords, chunksize=chunksize)
+            # Hashing for this batch runs in the pool while the last one is written.
+            if previous:
+                self.write(*previous)
+            previous = (batch, hashes)
+        if previous:
+            self.write(*previous)
+
+    def clean(self, batch, hashed):
+        # Checked against the model fields here, since a single bad value
+        # would otherwise abort the whole batch's insert and the run with it.
+        rows, seen = [], set()
+        for row in batch:
+            self.row_number += 1
+            values = {field: row.get(field) or '' for field in FIELDS}
+            values['username'] = values['username'].strip()
+            values['email'] = User.objects.normalize_email(values['email'])
+            values['password'] = row.get('password') or None
+            checked = [*FIELDS, 'password'] if hashed and values['password'] else FIELDS
+            try:
+                for field in checked:
+                    User._meta.get_field(field).clean(values[field], None)
+            except ValidationError as error:
+                self.reject(f"{field}: {' '.join(error.messages)}")
+                continue
+            if values['username'] in seen:
+                self.reject(f"username {values['username']!r} repeats an earlier row")
+                continue
+            seen.add(values['username'])
+            rows.append(values)
+        return rows
+
+    def reject(self, reason):
+        self.totals['invalid'] += 1
+        self.stderr.write(f"Skipping row {self.row_number}: {reason}")
+
+    def write(self, batch, hashes):
+        hashes = list(hashes)
+        with transaction.atomic():
+            existing = set(
+                User.objects.filter(username__in=[row['username'] for row in batch]).values_list('username', flat=True)
+            )
+            users = [
+                User(password=password or make_password(None), **{field: row[field] for field in FIELDS})
+                for row, password in zip(batch, hashes)
+                if row['username'] not in existing
+            ]
+            users = User.objects.bulk_create(users)
+            Token.objects.bulk_create([Token(key=Token.generate_key(), user=user) for user in users])
+
+        self.totals['created'] += len(users)
+        self.totals['skipped'] += len(existing)
+        elapsed = time.perf_counter() - self.began
+        self.stdout.write(
+            f"{self.totals['created']} created, {self.totals['skipped']} skipped, "
+            f"{self.totals['created'] / elapsed:.0f} rows/s"
+        )
@@ -0,0 +1,63 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+User = get_user_model()
+Follow = User.following.through
+
+
+def edge_count(column):
+    counts = (
+        Follow.objects.filter(**{column: OuterRef('pk')})
+        .order_by()
+        .values(column)
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return Coalesce(Subquery(counts), Value(0))
+
+
+class Command(BaseCommand):
+    help = "Repair drift in User.followers_count and User.following_count, one primary-key chunk at a time."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0, help="Seconds to pause between chunks.")
+
+    def handle(self, *args, **options):
+        last_pk, scanned, repaired = 0, 0, 0
+
+        while True:
+            pks = list(
+                User.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:options['chunk_size']]
+            )
+            if not pks:
+                break
+            lo, hi = pks[0], pks[-1]
+            last_pk = hi
+            scanned += len(pks)
+
+            with transaction.atomic():
+                drifted = [
+                    row['pk'] for row in
+                    User.objects.filter(pk__gte=lo, pk__lte=hi)
+                    .annotate(actual_followers=edge_count('to_user'), actual_following=edge_count('from_user'))
+                    .values('pk', 'followers_count', 'following_count', 'actual_followers', 'actual_following')
+                    if row['followers_count'] != row['actual_followers']
+                    or row['following_count'] != row['actual_following']
+                ]
+                if drifted:
+                    User.objects.filter(pk__in=drifted).update(
+                        followers_count=edge_count('to_user'),
+                        following_count=edge_count('from_user'),
+                    )
+                    repaired += len(drifted)
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        self.stdout.write(self.style.SUCCESS(f"Scanned {scanned} users, repaired {repaired}."))
@@ -0,0 +1,23 @@
+# Generated by Django 6.0.1 on 2026-10-18 17:05
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0003_user_follow_counts'),
+    ]
+
+    # The auto-created through model has no Meta to declare these on. They
+    # back the newest-first keyset scans of the follower/following lists.
+    operations = [
+        migrations.RunSQL(
+            'CREATE INDEX accounts_follow_followers_idx ON accounts_user_following (to_user_id, id)',
+            'DROP INDEX accounts_follow_followers_idx',
+        ),
+        migrations.RunSQL(
+            'CREATE INDEX accounts_follow_following_idx ON accounts_user_following (from_user_id, id)',
+            'DROP INDEX accounts_follow_following_idx',
+        ),
+    ]
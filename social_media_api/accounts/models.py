@@ -18,5 +18,10 @@ class User(AbstractUser):
         blank=True
     )
 
+    # Denormalized sizes of the follow graph, maintained by the m2m_changed
+    # handlers in accounts.signals; `manage.py reconcile_follow_counts` repairs drift.
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+
     def __str__(self):
         return self.username
\ No newline at end of file
@@ -0,0 +1,8 @@
+from social_media_api.pagination import KeysetPagination
+
+
+class FollowListPagination(KeysetPagination):
+    page_size = 50
+    max_page_size = 200
+    ordering = ('-id',)
+    ordering_types = (int,)
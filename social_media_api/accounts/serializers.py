@@ -1,6 +1,7 @@
 from django.contrib.auth import get_user_model, authenticate
 from rest_framework import serializers
-from rest_framework.authtoken.models import Token
+
+from .follows import BULK_FOLLOW_LIMIT
 
 
 User = get_user_model()
@@ -20,22 +21,14 @@ class RegisterSerializer(serializers.ModelSerializer):
         ]
 
     def create(self, validated_data):
-        user = get_user_model().objects.create_user(
+        return get_user_model().objects.create_user(
             username=validated_data['username'],
             email=validated_data.get('email'),
-            password=validated_data['password']
+            password=validated_data['password'],
+            bio=validated_data.get('bio', ''),
+            profile_picture=validated_data.get('profile_picture'),
         )
 
-        # Extra profile fields
-        user.bio = validated_data.get('bio', '')
-        user.profile_picture = validated_data.get('profile_picture')
-        user.save()
-
-        # Create authentication token
-        Token.objects.create(user=user)
-
-        return user
-
 
 class LoginSerializer(serializers.Serializer):
     username = serializers.CharField()
@@ -61,19 +54,30 @@ class ProfileSerializer(serializers.ModelSerializer):
             'email',
             'bio',
             'profile_picture',
-            'followers'
+            'followers_count',
+            'following_count',
         ]
+        read_only_fields = ['followers_count', 'following_count']
 
 class FollowSerializer(serializers.ModelSerializer):
-    followers_count = serializers.SerializerMethodField()
-    following_count = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ['id', 'username', 'followers_count', 'following_count']
+        read_only_fields = ['followers_count', 'following_count']
+
+
+class SuggestionSerializer(FollowSerializer):
+    mutual_count = serializers.SerializerMethodField()
+
+    class Meta(FollowSerializer.Meta):
+        fields = FollowSerializer.Meta.fields + ['mutual_count']
+
+    def get_mutual_count(self, obj):
+        return self.context['mutual_counts'][obj.pk]
 
-    def get_followers_count(self, obj):
-        return obj.followers.count()
 
-    def get_following_count(self, obj):
-        return obj.following.count()
\ No newline at end of file
+class BulkFollowSerializer(serializers.Serializer):
+    user_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=BULK_FOLLOW_LIMIT
+    )
@@ -0,0 +1,92 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed, post_save, post_delete
+from django.dispatch import receiver
+from django.contrib.auth import get_user_model
+from rest_framework.authtoken.models import Token
+
+from .authentication import invalidate_user, invalidate_token
+from .graph import record_follow_change
+
+User = get_user_model()
+Follow = User.following.through
+
+
+def apply_follow_counts(follower_ids, followed_ids, delta):
+    """
+    Adjust counters for follow edges that were just added (delta=1) or removed
+    (delta=-1). `follower_ids` and `followed_ids` list one id per edge side,
+    so a user appearing n times is adjusted by n.
+    """
+    for field, ids in (('following_count', follower_ids), ('followers_count', followed_ids)):
+        per_user = {}
+        for user_id in ids:
+            per_user[user_id] = per_user.get(user_id, 0) + delta
+        by_amount = {}
+        for user_id, amount in per_user.items():
+            by_amount.setdefault(amount, []).append(user_id)
+        for amount, user_ids in by_amount.items():
+            users = User.objects.filter(pk__in=user_ids)
+            if amount < 0:
+                users = users.filter(**{f'{field}__gte': -amount})
+            users.update(**{field: F(field) + amount})
+
+
+def _edges(instance, reverse, other_ids):
+    # reverse=False: instance follows other_ids; reverse=True: other_ids follow instance.
+    if reverse:
+        return list(other_ids), [instance.pk] * len(other_ids)
+    return [instance.pk] * len(other_ids), list(other_ids)
+
+
+def _existing(instance, reverse, pk_set=None):
+    if reverse:
+        edges = Follow.objects.filter(to_user_id=instance.pk)
+        column = 'from_user_id'
+    else:
+        edges = Follow.objects.filter(from_user_id=instance.pk)
+        column = 'to_user_id'
+    if pk_set is not None:
+        edges = edges.filter(**{f'{column}__in': pk_set})
+    return set(edges.values_list(column, flat=True))
+
+
+@receiver(m2m_changed, sender=Follow)
+def maintain_follow_counts(sender, instance, action, reverse, pk_set, **kwargs):
+    # post_add only reports edges that were actually inserted, but remove and
+    # clear report what was asked for, so those capture the real edges first.
+    if action in ('pre_remove', 'pre_clear'):
+        instance._removed_follow_ids = _existing(instance, reverse, pk_set if action == 'pre_remove' else None)
+        return
+
+    if action == 'post_add':
+        changed, delta = pk_set, 1
+    elif action in ('post_remove', 'post_clear'):
+        changed, delta = instance.__dict__.pop('_removed_follow_ids', set()), -1
+    else:
+        return
+    if not changed:
+        return
+
+    follower_ids, followed_ids = _edges(instance, reverse, changed)
+    apply_follow_counts(follower_ids, followed_ids, delta)
+    transaction.on_commit(lambda: record_follow_change(follower_ids, followed_ids, delta))
+
+    # Keep the in-memory instance in step so a later save() does not write a stale value.
+    field = 'followers_count' if reverse else 'following_count'
+    setattr(instance, field, max(0, getattr(instance, field) + delta * len(changed)))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    # Covers password changes too, since set_password() is followed by save().
+    # Cleared again after commit so a concurrent request cannot re-cache the old row.
+    invalidate_user(instance.pk)
+    transaction.on_commit(lambda: invalidate_user(instance.pk))
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_cached_token(sender, instance, **kwargs):
+    invalidate_token(instance.key)
+    transaction.on_commit(lambda: invalidate_token(instance.key))
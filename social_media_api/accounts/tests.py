@@ -1,3 +1,332 @@
-from django.test import TestCase
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from . import authentication, graph
+from .follows import BULK_FOLLOW_LIMIT
+
+User = get_user_model()
+
+
+class AccountsTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        authentication.local_cache.clear()
+
+
+class FollowTestCase(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='user')
+        self.others = [User.objects.create_user(username=f'other{i}') for i in range(4)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertCounts(self, user, followers, following):
+        user.refresh_from_db()
+        self.assertEqual((user.followers_count, user.following_count), (followers, following))
+        self.assertEqual((user.followers.count(), user.following.count()), (followers, following))
+
+
+class FollowCountTests(FollowTestCase):
+    def test_follow_and_unfollow_endpoints(self):
+        target = self.others[0]
+        self.client.post(f'/api/accounts/follow/{target.pk}/')
+        self.client.post(f'/api/accounts/follow/{target.pk}/')
+        self.assertCounts(self.user, 0, 1)
+        self.assertCounts(target, 1, 0)
+        self.client.post(f'/api/accounts/unfollow/{target.pk}/')
+        self.client.post(f'/api/accounts/unfollow/{target.pk}/')
+        self.assertCounts(self.user, 0, 0)
+        self.assertCounts(target, 0, 0)
+
+    def test_reverse_side_and_clear(self):
+        self.others[0].followers.add(self.user, self.others[1])
+        self.assertCounts(self.others[0], 2, 0)
+        self.assertCounts(self.user, 0, 1)
+        self.others[0].followers.clear()
+        self.assertCounts(self.others[0], 0, 0)
+        self.assertCounts(self.user, 0, 0)
+        self.assertCounts(self.others[1], 0, 0)
+
+    def test_reconcile_repairs_drift(self):
+        self.user.following.add(*self.others[:2])
+        User.objects.filter(pk=self.user.pk).update(following_count=9, followers_count=3)
+        call_command('reconcile_follow_counts', stdout=io.StringIO())
+        self.assertCounts(self.user, 0, 2)
+
+
+class BulkFollowTests(FollowTestCase):
+    def test_bulk_follow_reports_new_and_missing_ids(self):
+        self.user.following.add(self.others[0])
+        ids = [other.pk for other in self.others] + [self.user.pk, 10**9]
+        response = self.client.post('/api/accounts/follow/bulk/', {'user_ids': ids}, format='json')
+        self.assertEqual(response.json(), {
+            'followed': sorted(other.pk for other in self.others[1:]),
+            'missing': [10**9],
+        })
+        self.assertCounts(self.user, 0, len(self.others))
+        for other in self.others:
+            self.assertCounts(other, 1, 0)
+
+    def test_bulk_unfollow_reports_what_was_followed(self):
+        self.user.following.add(*self.others[:2])
+        ids = [other.pk for other in self.others]
+        response = self.client.post('/api/accounts/unfollow/bulk/', {'user_ids': ids}, format='json')
+        self.assertEqual(response.json(), {'unfollowed': sorted(other.pk for other in self.others[:2])})
+        self.assertCounts(self.user, 0, 0)
+
+    def test_follow_status(self):
+        self.user.following.add(self.others[1])
+        ids = ','.join(str(other.pk) for other in self.others[:2])
+        response = self.client.get('/api/accounts/follow-status/', {'ids': ids})
+        self.assertEqual(response.json(), {str(self.others[0].pk): False, str(self.others[1].pk): True})
+        self.assertEqual(self.client.get('/api/accounts/follow-status/', {'ids': 'x'}).status_code, 400)
+
+    def test_request_size_is_limited(self):
+        ids = list(range(1, BULK_FOLLOW_LIMIT + 2))
+        self.assertEqual(self.client.post('/api/accounts/follow/bulk/', {'user_ids': ids}, format='json').status_code, 400)
+        response = self.client.get('/api/accounts/follow-status/', {'ids': ','.join(map(str, ids))})
+        self.assertEqual(response.status_code, 400)
+
+
+class FollowListTests(FollowTestCase):
+    def setUp(self):
+        super().setUp()
+        for other in self.others:
+            other.following.add(self.user)
+
+    def collect(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += response.json()['results']
+            url = response.json()['next']
+        return seen
+
+    def test_pages_list_newest_follow_first(self):
+        ids = self.collect(f'/api/accounts/users/{self.user.pk}/followers/?page_size=3')
+        self.assertEqual(ids, [other.pk for other in reversed(self.others)])
+        self.assertEqual(self.collect(f'/api/accounts/users/{self.others[0].pk}/following/'), [self.user.pk])
+
+    def test_expand_returns_user_summaries(self):
+        results = self.collect(f'/api/accounts/users/{self.user.pk}/followers/?expand=user&page_size=2')
+        self.assertEqual([item['username'] for item in results], [other.username for other in reversed(self.others)])
+
+    def test_unknown_user_is_not_found(self):
+        self.assertEqual(self.client.get('/api/accounts/users/999999/followers/').status_code, 404)
+
+    def test_profile_no_longer_embeds_followers(self):
+        self.assertNotIn('followers', self.client.get('/api/accounts/profile/').json())
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ImportUsersTests(AccountsTestCase):
+    def import_file(self, suffix, content, *args, **kwargs):
+        with tempfile.NamedTemporaryFile('w', suffix=suffix, delete=False) as source:
+            source.write(content)
+        self.addCleanup(os.unlink, source.name)
+        out = io.StringIO()
+        kwargs.setdefault('stderr', io.StringIO())
+        call_command('import_users', source.name, '--workers', '1', '--batch-size', '2', *args, stdout=out, **kwargs)
+        return out.getvalue()
+
+    def test_csv_import_hashes_passwords_and_skips_bad_rows(self):
+        User.objects.create_user(username='existing')
+        out = self.import_file('.csv', (
+            'username,email,password\n'
+            'alice,Alice@EXAMPLE.com,secret1\n'
+            'existing,,x\n'
+            ',nobody@example.com,x\n'
+            'bob,,secret2\n'
+            'bob,,again\n'
+            'carol,,\n'
+        ))
+        # The second bob falls in a later batch, so it is skipped as existing.
+        self.assertIn('Created 3 users, skipped 2 existing, 1 invalid rows', out)
+        alice = User.objects.get(username='alice')
+        self.assertTrue(alice.check_password('secret1'))
+        self.assertEqual(alice.email, 'Alice@example.com')
+        self.assertTrue(User.objects.get(username='bob').check_password('secret2'))
+        self.assertFalse(User.objects.get(username='carol').has_usable_password())
+        self.assertEqual(Token.objects.filter(user__username__in=['alice', 'bob', 'carol']).count(), 3)
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        err = io.StringIO()
+        out = self.import_file('.csv', (
+            'username,email,first_name\n'
+            f'{"x" * 151},,\n'
+            'bad name!,,\n'
+            'erin,not-an-email,\n'
+            'grace,grace@example.com,Grace\n'
+            f'frank,,{"f" * 151}\n'
+        ), stderr=err)
+        self.assertIn('Created 1 users, skipped 0 existing, 4 invalid rows', out)
+        self.assertEqual(err.getvalue().count('Skipping row'), 4)
+        self.assertIn('Skipping row 3: email:', err.getvalue())
+        self.assertEqual(list(User.objects.values_list('username', flat=True)), ['grace'])
+
+    def test_prehashed_passwords_are_stored_unchanged(self):
+        encoded = make_password('secret')
+        with mock.patch('accounts.management.commands.import_users.ProcessPoolExecutor') as pool:
+            self.import_file('.jsonl', json.dumps({'username': 'dave', 'password': encoded}) + '\n', '--hashed')
+        pool.assert_not_called()
+        dave = User.objects.get(username='dave')
+        self.assertEqual(dave.password, encoded)
+        self.assertTrue(dave.check_password('secret'))
+
+
+class CachedAuthenticationTests(AccountsTestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_user(username='user')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_process_local_cache_keeps_entries_no_longer_than_local_ttl(self):
+        with mock.patch.object(authentication.cache, 'set', wraps=authentication.cache.set) as cache_set:
+            authentication.get_cached_user(self.user.pk)
+        self.assertEqual(cache_set.call_args.args[2], min(authentication.SHARED_TTL, authentication.LOCAL_TTL))
+
+    def test_deactivated_user_is_refused(self):
+        self.assertEqual(self.client.get('/api/accounts/follow-status/', {'ids': '1'}).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get('/api/accounts/follow-status/', {'ids': '1'}).status_code, 401)
+
+    def test_deleted_token_is_refused(self):
+        self.assertEqual(self.client.get('/api/accounts/follow-status/', {'ids': '1'}).status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.token.delete()
+        self.assertEqual(self.client.get('/api/accounts/follow-status/', {'ids': '1'}).status_code, 401)
+
+
+class FollowGraphTests(SimpleTestCase):
+    def setUp(self):
+        # 1 -> 2, 1 -> 3, 2 -> 3, 3 -> 4
+        self.graph = graph.FollowGraph.from_edges([1, 1, 2, 3], [2, 3, 3, 4])
+
+    def test_queries_see_deltas(self):
+        self.graph.apply([1, 4], [4, 1], 1)
+        self.graph.apply([1], [2], -1)
+        self.assertEqual(list(self.graph.following(1)), [3, 4])
+        self.assertEqual(list(self.graph.followers(1)), [4])
+        self.assertFalse(self.graph.is_following(1, 2))
+        self.assertTrue(self.graph.is_following(4, 1))
+        self.assertEqual(list(self.graph.following_status(1, [2, 3, 4, 9])), [False, True, True, False])
+        self.assertEqual(list(self.graph.mutual_followers(1, 4)), [3])
+
+    def test_compaction_keeps_the_same_graph(self):
+        self.graph.apply([1, 4], [4, 1], 1)
+        self.graph.apply([1], [2], -1)
+        before = [list(self.graph.following(user_id)) for user_id in range(6)]
+        with mock.patch.object(graph, 'COMPACT_THRESHOLD', 1):
+            self.graph.apply([5], [1], 1)
+        self.assertEqual(self.graph.snapshot.pending, 0)
+        self.assertEqual([list(self.graph.following(user_id)) for user_id in range(5)], before[:5])
+        self.assertEqual(list(self.graph.following(5)), [1])
+        self.assertEqual(self.graph.suggestions(5), [(3, 1), (4, 1)])
+
+    def test_replayed_edges_are_not_duplicated(self):
+        self.graph.apply([1], [2], 1)
+        self.assertEqual(list(self.graph.snapshot.compacted().following(1)), [2, 3])
+
+    def test_readers_never_see_a_partial_change(self):
+        # Follow and unfollow 1 -> 9 and 9 -> 1 together while compacting on
+        # every change; a reader must always see both edges or neither.
+        stop = threading.Event()
+        errors = []
+
+        def read():
+            while not stop.is_set():
+                snapshot = self.graph.snapshot
+                if snapshot.is_following(1, 9) != snapshot.is_following(9, 1):
+                    errors.append('torn')
+
+        readers = [threading.Thread(target=read) for _ in range(4)]
+        for reader in readers:
+            reader.start()
+        try:
+            with mock.patch.object(graph, 'COMPACT_THRESHOLD', 2):
+                for index in range(300):
+                    self.graph.apply([1, 9], [9, 1], 1 if index % 2 == 0 else -1)
+        finally:
+            stop.set()
+            for reader in readers:
+                reader.join()
+        self.assertEqual(errors, [])
+
+
+class GraphLoadingTests(FollowTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # No suffix: np.savez would have written follow-graph.npz.
+        self.path = os.path.join(directory.name, 'follow-graph')
+        state = mock.patch.multiple(
+            graph, _graph=None, _reloading=False, _checked_at=0.0, _loaded_mtime=None, _recent=[]
+        )
+        state.start()
+        self.addCleanup(state.stop)
+
+    def reload_inline(self):
+        # Background reloads would not see the test's transaction.
+        return mock.patch.object(graph, '_reload_in_background', graph.refresh_graph)
+
+    def test_save_keeps_the_configured_name(self):
+        saved = graph.FollowGraph.from_edges([1], [2], built_at=1234.5)
+        saved.save(self.path)
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['follow-graph'])
+        loaded = graph.FollowGraph.load(self.path)
+        self.assertEqual((list(loaded.following(1)), loaded.built_at), ([2], 1234.5))
+
+    def test_views_answer_503_until_the_first_build(self):
+        self.user.following.add(self.others[0])
+        self.others[0].following.add(self.others[1])
+        with mock.patch.object(graph, '_reload_in_background') as start:
+            for _ in range(2):
+                response = self.client.get('/api/accounts/suggestions/')
+                self.assertEqual((response.status_code, response['Retry-After']), (503, '5'))
+            self.assertEqual(self.client.get(f'/api/accounts/mutuals/{self.others[1].pk}/').status_code, 503)
+        start.assert_called_once()
+        graph.refresh_graph()
+        response = self.client.get('/api/accounts/suggestions/')
+        self.assertEqual([item['id'] for item in response.json()], [self.others[1].pk])
+
+    def test_stale_graph_picks_up_follows_from_other_workers(self):
+        self.user.following.add(self.others[0])
+        with self.reload_inline():
+            self.assertEqual(list(graph.get_graph().following(self.user.pk)), [self.others[0].pk])
+            # Written by another process: this one's signals never saw it.
+            graph.Follow.objects.create(from_user=self.user, to_user=self.others[1])
+            self.assertEqual(len(graph.get_graph().following(self.user.pk)), 1)
+            graph._graph.built_at -= graph.MAX_AGE + 1
+            graph._checked_at = 0.0
+            self.assertEqual(len(graph.get_graph().following(self.user.pk)), 2)
+
+    def test_newer_file_replaces_graph_and_keeps_own_changes(self):
+        graph._graph = graph.FollowGraph.from_edges([1], [2], built_at=time.time() - 10)
+        graph.record_follow_change([3], [4], 1)
+        graph.FollowGraph.from_edges([1, 5], [2, 6], built_at=time.time() - 5).save(self.path)
+        with override_settings(FOLLOW_GRAPH_PATH=self.path), \
+                mock.patch.object(graph.FollowGraph, 'from_database') as from_database:
+            graph.refresh_graph()
+        from_database.assert_not_called()
+        current = graph.get_graph()
+        self.assertTrue(all(current.is_following(a, b) for a, b in [(1, 2), (5, 6), (3, 4)]))
@@ -8,4 +8,11 @@ urlpatterns = [
     path('profile/', views.ProfileView.as_view(), name='profile'),
     path('follow/<int:user_id>/', views.FollowUserView.as_view(), name='follow_user'),
     path('unfollow/<int:user_id>/', views.UnfollowUserView.as_view(), name='unfollow_user'),
+    path('follow/bulk/', views.BulkFollowView.as_view(), name='bulk_follow'),
+    path('unfollow/bulk/', views.BulkUnfollowView.as_view(), name='bulk_unfollow'),
+    path('follow-status/', views.FollowStatusView.as_view(), name='follow_status'),
+    path('users/<int:user_id>/followers/', views.FollowListView.as_view(direction='followers'), name='user_followers'),
+    path('users/<int:user_id>/following/', views.FollowListView.as_view(direction='following'), name='user_following'),
+    path('suggestions/', views.SuggestionsView.as_view(), name='follow_suggestions'),
+    path('mutuals/<int:user_id>/', views.MutualFollowersView.as_view(), name='mutual_followers'),
 ]
@@ -1,11 +1,20 @@
 from django.http import HttpResponse
+from django.db import transaction
+from django.db.models import F
+from django.shortcuts import get_object_or_404
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
 from rest_framework.authtoken.models import Token
 from django.contrib.auth import get_user_model
 
-from .serializers import RegisterSerializer, LoginSerializer, ProfileSerializer
+from .follows import BULK_FOLLOW_LIMIT, follow_many, unfollow_many, following_status
+from .graph import get_graph
+from .pagination import FollowListPagination
+from .serializers import (
+    RegisterSerializer, LoginSerializer, ProfileSerializer, FollowSerializer, SuggestionSerializer,
+    BulkFollowSerializer,
+)
 
 # Home view
 def home(request):
@@ -16,8 +25,9 @@ class RegisterView(APIView):
     def post(self, request):
         serializer = RegisterSerializer(data=request.data)
         if serializer.is_valid():
-            user = serializer.save()
-            token, _ = Token.objects.get_or_create(user=user)
+            with transaction.atomic():
+                user = serializer.save()
+                token = Token.objects.create(user=user)
             return Response({'token': token.key, 'user': serializer.data}, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -43,12 +53,13 @@ class ProfileView(APIView):
 from rest_framework import generics
 
 CustomUser = get_user_model()
+Follow = CustomUser.following.through
 
 class FollowUserView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, user_id):
-        target_user = CustomUser.objects.all().get(id=user_id)
+        target_user = get_object_or_404(CustomUser, id=user_id)
         if target_user == request.user:
             return Response({'detail': "You cannot follow yourself."}, status=status.HTTP_400_BAD_REQUEST)
         request.user.following.add(target_user)
@@ -58,6 +69,104 @@ class UnfollowUserView(generics.GenericAPIView):
     permission_classes = [permissions.IsAuthenticated]
 
     def post(self, request, user_id):
-        target_user = CustomUser.objects.all().get(id=user_id)
+        target_user = get_object_or_404(CustomUser, id=user_id)
         request.user.following.remove(target_user)
         return Response({'detail': f"You have unfollowed {target_user.username}."})
+
+class BulkFollowView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = BulkFollowSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        followed, missing = follow_many(request.user, serializer.validated_data['user_ids'])
+        return Response({'followed': sorted(followed), 'missing': sorted(missing)})
+
+class BulkUnfollowView(generics.GenericAPIView):
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = BulkFollowSerializer
+
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        unfollowed = unfollow_many(request.user, serializer.validated_data['user_ids'])
+        return Response({'unfollowed': sorted(unfollowed)})
+
+class FollowStatusView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            user_ids = list(dict.fromkeys(int(pk) for pk in request.query_params.get('ids', '').split(',') if pk))
+        except ValueError:
+            return Response({'detail': "ids must be a comma-separated list of integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(user_ids) > BULK_FOLLOW_LIMIT:
+            return Response({'detail': f"At most {BULK_FOLLOW_LIMIT} ids per request."}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({str(pk): following for pk, following in following_status(request.user, user_ids).items()})
+
+# Follow graph views
+def _users_in_order(user_ids):
+    users = CustomUser.objects.only('id', 'username', 'followers_count', 'following_count').in_bulk(user_ids)
+    return [users[user_id] for user_id in user_ids if user_id in users]
+
+def _graph_loading():
+    # The first copy of the graph is built in the background (see accounts.graph).
+    return Response(
+        {'detail': "The follow graph is loading, try again shortly."},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': '5'},
+    )
+
+class SuggestionsView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
+        except ValueError:
+            limit = 20
+        graph = get_graph()
+        if graph is None:
+            return _graph_loading()
+        ranked = graph.suggestions(request.user.pk, limit=limit)
+        mutual_counts = dict(ranked)
+        users = _users_in_order([user_id for user_id, _ in ranked])
+        serializer = SuggestionSerializer(users, many=True, context={'mutual_counts': mutual_counts})
+        return Response(serializer.data)
+
+class MutualFollowersView(APIView):
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, user_id):
+        graph = get_graph()
+        if graph is None:
+            return _graph_loading()
+        mutuals = graph.mutual_followers(request.user.pk, user_id)
+        users = _users_in_order([int(pk) for pk in mutuals[:100]])
+        return Response({'count': len(mutuals), 'results': FollowSerializer(users, many=True).data})
+
+# Follower/following lists
+class FollowListView(APIView):
+    """
+    Newest-first keyset pages of user ids, or of user summaries with
+    ?expand=user (loaded in one query per page).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    direction = None  # 'followers' or 'following'
+
+    def get(self, request, user_id):
+        get_object_or_404(CustomUser.objects.only('id'), id=user_id)
+        if self.direction == 'followers':
+            edges = Follow.objects.filter(to_user_id=user_id).values('id', user=F('from_user_id'))
+        else:
+            edges = Follow.objects.filter(from_user_id=user_id).values('id', user=F('to_user_id'))
+
+        paginator = FollowListPagination()
+        page = paginator.paginate_queryset(edges, request, view=self)
+        user_ids = [edge['user'] for edge in page]
+        if request.query_params.get('expand') == 'user':
+            data = FollowSerializer(_users_in_order(user_ids), many=True).data
+        else:
+            data = user_ids
+        return paginator.get_paginated_response(data)
@@ -0,0 +1,62 @@
+"""
+Compressed NDJSON archive of purged notifications.
+
+purge_notifications appends one gzip member per chunk to a file per run in
+NOTIFICATIONS_ARCHIVE_DIR. Rows are written before the transaction that
+deletes them commits, so a chunk whose delete rolled back is archived again
+by a later run; readers keep only the newest copy of each id. Archived rows
+are reachable through iter_archived(), which scans every file; it is meant
+for rare staff lookups, not for the hot notification list.
+"""
+import gzip
+import heapq
+import json
+from pathlib import Path
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+ARCHIVE_FIELDS = [
+    'id', 'recipient_id', 'actor_id', 'verb', 'target_content_type_id', 'target_object_id',
+    'read', 'actor_count', 'actor_sample', 'timestamp',
+]
+
+
+def archive_dir():
+    return Path(getattr(settings, 'NOTIFICATIONS_ARCHIVE_DIR', settings.BASE_DIR / 'archive' / 'notifications'))
+
+
+class ArchiveWriter:
+    def __init__(self, directory=None):
+        directory = Path(directory or archive_dir())
+        directory.mkdir(parents=True, exist_ok=True)
+        self.path = directory / f"notifications-{timezone.now():%Y%m%dT%H%M%S%f}.ndjson.gz"
+        self.written = 0
+
+    def write(self, rows):
+        """Append rows (dicts with ARCHIVE_FIELDS) and flush them to disk."""
+        lines = ''.join(json.dumps(row, default=str, separators=(',', ':')) + '\n' for row in rows)
+        with gzip.open(self.path, 'at', encoding='utf-8') as archive:
+            archive.write(lines)
+        self.written += len(rows)
+
+
+def iter_archived(recipient_id=None, directory=None):
+    """Yield archived notification dicts once per id, newest archive file first."""
+    seen = set()
+    for path in sorted(Path(directory or archive_dir()).glob('notifications-*.ndjson.gz'), reverse=True):
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                row = json.loads(line)
+                if recipient_id is not None and row['recipient_id'] != recipient_id:
+                    continue
+                if row['id'] in seen:
+                    continue
+                seen.add(row['id'])
+                row['timestamp'] = parse_datetime(row['timestamp'])
+                yield row
+
+
+def archived_for(recipient_id, limit=50, directory=None):
+    return heapq.nlargest(limit, iter_archived(recipient_id, directory), key=lambda row: (row['timestamp'], row['id']))
@@ -0,0 +1,20 @@
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.exception import convert_exception_to_response
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    ASGI handler for the long-lived notification endpoints.
+
+    WhiteNoise is sync-only, so behind the regular middleware stack Django
+    runs every request, async views included, in a worker thread. The stream
+    and long-poll views authenticate from headers and need no middleware, so
+    they are served without it: an idle connection is then a coroutine, not
+    a thread.
+    """
+
+    def load_middleware(self, is_async=False):
+        self._view_middleware = []
+        self._template_response_middleware = []
+        self._exception_middleware = []
+        self._middleware_chain = convert_exception_to_response(self._get_response_async)
@@ -0,0 +1,230 @@
+"""
+In-process pub/sub for pushing notifications to streaming clients.
+
+Each ASGI worker owns one Hub. Connected stream and long-poll requests
+subscribe to their user id and sleep until woken. Messages are small wake-up
+hints ({'recipient_id', 'id'}); subscribers re-read the database from their
+own watermark, so a lost or duplicated hint costs at most one extra query.
+
+Messages usually originate in another process (the outbox drain worker), so
+the hub hands them to a pluggable fan-out backend, NOTIFICATIONS_HUB_BACKEND:
+
+* PostgresBackend (the default) sends each message with pg_notify() and
+  every worker LISTENs on a dedicated connection.
+* FileBackend appends to a shared NDJSON file that every worker tails, for
+  development setups without PostgreSQL.
+* LocalBackend delivers only within the current process, so it cannot be
+  used with a separate drain process; drain_notification_outbox refuses to
+  start with it.
+
+Other brokers (Redis pub/sub) only need to implement publish(), start() and stop().
+"""
+import asyncio
+import json
+import logging
+import os
+import select
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+BACKEND = getattr(settings, 'NOTIFICATIONS_HUB_BACKEND', 'notifications.hub.PostgresBackend')
+
+
+class Subscription:
+    def __init__(self, hub, user_id, loop):
+        self.hub = hub
+        self.user_id = user_id
+        self.loop = loop
+        self.event = asyncio.Event()
+
+    def notify(self):
+        self.loop.call_soon_threadsafe(self.event.set)
+
+    async def wait(self, timeout):
+        """Wait for a wake-up; returns False on timeout."""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.event.clear()
+        return True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.hub.unsubscribe(self)
+
+
+class Hub:
+    def __init__(self, backend_class):
+        self.subscribers = defaultdict(set)
+        self.lock = threading.Lock()
+        self.backend = backend_class(self)
+        self.started = False
+
+    def subscribe(self, user_id):
+        loop = asyncio.get_running_loop()
+        subscription = Subscription(self, user_id, loop)
+        with self.lock:
+            self.subscribers[user_id].add(subscription)
+            if not self.started:
+                self.started = True
+                self.backend.start(loop)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscribers = self.subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self.subscribers[subscription.user_id]
+
+    def dispatch(self, message):
+        """Wake local subscribers of message['recipient_id']; called by backends."""
+        with self.lock:
+            subscribers = list(self.subscribers.get(message['recipient_id'], ()))
+        for subscription in subscribers:
+            subscription.notify()
+
+    def publish(self, message):
+        self.backend.publish(message)
+
+
+class LocalBackend:
+    def __init__(self, hub):
+        self.hub = hub
+
+    def start(self, loop):
+        pass
+
+    def stop(self):
+        pass
+
+    def publish(self, message):
+        self.hub.dispatch(message)
+
+
+class FileBackend:
+    poll_interval = 0.2
+
+    def __init__(self, hub):
+        self.hub = hub
+        self.path = getattr(settings, 'NOTIFICATIONS_HUB_FILE', settings.BASE_DIR / 'notifications-hub.ndjson')
+        self.task = None
+
+    def publish(self, message):
+        # A single O_APPEND write per message keeps concurrent writers from interleaving.
+        line = (json.dumps(message, separators=(',', ':')) + '\n').encode()
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, line)
+        finally:
+            os.close(fd)
+
+    def start(self, loop):
+        offset = os.path.getsize(self.path) if os.path.exists(self.path) else 0
+        self.task = loop.create_task(self.tail(offset))
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def tail(self, offset):
+        buffer = b''
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                with open(self.path, 'rb') as hub_file:
+                    hub_file.seek(offset)
+                    chunk = hub_file.read()
+            except FileNotFoundError:
+                continue
+            offset += len(chunk)
+            buffer += chunk
+            *lines, buffer = buffer.split(b'\n')
+            for line in lines:
+                if line:
+                    self.hub.dispatch(json.loads(line))
+
+
+class PostgresBackend:
+    poll_timeout = 5.0
+    reconnect_delay = 1.0
+
+    def __init__(self, hub):
+        if connection.vendor != 'postgresql':
+            raise ImproperlyConfigured("notifications.hub.PostgresBackend needs a PostgreSQL database.")
+        self.hub = hub
+        self.channel = getattr(settings, 'NOTIFICATIONS_HUB_CHANNEL', 'notifications_hub')
+        self.stopped = threading.Event()
+        self.thread = None
+
+    def publish(self, message):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_notify(%s, %s)', [self.channel, json.dumps(message, separators=(',', ':'))])
+
+    def start(self, loop):
+        self.thread = threading.Thread(target=self.listen, name='notifications-hub', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        self.stopped.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def listen(self):
+        # Hints sent while reconnecting are lost; subscribers catch up on
+        # their next heartbeat.
+        while not self.stopped.is_set():
+            try:
+                self.listen_once()
+            except Exception:
+                logger.exception("Notification hub listener failed; reconnecting")
+                self.stopped.wait(self.reconnect_delay)
+
+    def listen_once(self):
+        listener = connection.get_new_connection(connection.get_connection_params())
+        try:
+            listener.autocommit = True
+            with listener.cursor() as cursor:
+                cursor.execute(f'LISTEN {connection.ops.quote_name(self.channel)}')
+            while not self.stopped.is_set():
+                if not select.select([listener], [], [], self.poll_timeout)[0]:
+                    continue
+                listener.poll()
+                while listener.notifies:
+                    self.hub.dispatch(json.loads(listener.notifies.pop(0).payload))
+        finally:
+            listener.close()
+
+
+def backend_class():
+    return import_string(BACKEND)
+
+
+_hub = None
+_hub_lock = threading.Lock()
+
+
+def get_hub():
+    global _hub
+    if _hub is None:
+        with _hub_lock:
+            if _hub is None:
+                _hub = Hub(backend_class())
+    return _hub
+
+
+def publish_notifications(notifications):
+    hub = get_hub()
+    for notification in notifications:
+        hub.publish({'recipient_id': notification.recipient_id, 'id': notification.pk})
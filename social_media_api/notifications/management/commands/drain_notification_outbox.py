@@ -0,0 +1,64 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+
+from notifications.hub import LocalBackend, backend_class
+from notifications.outbox import BATCH_SIZE, DrainMetrics, stats, timed_drain
+
+
+class Command(BaseCommand):
+    help = "Deliver pending notification outbox events in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--interval', type=float, default=1.0,
+                            help="Seconds an idle worker sleeps before polling again.")
+        parser.add_argument('--report-interval', type=float, default=10.0)
+        parser.add_argument('--once', action='store_true', help="Exit once the outbox is empty.")
+
+    def handle(self, *args, **options):
+        if issubclass(backend_class(), LocalBackend):
+            raise CommandError(
+                "NOTIFICATIONS_HUB_BACKEND is LocalBackend, which cannot reach streaming clients in other "
+                "processes; use PostgresBackend or FileBackend."
+            )
+        workers = options['workers']
+        if not connection.features.has_select_for_update_skip_locked and workers > 1:
+            self.stderr.write("Database cannot SKIP LOCKED; using a single worker.")
+            workers = 1
+
+        metrics = DrainMetrics()
+        stop = threading.Event()
+
+        def worker():
+            try:
+                while not stop.is_set():
+                    close_old_connections()
+                    if timed_drain(metrics, options['batch_size']):
+                        continue
+                    if options['once']:
+                        return
+                    stop.wait(options['interval'])
+            finally:
+                connection.close()
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(worker) for _ in range(workers)]
+            try:
+                while wait(futures, timeout=options['report_interval']).not_done:
+                    self.report(metrics)
+            except KeyboardInterrupt:
+                stop.set()
+        self.report(metrics)
+
+    def report(self, metrics):
+        current = metrics.snapshot()
+        backlog = stats()
+        self.stdout.write(
+            "delivered={delivered} batches={batches} failures={failures} "
+            "flush_p50={flush_p50_ms:.1f}ms flush_p99={flush_p99_ms:.1f}ms ".format(**current)
+            + "depth={depth} lag={lag_seconds:.1f}s parked={parked}".format(**backlog)
+        )
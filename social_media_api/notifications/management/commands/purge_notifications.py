@@ -0,0 +1,60 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from notifications.archive import ARCHIVE_FIELDS, ArchiveWriter
+from notifications.models import Notification
+from notifications.retention import expired_filter
+from notifications.unread import adjust_unread
+
+
+class Command(BaseCommand):
+    help = "Delete (and optionally archive) notifications past their retention period in bounded chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--sleep', type=float, default=0.1, help="Seconds to pause between chunks.")
+        parser.add_argument('--archive', action='store_true', help="Write purged rows to a compressed NDJSON archive.")
+        parser.add_argument('--archive-dir', help="Defaults to NOTIFICATIONS_ARCHIVE_DIR.")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        expired = Notification.objects.filter(expired_filter(timezone.now()))
+        writer = ArchiveWriter(options['archive_dir']) if options['archive'] and not options['dry_run'] else None
+        last_pk, purged = 0, 0
+
+        while True:
+            # Walk the primary key so each chunk is a short, bounded transaction.
+            ids = list(expired.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:options['chunk_size']])
+            if not ids:
+                break
+            last_pk = ids[-1]
+
+            if options['dry_run']:
+                purged += len(ids)
+                continue
+
+            with transaction.atomic():
+                rows = list(expired.filter(pk__in=ids).values(*ARCHIVE_FIELDS))
+                if writer:
+                    # Rows reach the archive even if the delete rolls back;
+                    # readers keep one copy per id (see notifications.archive).
+                    writer.write(rows)
+                Notification.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+                adjust_unread({
+                    user_id: -count
+                    for user_id, count in Counter(row['recipient_id'] for row in rows if not row['read']).items()
+                })
+            purged += len(rows)
+
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        verb = "Would purge" if options['dry_run'] else "Purged"
+        message = f"{verb} {purged} notifications."
+        if writer and writer.written:
+            message += f" Archived to {writer.path}."
+        self.stdout.write(self.style.SUCCESS(message))
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 14:02
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_notification_unread_idx'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='notification',
+            options={},
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 6.0.1 on 2026-10-18 21:10
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_seq(apps, schema_editor):
+    # Existing rows are numbered in (timestamp, id) order per recipient,
+    # the order the streams used to follow.
+    Notification = apps.get_model('notifications', 'Notification')
+    NotificationSequence = apps.get_model('notifications', 'NotificationSequence')
+    rows = Notification.objects.order_by('recipient_id', 'timestamp', 'id').values_list('pk', 'recipient_id')
+    last, batch = {}, []
+    for pk, recipient_id in rows.iterator(chunk_size=2000):
+        last[recipient_id] = last.get(recipient_id, 0) + 1
+        batch.append(Notification(pk=pk, seq=last[recipient_id]))
+        if len(batch) >= 2000:
+            Notification.objects.bulk_update(batch, ['seq'])
+            batch = []
+    Notification.objects.bulk_update(batch, ['seq'])
+    NotificationSequence.objects.bulk_create(
+        [NotificationSequence(recipient_id=recipient_id, last_seq=seq) for recipient_id, seq in last.items()],
+        batch_size=2000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_remove_notification_ordering'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationSequence',
+            fields=[
+                ('recipient', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('last_seq', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='seq',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient', 'seq'], name='notif_recipient_seq_idx'),
+        ),
+        migrations.RunPython(backfill_seq, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,6 @@
 from django.db import models
 from django.conf import settings
+from django.utils import timezone
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
 
@@ -13,10 +14,77 @@ class Notification(models.Model):
     target_object_id = models.PositiveIntegerField(blank=True, null=True)
     target = GenericForeignKey('target_content_type', 'target_object_id')
     read = models.BooleanField(default=False)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Coalescing: repeated (recipient, verb, target) events inside
+    # NOTIFICATIONS_COALESCE_WINDOW fold into one row ("X and 41 others").
+    # `actor` is the most recent actor, `actor_sample` a few recent actor ids
+    # and `actor_count` the number of distinct actors (see NotificationActor).
+    actor_count = models.PositiveIntegerField(default=1)
+    actor_sample = models.JSONField(default=list, blank=True)
+    # Set from the outbox event, so it records when the action happened
+    # rather than when the outbox worker delivered it.
+    timestamp = models.DateTimeField(default=timezone.now, editable=False)
+    # Position in the recipient's delivery order (see NotificationSequence),
+    # raised again each time a coalesced row is updated. Streaming clients
+    # resume from it: timestamps follow the actions, not the deliveries.
+    seq = models.PositiveBigIntegerField(default=0, editable=False)
 
     class Meta:
-        ordering = ['-timestamp']
+        # No default ordering: list views order by (timestamp, id) explicitly
+        # and maintenance queries (purge, counts) should not pay for a sort.
+        indexes = [
+            models.Index(fields=['recipient', '-timestamp', '-id'], name='notif_recipient_recent_idx'),
+            # Unread badge count, mark-read by id range and coalescing lookups.
+            models.Index(fields=['recipient', 'id'], condition=models.Q(read=False), name='notif_recipient_unread_idx'),
+            models.Index(fields=['recipient', 'seq'], name='notif_recipient_seq_idx'),
+        ]
 
     def __str__(self):
         return f"{self.actor} {self.verb} {self.target or ''} to {self.recipient}"
+
+
+class NotificationActor(models.Model):
+    # Every distinct actor folded into a coalesced notification, so an actor
+    # who acts again after dropping out of actor_sample is not counted twice.
+    notification = models.ForeignKey(Notification, on_delete=models.CASCADE, related_name='actors')
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['notification', 'actor'], name='notif_actor_unique'),
+        ]
+
+
+class NotificationSequence(models.Model):
+    # The last seq handed out to each recipient. Delivery locks the row until
+    # it commits, so a recipient's notifications become visible in seq order
+    # however many drain workers run.
+    recipient = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    last_seq = models.PositiveBigIntegerField(default=0)
+
+
+class NotificationEvent(models.Model):
+    # Transactional outbox: request handlers append one of these in the same
+    # transaction as the action, and `manage.py drain_notification_outbox`
+    # turns them into Notification rows in bulk. An event is deleted in the
+    # same transaction that delivers it, so a crashed worker simply leaves
+    # it to be replayed.
+    recipient = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    actor = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    verb = models.CharField(max_length=255)
+    target_content_type = models.ForeignKey(ContentType, blank=True, null=True, on_delete=models.CASCADE, related_name='+')
+    target_object_id = models.PositiveIntegerField(blank=True, null=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    attempts = models.PositiveSmallIntegerField(default=0)
+
+    def to_notification(self):
+        return Notification(
+            recipient_id=self.recipient_id,
+            actor_id=self.actor_id,
+            verb=self.verb,
+            target_content_type_id=self.target_content_type_id,
+            target_object_id=self.target_object_id,
+            timestamp=self.created_at,
+        )
+
+    def __str__(self):
+        return f"{self.actor_id} {self.verb} for {self.recipient_id}"
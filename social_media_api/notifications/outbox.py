@@ -0,0 +1,243 @@
+"""
+Notification outbox.
+
+enqueue() appends a NotificationEvent inside the caller's transaction, so an
+event exists if and only if the action that caused it committed.
+drain_batch() moves events into Notification, folding repeats of the same
+(recipient, verb, target) into one row, and deletes them in the same
+transaction; `manage.py drain_notification_outbox` runs it from a pool of
+worker threads. Every row written is numbered from its recipient's
+NotificationSequence, which stays locked until the batch commits.
+"""
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Min
+from django.utils import timezone
+
+from .models import Notification, NotificationActor, NotificationEvent, NotificationSequence
+from .unread import invalidate_unread
+from .hub import publish_notifications
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = getattr(settings, 'NOTIFICATIONS_OUTBOX_BATCH_SIZE', 500)
+MAX_ATTEMPTS = getattr(settings, 'NOTIFICATIONS_OUTBOX_MAX_ATTEMPTS', 5)
+COALESCE_WINDOW = getattr(settings, 'NOTIFICATIONS_COALESCE_WINDOW', 60 * 60)
+ACTOR_SAMPLE_SIZE = getattr(settings, 'NOTIFICATIONS_ACTOR_SAMPLE_SIZE', 5)
+
+
+def enqueue(recipient_id, actor_id, verb, target_type=None, target_id=None):
+    return NotificationEvent.objects.create(
+        recipient_id=recipient_id,
+        actor_id=actor_id,
+        verb=verb,
+        target_content_type=target_type,
+        target_object_id=target_id,
+    )
+
+
+def coalesce_key(obj):
+    return (obj.recipient_id, obj.verb, obj.target_content_type_id, obj.target_object_id)
+
+
+def lock_sequences(recipient_ids):
+    """Return {recipient_id: NotificationSequence}, locked, creating missing rows."""
+    recipient_ids = sorted(set(recipient_ids))
+    NotificationSequence.objects.bulk_create(
+        [NotificationSequence(recipient_id=recipient_id) for recipient_id in recipient_ids], ignore_conflicts=True
+    )
+    # Locked in id order, so workers sharing recipients cannot deadlock.
+    sequences = (
+        NotificationSequence.objects.select_for_update()
+        .filter(recipient_id__in=recipient_ids)
+        .order_by('recipient_id')
+    )
+    return {sequence.recipient_id: sequence for sequence in sequences}
+
+
+def number(notifications, sequences):
+    """Give each notification the next seq of its recipient."""
+    for notification in sorted(notifications, key=lambda notification: notification.timestamp):
+        sequence = sequences[notification.recipient_id]
+        sequence.last_seq += 1
+        notification.seq = sequence.last_seq
+    NotificationSequence.objects.bulk_update(sequences.values(), ['last_seq'])
+
+
+def deliver(events):
+    """Write Notification rows for a batch of events. Returns the rows created or updated."""
+    # Taken first: it also serializes coalescing for a recipient across workers.
+    sequences = lock_sequences(event.recipient_id for event in events)
+    if not COALESCE_WINDOW:
+        created = [event.to_notification() for event in events]
+        number(created, sequences)
+        created = Notification.objects.bulk_create(created)
+        invalidate_unread(notification.recipient_id for notification in created)
+        return created
+
+    groups = {}
+    for event in sorted(events, key=lambda event: (event.created_at, event.pk)):
+        groups.setdefault(coalesce_key(event), []).append(event)
+
+    # Unread rows for the same (recipient, verb, target) still inside the
+    # window are updated in place; everything else becomes one new row per group.
+    since = min(event.created_at for event in events) - timedelta(seconds=COALESCE_WINDOW)
+    existing = {}
+    candidates = (
+        Notification.objects.select_for_update()
+        .filter(
+            recipient_id__in={key[0] for key in groups},
+            verb__in={key[1] for key in groups},
+            read=False,
+            timestamp__gte=since,
+        )
+        .order_by('timestamp', 'id')
+    )
+    for notification in candidates:
+        existing[coalesce_key(notification)] = notification  # newest wins
+
+    # Actors already folded into the rows being updated, so repeat actors
+    # are not counted again once they have left actor_sample.
+    known = defaultdict(set)
+    if existing:
+        rows = NotificationActor.objects.filter(
+            notification__in=[notification.pk for notification in existing.values()],
+            actor_id__in={event.actor_id for event in events},
+        ).values_list('notification_id', 'actor_id')
+        for notification_id, actor_id in rows:
+            known[notification_id].add(actor_id)
+
+    created, updated, actors = [], [], []
+    for key, group in groups.items():
+        notification = existing.get(key)
+        if notification is not None and group[0].created_at - notification.timestamp > timedelta(seconds=COALESCE_WINDOW):
+            notification = None
+        if notification is None:
+            notification = group[0].to_notification()
+            notification.actor_count = 0
+            notification.actor_sample = []
+            created.append(notification)
+            seen = set()
+        else:
+            updated.append(notification)
+            seen = known[notification.pk]
+
+        for event in group:
+            if event.actor_id not in seen:
+                seen.add(event.actor_id)
+                notification.actor_count += 1
+                actors.append((notification, event.actor_id))
+            sample = [actor_id for actor_id in notification.actor_sample if actor_id != event.actor_id]
+            notification.actor_sample = [event.actor_id, *sample][:ACTOR_SAMPLE_SIZE]
+            notification.actor_id = event.actor_id
+            # A late event from another worker must not move the row back.
+            notification.timestamp = max(notification.timestamp, event.created_at)
+
+    number(created + updated, sequences)
+    Notification.objects.bulk_create(created)
+    Notification.objects.bulk_update(updated, ['actor', 'actor_count', 'actor_sample', 'timestamp', 'seq'])
+    NotificationActor.objects.bulk_create(
+        [NotificationActor(notification_id=notification.pk, actor_id=actor_id) for notification, actor_id in actors],
+        ignore_conflicts=True,
+    )
+    # Coalesced rows were already unread, so only new rows move the badge.
+    invalidate_unread(notification.recipient_id for notification in created)
+    return created + updated
+
+
+def drain_batch(batch_size=BATCH_SIZE):
+    """
+    Deliver up to `batch_size` pending events. Returns how many were delivered.
+    Rows are locked with SKIP LOCKED where supported so several workers can
+    drain concurrently without delivering an event twice.
+    """
+    skip_locked = connection.features.has_select_for_update_skip_locked
+    event_ids = []
+    try:
+        with transaction.atomic():
+            events = list(
+                NotificationEvent.objects.select_for_update(skip_locked=skip_locked)
+                .filter(attempts__lt=MAX_ATTEMPTS)
+                .order_by('id')[:batch_size]
+            )
+            if not events:
+                return 0
+            event_ids = [event.pk for event in events]
+            delivered = deliver(events)
+            NotificationEvent.objects.filter(pk__in=event_ids).delete()
+            transaction.on_commit(lambda: publish_notifications(delivered))
+    except Exception:
+        # Count the failure against the batch so a poison event is
+        # eventually parked instead of blocking the queue.
+        if event_ids:
+            NotificationEvent.objects.filter(pk__in=event_ids).update(attempts=F('attempts') + 1)
+        raise
+    return len(event_ids)
+
+
+def stats():
+    """Back-pressure metrics: pending depth, age of the oldest pending event and parked events."""
+    pending = NotificationEvent.objects.filter(attempts__lt=MAX_ATTEMPTS)
+    oldest = pending.aggregate(oldest=Min('created_at'))['oldest']
+    return {
+        'depth': pending.count(),
+        'lag_seconds': (timezone.now() - oldest).total_seconds() if oldest else 0.0,
+        'parked': NotificationEvent.objects.filter(attempts__gte=MAX_ATTEMPTS).count(),
+    }
+
+
+class DrainMetrics:
+    """Delivery counters and flush latencies shared by the drain worker threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.delivered = 0
+        self.batches = 0
+        self.failures = 0
+        self.flush_seconds = []
+
+    def record(self, delivered, seconds):
+        with self.lock:
+            self.delivered += delivered
+            self.batches += 1
+            self.flush_seconds.append(seconds)
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+
+    def snapshot(self):
+        with self.lock:
+            timings = sorted(self.flush_seconds)
+            self.flush_seconds = []
+        if timings:
+            p50 = timings[len(timings) // 2] * 1000
+            p99 = timings[max(0, int(len(timings) * 0.99) - 1)] * 1000
+        else:
+            p50 = p99 = 0.0
+        return {
+            'delivered': self.delivered,
+            'batches': self.batches,
+            'failures': self.failures,
+            'flush_p50_ms': p50,
+            'flush_p99_ms': p99,
+        }
+
+
+def timed_drain(metrics, batch_size=BATCH_SIZE):
+    began = time.perf_counter()
+    try:
+        delivered = drain_batch(batch_size)
+    except Exception:
+        metrics.record_failure()
+        logger.exception("Notification outbox batch failed")
+        return 0
+    if delivered:
+        metrics.record(delivered, time.perf_counter() - began)
+    return delivered
@@ -0,0 +1,6 @@
+from social_media_api.pagination import KeysetPagination
+
+
+class NotificationPagination(KeysetPagination):
+    page_size = 20
+    ordering = ('-timestamp', '-id')
@@ -0,0 +1,42 @@
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+
+from .models import Notification
+
+User = get_user_model()
+
+
+def prefetch_notifications(notifications):
+    """
+    Load the actor and generic target of every notification in a few queries:
+    one for any actors not already select_related, and one in_bulk per target
+    content type. Results are stored in the instances' relation caches, so
+    `notification.actor` and `notification.target` no longer hit the database.
+    Returns the notifications as a list.
+    """
+    notifications = list(notifications)
+    actor_field = Notification._meta.get_field('actor')
+    target_field = Notification._meta.get_field('target')
+
+    actor_ids = {n.actor_id for n in notifications if not actor_field.is_cached(n)}
+    if actor_ids:
+        actors = User.objects.in_bulk(actor_ids)
+        for n in notifications:
+            if n.actor_id in actors:
+                actor_field.set_cached_value(n, actors[n.actor_id])
+
+    ids_by_type = defaultdict(set)
+    for n in notifications:
+        if n.target_content_type_id and n.target_object_id is not None and not target_field.is_cached(n):
+            ids_by_type[n.target_content_type_id].add(n.target_object_id)
+
+    for content_type_id, object_ids in ids_by_type.items():
+        model = ContentType.objects.get_for_id(content_type_id).model_class()
+        targets = model._base_manager.in_bulk(object_ids) if model else {}
+        for n in notifications:
+            if n.target_content_type_id == content_type_id and not target_field.is_cached(n):
+                # Cache None for deleted targets so they are not re-queried.
+                target_field.set_cached_value(n, targets.get(n.target_object_id))
+    return notifications
@@ -0,0 +1,48 @@
+"""
+Notification retention policy.
+
+NOTIFICATIONS_RETENTION maps a verb (or 'default') to the number of days read
+and unread notifications are kept; None keeps them forever:
+
+    NOTIFICATIONS_RETENTION = {
+        'default': {'read': 30, 'unread': 90},
+        'liked': {'read': 7, 'unread': 30},
+    }
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+DEFAULT_RETENTION = {
+    'default': {'read': 30, 'unread': 90},
+}
+
+
+def get_policy():
+    return getattr(settings, 'NOTIFICATIONS_RETENTION', DEFAULT_RETENTION)
+
+
+def _expired(days, now, read, **filters):
+    if days is None:
+        return Q(pk__in=[])
+    return Q(read=read, timestamp__lt=now - timedelta(days=days), **filters)
+
+
+def expired_filter(now=None, policy=None):
+    """Q matching every notification past its retention period."""
+    now = now or timezone.now()
+    policy = policy or get_policy()
+    default = policy.get('default', {})
+
+    condition = Q(pk__in=[])
+    verbs = [verb for verb in policy if verb != 'default']
+    for verb in verbs:
+        rules = {**default, **policy[verb]}
+        condition |= _expired(rules.get('read'), now, True, verb=verb)
+        condition |= _expired(rules.get('unread'), now, False, verb=verb)
+    others = Q() if not verbs else ~Q(verb__in=verbs)
+    condition |= _expired(default.get('read'), now, True) & others
+    condition |= _expired(default.get('unread'), now, False) & others
+    return condition
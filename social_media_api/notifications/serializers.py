@@ -1,5 +1,13 @@
 from rest_framework import serializers
 from .models import Notification
+from .prefetch import prefetch_notifications
+
+
+class NotificationListSerializer(serializers.ListSerializer):
+    def to_representation(self, data):
+        # Resolve actors and generic targets for the whole list up front.
+        return super().to_representation(prefetch_notifications(data.all() if hasattr(data, 'all') else data))
+
 
 class NotificationSerializer(serializers.ModelSerializer):
     actor_username = serializers.CharField(source='actor.username', read_only=True)
@@ -7,7 +15,12 @@ class NotificationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Notification
-        fields = ['id', 'actor_username', 'verb', 'target_str', 'read', 'timestamp']
+        fields = ['id', 'actor_username', 'actor_count', 'actor_sample', 'verb', 'target_str', 'read', 'timestamp']
+        list_serializer_class = NotificationListSerializer
 
     def get_target_str(self, obj):
         return str(obj.target) if obj.target else None
+
+
+class MarkReadSerializer(serializers.Serializer):
+    up_to_id = serializers.IntegerField(required=False, min_value=1)
@@ -0,0 +1,64 @@
+"""
+Helpers for the streaming (SSE) and long-poll notification endpoints.
+
+Clients track a watermark: an opaque cursor over the seq of the last
+notification they saw. Seqs are handed out per recipient in the order
+deliveries commit (see NotificationSequence), so a notification delivered
+late, or by a slower drain worker, still lands after every watermark issued
+before it. Coalesced notifications take a new seq when updated, so they are
+delivered again with the new actor count.
+"""
+from rest_framework.exceptions import APIException
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from social_media_api.pagination import KeysetPagination
+from .models import Notification, NotificationSequence
+from .serializers import NotificationSerializer
+
+BATCH_LIMIT = 100
+
+
+class WatermarkCursor(KeysetPagination):
+    ordering = ('seq',)
+    ordering_types = (int,)
+    invalid_cursor_message = 'Invalid watermark'
+
+
+_cursor = WatermarkCursor()
+
+
+def encode_watermark(seq):
+    return _cursor.encode_cursor([seq])
+
+
+def decode_watermark(value):
+    """The seq in watermark `value`; raises NotFound if `value` is not one."""
+    return _cursor.decode_position(value)[0]
+
+
+def current_seq(user_id):
+    sequence = NotificationSequence.objects.filter(recipient_id=user_id).values_list('last_seq', flat=True).first()
+    return sequence or 0
+
+
+def fetch_since(user_id, seq):
+    """
+    Return ([(watermark, data), ...], last seq) for up to BATCH_LIMIT
+    notifications delivered after `seq`, oldest first.
+    """
+    rows = list(
+        Notification.objects.filter(recipient_id=user_id, seq__gt=seq).select_related('actor').order_by('seq')[:BATCH_LIMIT]
+    )
+    data = NotificationSerializer(rows, many=True).data
+    events = [(encode_watermark(row.seq), item) for row, item in zip(rows, data)]
+    return events, (rows[-1].seq if rows else seq)
+
+
+def authenticate(request):
+    """Run the configured DRF authenticators against a plain Django request."""
+    drf_request = Request(request, authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES])
+    try:
+        return drf_request.user
+    except APIException:
+        return None
@@ -1,3 +1,462 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+import unittest
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import AsyncRequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from posts.models import Post
+from . import hub, views
+from .archive import ARCHIVE_FIELDS, ArchiveWriter, archived_for
+from .models import Notification, NotificationEvent
+from .outbox import MAX_ATTEMPTS, drain_batch, enqueue, stats
+from .retention import expired_filter
+from . import unread
+from .unread import unread_count, unread_key, unread_version
+
+User = get_user_model()
+
+
+class NotificationTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.recipient = User.objects.create_user(username='recipient')
+        self.actors = [User.objects.create_user(username=f'actor{i}') for i in range(3)]
+        local_hub = mock.patch.object(hub, '_hub', hub.Hub(hub.LocalBackend))
+        local_hub.start()
+        self.addCleanup(local_hub.stop)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def drain(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return drain_batch()
+
+
+class OutboxTests(NotificationTestCase):
+    def test_event_exists_only_if_the_action_commits(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            enqueue(self.recipient.pk, self.actors[0].pk, 'followed you')
+            raise RuntimeError
+        self.assertFalse(NotificationEvent.objects.exists())
+
+    def test_drain_delivers_and_deletes_events(self):
+        for verb in ['followed you', 'liked your post']:
+            enqueue(self.recipient.pk, self.actors[0].pk, verb)
+        self.assertEqual(stats()['depth'], 2)
+        self.assertEqual(self.drain(), 2)
+        self.assertFalse(NotificationEvent.objects.exists())
+        self.assertEqual(Notification.objects.filter(recipient=self.recipient).count(), 2)
+        self.assertEqual(self.drain(), 0)
+
+    def test_failing_batches_are_parked(self):
+        enqueue(self.recipient.pk, self.actors[0].pk, 'followed you')
+        with mock.patch('notifications.outbox.deliver', side_effect=RuntimeError):
+            for _ in range(MAX_ATTEMPTS):
+                with self.assertRaises(RuntimeError):
+                    drain_batch()
+        self.assertEqual(stats(), {'depth': 0, 'lag_seconds': 0.0, 'parked': 1})
+        self.assertEqual(self.drain(), 0)
+
+    def test_like_enqueues_for_the_author(self):
+        post = Post.objects.create(author=self.recipient, title='t', content='')
+        with mock.patch('posts.trending.engine.background', False):
+            self.client_for(self.actors[0]).post(f'/api/posts/{post.pk}/like/')
+        self.drain()
+        notification = Notification.objects.get(recipient=self.recipient)
+        self.assertEqual((notification.actor_id, notification.verb, notification.target), (self.actors[0].pk, 'liked', post))
+
+
+class CoalescingTests(NotificationTestCase):
+    def setUp(self):
+        super().setUp()
+        self.actors += [User.objects.create_user(username=f'actor{i}') for i in range(3, 8)]
+
+    def like(self, actor, target_id=1):
+        enqueue(self.recipient.pk, actor.pk, 'liked your post', target_id=target_id)
+
+    def test_repeats_fold_into_one_row(self):
+        for actor in self.actors:
+            self.like(actor)
+        self.drain()
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, len(self.actors))
+        self.assertEqual(notification.actor_id, self.actors[-1].pk)
+        self.assertEqual(notification.actor_sample, [actor.pk for actor in reversed(self.actors)][:5])
+
+    def test_repeat_actor_outside_the_sample_is_counted_once(self):
+        for actor in self.actors[:6]:
+            self.like(actor)
+        self.drain()
+        # actors[0] has left the 5-id sample by now.
+        self.like(self.actors[0])
+        self.like(self.actors[0])
+        self.drain()
+        notification = Notification.objects.get()
+        self.assertEqual(notification.actor_count, 6)
+        self.assertEqual(notification.actor_sample[0], self.actors[0].pk)
+        self.assertEqual(len(set(notification.actor_sample)), len(notification.actor_sample))
+
+    def test_other_targets_and_read_rows_are_not_folded(self):
+        self.like(self.actors[0], target_id=1)
+        self.like(self.actors[1], target_id=2)
+        self.drain()
+        Notification.objects.filter(target_object_id=1).update(read=True)
+        self.like(self.actors[2], target_id=1)
+        self.drain()
+        self.assertEqual(Notification.objects.count(), 3)
+        self.assertEqual(set(Notification.objects.values_list('actor_count', flat=True)), {1})
+
+
+class NotificationListTests(NotificationTestCase):
+    def setUp(self):
+        super().setUp()
+        post_type = ContentType.objects.get_for_model(Post)
+        self.posts = [Post.objects.create(author=self.recipient, title=f'p{i}', content='') for i in range(4)]
+        for index, post in enumerate(self.posts):
+            enqueue(self.recipient.pk, self.actors[index % 3].pk, 'liked', post_type, post.pk)
+        enqueue(self.recipient.pk, self.actors[0].pk, 'followed you')
+        self.drain()
+        self.client = self.client_for(self.recipient)
+
+    def list_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/notifications/')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results'], len(queries)
+
+    def test_targets_and_actors_are_resolved_in_batches(self):
+        results, queries = self.list_queries()
+        self.assertEqual([item['target_str'] for item in results], [None] + [p.title for p in reversed(self.posts)])
+        self.assertEqual(results[1]['actor_username'], self.actors[0].username)
+        # More notifications with more targets cost no extra queries.
+        enqueue(self.recipient.pk, self.actors[1].pk, 'liked', ContentType.objects.get_for_model(Post),
+                Post.objects.create(author=self.recipient, title='extra', content='').pk)
+        self.drain()
+        self.assertEqual(self.list_queries()[1], queries)
+
+    def test_deleted_target_renders_as_none(self):
+        self.posts[0].delete()
+        results, _ = self.list_queries()
+        self.assertIsNone(results[-1]['target_str'])
+
+
+class UnreadCountTests(NotificationTestCase):
+    def cached(self):
+        return cache.get(unread_key(self.recipient.pk, unread_version(self.recipient.pk)))
+
+    def test_delivery_drops_cached_count(self):
+        self.assertEqual(unread_count(self.recipient.pk), 0)
+        enqueue(self.recipient.pk, self.actors[0].pk, 'followed you')
+        self.drain()
+        # Delivery runs in the drainer, so it invalidates rather than
+        # incrementing a counter only its own process might hold.
+        self.assertIsNone(self.cached())
+        self.assertEqual(unread_count(self.recipient.pk), 1)
+
+    def counting_during(self, change):
+        # Runs `change` after unread_count() has counted but before it stores.
+        count = unread.count_from_database
+
+        def count_then_change(user_id):
+            counted = count(user_id)
+            change()
+            return counted
+
+        return mock.patch.object(unread, 'count_from_database', count_then_change)
+
+    def test_count_taken_before_a_delivery_is_not_kept(self):
+        enqueue(self.recipient.pk, self.actors[0].pk, 'followed you')
+        with self.counting_during(self.drain):
+            self.assertEqual(unread_count(self.recipient.pk), 0)
+        self.assertEqual(unread_count(self.recipient.pk), 1)
+
+    def test_count_taken_before_mark_read_is_not_kept(self):
+        enqueue(self.recipient.pk, self.actors[0].pk, 'followed you')
+        self.drain()
+        self.assertEqual(unread_count(self.recipient.pk), 1)
+        cache.clear()
+
+        def mark_read():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client_for(self.recipient).post('/api/notifications/mark-read/')
+
+        with self.counting_during(mark_read):
+            self.assertEqual(unread_count(self.recipient.pk), 1)
+        self.assertEqual(unread_count(self.recipient.pk), 0)
+
+    def test_mark_read_decrements_cached_count(self):
+        for verb in ['followed you', 'liked your post', 'commented on your post']:
+            enqueue(self.recipient.pk, self.actors[0].pk, verb)
+        self.drain()
+        client = self.client_for(self.recipient)
+        self.assertEqual(client.get('/api/notifications/unread-count/').json()['unread_count'], 3)
+        first = Notification.objects.filter(recipient=self.recipient).order_by('id').first()
+        with self.captureOnCommitCallbacks(execute=True):
+            response = client.post('/api/notifications/mark-read/', {'up_to_id': first.pk})
+        self.assertEqual(response.json()['marked'], 1)
+        self.assertEqual(self.cached(), 2)
+        self.assertEqual(client.get('/api/notifications/unread-count/').json()['unread_count'], 2)
+
+
+class HubBackendTests(NotificationTestCase):
+    def test_drainer_refuses_local_backend(self):
+        with mock.patch.object(hub, 'BACKEND', 'notifications.hub.LocalBackend'):
+            with self.assertRaises(CommandError):
+                call_command('drain_notification_outbox', '--once')
+
+
+class FileBackendTests(TestCase):
+    async def test_hubs_sharing_a_file_wake_each_other(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(NOTIFICATIONS_HUB_FILE=os.path.join(directory, 'hub.ndjson')), \
+                mock.patch.object(hub.FileBackend, 'poll_interval', 0.01):
+            listener, publisher = hub.Hub(hub.FileBackend), hub.Hub(hub.FileBackend)
+            try:
+                with listener.subscribe(1) as subscription, listener.subscribe(2) as other:
+                    publisher.publish({'recipient_id': 1, 'id': 7})
+                    self.assertTrue(await subscription.wait(5))
+                    self.assertFalse(await other.wait(0.05))
+            finally:
+                listener.backend.stop()
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', "LISTEN/NOTIFY needs PostgreSQL")
+class PostgresBackendTests(TransactionTestCase):
+    def test_publish_reaches_listener_on_another_connection(self):
+        received = threading.Event()
+        listener_hub = mock.Mock(dispatch=lambda message: received.set() if message['id'] == 7 else None)
+        listener = hub.PostgresBackend(listener_hub)
+        listener.poll_timeout = 0.1
+        listener.start(None)
+        self.addCleanup(listener.stop)
+        # LISTEN is issued asynchronously; keep publishing until it lands.
+        publisher = hub.PostgresBackend(mock.Mock())
+        for _ in range(50):
+            publisher.publish({'recipient_id': 1, 'id': 7})
+            if received.wait(0.1):
+                break
+        self.assertTrue(received.is_set())
+
+
+class StreamTests(NotificationTestCase):
+    # The views are called directly: notifications.asgi serves them without
+    # middleware, and a blocked long-poll must not hold up the test's own
+    # database work.
+    factory = AsyncRequestFactory()
+
+    def setUp(self):
+        super().setUp()
+        token = Token.objects.create(user=self.recipient)
+        self.headers = {'Authorization': f'Token {token.key}'}
+
+    def deliver(self, verb, actor=0, age=0):
+        event = enqueue(self.recipient.pk, self.actors[actor].pk, verb)
+        if age:
+            NotificationEvent.objects.filter(pk=event.pk).update(created_at=timezone.now() - timedelta(seconds=age))
+        self.drain()
+
+    async def poll(self, after=None, timeout=0):
+        params = {'timeout': timeout}
+        if after is not None:
+            params['after'] = after
+        response = await views.poll_notifications(self.factory.get('/api/notifications/poll/', params, headers=self.headers))
+        return response.status_code, json.loads(response.content)
+
+    async def stream(self, last_event_id=None):
+        headers = dict(self.headers)
+        if last_event_id is not None:
+            headers['Last-Event-ID'] = last_event_id
+        response = await views.stream_notifications(self.factory.get('/api/notifications/stream/', headers=headers))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return response.streaming_content
+
+    def parse(self, chunk):
+        chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+        fields = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+        self.assertEqual(fields['event'], 'notification')
+        return fields['id'], json.loads(fields['data'])
+
+    async def test_late_deliveries_land_after_the_watermark(self):
+        _, body = await self.poll()
+        self.assertEqual(body['results'], [])
+        await sync_to_async(self.deliver)('liked')
+        _, body = await self.poll(body['watermark'])
+        self.assertEqual([item['verb'] for item in body['results']], ['liked'])
+        # An older action delivered later, e.g. by a slower drain worker.
+        await sync_to_async(self.deliver)('commented', age=600)
+        _, body = await self.poll(body['watermark'])
+        self.assertEqual([item['verb'] for item in body['results']], ['commented'])
+        # A late event folded into an existing row re-sends it without
+        # moving its timestamp back.
+        await sync_to_async(self.deliver)('liked', actor=1, age=1200)
+        _, body = await self.poll(body['watermark'])
+        self.assertEqual([(item['verb'], item['actor_count']) for item in body['results']], [('liked', 2)])
+        liked = await Notification.objects.aget(verb='liked')
+        self.assertGreater(liked.timestamp, timezone.now() - timedelta(seconds=60))
+
+    async def test_invalid_watermarks_are_rejected(self):
+        for watermark in ['garbage', 'WyJ4Il0=']:  # the second is ["x"]
+            status, body = await self.poll(watermark)
+            self.assertEqual((status, body['detail']), (404, 'Invalid watermark'))
+        request = self.factory.get('/api/notifications/stream/', headers={**self.headers, 'Last-Event-ID': 'garbage'})
+        self.assertEqual((await views.stream_notifications(request)).status_code, 404)
+
+    async def test_poll_requires_authentication(self):
+        response = await views.poll_notifications(self.factory.get('/api/notifications/poll/'))
+        self.assertEqual(response.status_code, 401)
+        # Routed through the URLconf as well.
+        self.assertEqual((await self.async_client.get('/api/notifications/poll/')).status_code, 401)
+
+    async def test_poll_times_out_with_the_same_watermark(self):
+        _, body = await self.poll()
+        status, timed_out = await self.poll(body['watermark'], timeout=0.05)
+        self.assertEqual((status, timed_out), (200, {'results': [], 'watermark': body['watermark']}))
+
+    async def test_poll_wakes_on_delivery_through_the_file_backend(self):
+        with tempfile.TemporaryDirectory() as directory, \
+                override_settings(NOTIFICATIONS_HUB_FILE=os.path.join(directory, 'hub.ndjson')), \
+                mock.patch.object(hub.FileBackend, 'poll_interval', 0.01), \
+                mock.patch.object(hub, '_hub', hub.Hub(hub.FileBackend)):
+            _, body = await self.poll()
+            waiting = asyncio.ensure_future(self.poll(body['watermark'], timeout=10))
+            try:
+                await asyncio.sleep(0.1)
+                self.assertFalse(waiting.done())
+                await sync_to_async(self.deliver)('followed you')
+                _, woken = await asyncio.wait_for(waiting, 5)
+            finally:
+                hub.get_hub().backend.stop()
+        self.assertEqual([item['verb'] for item in woken['results']], ['followed you'])
+
+    async def test_stream_frames_events_and_resumes_from_last_event_id(self):
+        _, body = await self.poll()
+        for verb in ['followed you', 'liked']:
+            await sync_to_async(self.deliver)(verb)
+
+        content = await self.stream(body['watermark'])
+        try:
+            self.assertEqual(await anext(content), b'retry: 3000\n\n')
+            first_id, first = self.parse(await anext(content))
+            _, second = self.parse(await anext(content))
+            self.assertEqual([first['verb'], second['verb']], ['followed you', 'liked'])
+        finally:
+            await content.aclose()
+
+        with mock.patch.object(views, 'STREAM_HEARTBEAT', 0.05):
+            content = await self.stream(first_id)
+            try:
+                await anext(content)
+                self.assertEqual(self.parse(await anext(content))[1]['verb'], 'liked')
+                self.assertEqual(await anext(content), b': keep-alive\n\n')
+                # The local hub wakes the stream as soon as delivery commits.
+                await sync_to_async(self.deliver)('commented')
+                self.assertEqual(self.parse(await anext(content))[1]['verb'], 'commented')
+            finally:
+                await content.aclose()
+
+
+class RetentionTests(NotificationTestCase):
+    policy = {
+        'default': {'read': 30, 'unread': 90},
+        'liked': {'read': 7},
+        'mentioned you': {'read': None, 'unread': None},
+    }
+
+    def setUp(self):
+        super().setUp()
+        now = timezone.now()
+        rows = [
+            # (verb, read, age in days, expired)
+            ('liked', True, 10, True),
+            ('liked', True, 5, False),
+            ('liked', False, 60, False),  # unread falls back to the default
+            ('liked', False, 100, True),
+            ('followed you', True, 40, True),
+            ('followed you', True, 20, False),
+            ('followed you', False, 60, False),
+            ('followed you', False, 100, True),
+            ('mentioned you', True, 1000, False),
+            ('mentioned you', False, 1000, False),
+        ]
+        created = Notification.objects.bulk_create([
+            Notification(recipient=self.recipient, actor=self.actors[0], verb=verb, read=read,
+                         timestamp=now - timedelta(days=age))
+            for verb, read, age, _ in rows
+        ])
+        self.expired = {notification.pk for notification, row in zip(created, rows) if row[3]}
+        self.kept = {notification.pk for notification in created} - self.expired
+
+    def test_policy_applies_verb_rules_over_the_default(self):
+        expired = Notification.objects.filter(expired_filter(policy=self.policy))
+        self.assertEqual(set(expired.values_list('pk', flat=True)), self.expired)
+
+    def test_purge_deletes_expired_rows_and_adjusts_unread_counts(self):
+        self.assertEqual(unread_count(self.recipient.pk), 5)
+        with override_settings(NOTIFICATIONS_RETENTION=self.policy), self.captureOnCommitCallbacks(execute=True):
+            call_command('purge_notifications', '--sleep', '0', '--chunk-size', '2', stdout=io.StringIO())
+        self.assertEqual(set(Notification.objects.values_list('pk', flat=True)), self.kept)
+        with self.assertNumQueries(0):
+            self.assertEqual(unread_count(self.recipient.pk), 3)
+
+    def test_dry_run_changes_nothing(self):
+        self.assertEqual(unread_count(self.recipient.pk), 5)
+        version = unread_version(self.recipient.pk)
+        out = io.StringIO()
+        with override_settings(NOTIFICATIONS_RETENTION=self.policy), self.captureOnCommitCallbacks(execute=True):
+            call_command('purge_notifications', '--dry-run', '--archive', '--sleep', '0', stdout=out)
+        self.assertIn(f'Would purge {len(self.expired)} notifications.', out.getvalue())
+        self.assertEqual(Notification.objects.count(), len(self.expired) + len(self.kept))
+        self.assertEqual(unread_version(self.recipient.pk), version)
+        self.assertEqual(cache.get(unread_key(self.recipient.pk, version)), 5)
+
+
+class ArchiveTests(NotificationTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        archive_settings = override_settings(NOTIFICATIONS_ARCHIVE_DIR=directory.name)
+        archive_settings.enable()
+        self.addCleanup(archive_settings.disable)
+        old = timezone.now() - timedelta(days=365)
+        self.notifications = Notification.objects.bulk_create([
+            Notification(recipient=self.recipient, actor=actor, verb='followed you', timestamp=old)
+            for actor in self.actors
+        ])
+
+    def test_purge_archives_each_row_once(self):
+        # A chunk whose delete rolled back was archived by an earlier run.
+        ArchiveWriter().write(list(Notification.objects.values(*ARCHIVE_FIELDS)[:1]))
+        call_command('purge_notifications', '--archive', '--sleep', '0', stdout=io.StringIO())
+        self.assertFalse(Notification.objects.exists())
+        rows = archived_for(self.recipient.pk)
+        self.assertEqual(sorted(row['id'] for row in rows), [n.pk for n in self.notifications])
+
+    def test_archive_view_is_staff_only_and_bounded(self):
+        call_command('purge_notifications', '--archive', '--sleep', '0', stdout=io.StringIO())
+        url = '/api/notifications/archived/'
+        self.assertEqual(self.client_for(self.recipient).get(url).status_code, 403)
+        staff = User.objects.create_user(username='staff', is_staff=True)
+        response = self.client_for(staff).get(url, {'recipient': self.recipient.pk, 'limit': 0})
+        self.assertEqual(len(response.json()['results']), 1)
+        response = self.client_for(staff).get(url, {'recipient': self.recipient.pk})
+        self.assertEqual(len(response.json()['results']), 3)
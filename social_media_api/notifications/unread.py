@@ -0,0 +1,88 @@
+"""
+Cached per-user unread notification counts.
+
+The count is computed from the partial (recipient, id) WHERE NOT read index
+and cached under the user's current version. Delivery, which runs in the
+outbox drainer, turns the versions of its recipients over; marking read
+decrements the cached count in place, or turns the version over if nothing
+is cached. A count is stored with cache.add() under the version read before
+counting, so a count taken just before a change commits either lands before
+the change is applied to it, or under a version nobody reads any more; it
+never replaces a newer value. A missing count is recomputed on the next
+read, and UNREAD_TTL is short so that anything missed heals quickly.
+"""
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Notification
+
+UNREAD_TTL = getattr(settings, 'NOTIFICATIONS_UNREAD_TTL', 5 * 60)
+# Outlives every count cached under it.
+VERSION_TTL = 2 * UNREAD_TTL
+
+
+def version_key(user_id):
+    return f'notifications:unread_version:{user_id}'
+
+
+def unread_key(user_id, version):
+    return f'notifications:unread:{user_id}:{version}'
+
+
+def unread_version(user_id):
+    key = version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, VERSION_TTL)
+        version = cache.get(key)
+    return version
+
+
+def count_from_database(user_id):
+    return Notification.objects.filter(recipient_id=user_id, read=False).count()
+
+
+def unread_count(user_id):
+    key = unread_key(user_id, unread_version(user_id))
+    count = cache.get(key)
+    if count is None:
+        count = count_from_database(user_id)
+        cache.add(key, count, UNREAD_TTL)
+    return count
+
+
+def _bump(user_ids):
+    token = uuid.uuid4().hex
+    cache.set_many({version_key(user_id): token for user_id in user_ids}, VERSION_TTL)
+
+
+def _adjust(user_id, delta):
+    version = cache.get(version_key(user_id))
+    if version is None:
+        return  # nothing cached; the next read counts from the database
+    key = unread_key(user_id, version)
+    try:
+        value = cache.incr(key, delta)
+    except ValueError:
+        # A reader may be about to store a count taken before this change.
+        _bump([user_id])
+        return
+    if value < 0:
+        _bump([user_id])
+
+
+def invalidate_unread(user_ids):
+    """Turn the versions of `user_ids` over once the current transaction commits."""
+    user_ids = set(user_ids)
+    if user_ids:
+        transaction.on_commit(lambda: _bump(user_ids))
+
+
+def adjust_unread(counts):
+    """Apply {user_id: delta} to cached counters once the current transaction commits."""
+    counts = {user_id: delta for user_id, delta in counts.items() if delta}
+    if counts:
+        transaction.on_commit(lambda: [_adjust(user_id, delta) for user_id, delta in counts.items()])
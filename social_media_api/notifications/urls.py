@@ -1,6 +1,18 @@
 from django.urls import path
-from .views import list_notifications
+from .views import (
+    list_notifications,
+    get_unread_count,
+    mark_read,
+    list_archived_notifications,
+    stream_notifications,
+    poll_notifications,
+)
 
 urlpatterns = [
     path('', list_notifications, name='notifications'),
+    path('unread-count/', get_unread_count, name='notifications-unread-count'),
+    path('mark-read/', mark_read, name='notifications-mark-read'),
+    path('archived/', list_archived_notifications, name='notifications-archived'),
+    path('stream/', stream_notifications, name='notifications-stream'),
+    path('poll/', poll_notifications, name='notifications-poll'),
 ]
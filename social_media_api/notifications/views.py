@@ -1,12 +1,139 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework import permissions
+from rest_framework import permissions, status
+from rest_framework.exceptions import NotFound
 from rest_framework.response import Response
 from .models import Notification
-from .serializers import NotificationSerializer
+from .serializers import NotificationSerializer, MarkReadSerializer
+from .pagination import NotificationPagination
+from .unread import unread_count, adjust_unread
+from .archive import archived_for
+from .hub import get_hub
+from .stream import BATCH_LIMIT, authenticate, current_seq, decode_watermark, encode_watermark, fetch_since
+
+STREAM_HEARTBEAT = getattr(settings, 'NOTIFICATIONS_STREAM_HEARTBEAT', 15)
+LONG_POLL_MAX_TIMEOUT = getattr(settings, 'NOTIFICATIONS_LONG_POLL_MAX_TIMEOUT', 30)
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def list_notifications(request):
-    notifications = Notification.objects.filter(recipient=request.user).order_by('-timestamp')
-    serializer = NotificationSerializer(notifications, many=True)
-    return Response(serializer.data)
+    notifications = Notification.objects.filter(recipient=request.user).select_related('actor')
+
+    paginator = NotificationPagination()
+    result_page = paginator.paginate_queryset(notifications, request)
+    serializer = NotificationSerializer(result_page, many=True)
+    return paginator.get_paginated_response(serializer.data)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def get_unread_count(request):
+    return Response({'unread_count': unread_count(request.user.pk)})
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def mark_read(request):
+    # Marks every unread notification with id <= up_to_id (or all of them)
+    # in one UPDATE over the (recipient, id) WHERE NOT read index.
+    serializer = MarkReadSerializer(data=request.data)
+    serializer.is_valid(raise_exception=True)
+
+    notifications = Notification.objects.filter(recipient=request.user, read=False)
+    if 'up_to_id' in serializer.validated_data:
+        notifications = notifications.filter(id__lte=serializer.validated_data['up_to_id'])
+    marked = notifications.update(read=True)
+    adjust_unread({request.user.pk: -marked})
+    return Response({'marked': marked}, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAdminUser])
+def list_archived_notifications(request):
+    # Slow path: scans every file of the compressed archive written by
+    # purge_notifications, so it is limited to staff (support lookups).
+    try:
+        recipient_id = int(request.query_params.get('recipient', request.user.pk))
+    except ValueError:
+        return Response({'detail': "recipient must be a user id."}, status=status.HTTP_400_BAD_REQUEST)
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 50)), 200))
+    except ValueError:
+        limit = 50
+    return Response({'results': archived_for(recipient_id, limit=limit)})
+
+
+# Streaming endpoints are plain async Django views so that, served over ASGI,
+# an idle connection costs a coroutine rather than a worker thread.
+
+def _unauthorized():
+    return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+
+def _invalid_watermark(exc):
+    # Same answer as a bad keyset cursor on the paginated endpoints; never a
+    # silent replay of the whole history.
+    return JsonResponse({'detail': str(exc.detail)}, status=exc.status_code)
+
+
+async def stream_notifications(request):
+    """Server-Sent Events: push notifications newer than Last-Event-ID (or now)."""
+    user = await sync_to_async(authenticate)(request)
+    if user is None or not user.is_authenticated:
+        return _unauthorized()
+
+    watermark = request.headers.get('Last-Event-ID') or request.GET.get('after')
+    if watermark:
+        try:
+            seq = decode_watermark(watermark)
+        except NotFound as exc:
+            return _invalid_watermark(exc)
+    else:
+        seq = await sync_to_async(current_seq)(user.pk)
+
+    async def events(seq):
+        # Subscribe before the first read so nothing published in between is missed.
+        with get_hub().subscribe(user.pk) as subscription:
+            yield 'retry: 3000\n\n'
+            while True:
+                batch, seq = await sync_to_async(fetch_since)(user.pk, seq)
+                for event_id, data in batch:
+                    yield f"id: {event_id}\nevent: notification\ndata: {json.dumps(data, default=str)}\n\n"
+                if len(batch) == BATCH_LIMIT:
+                    continue
+                if not await subscription.wait(STREAM_HEARTBEAT):
+                    yield ': keep-alive\n\n'
+
+    response = StreamingHttpResponse(events(seq), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+async def poll_notifications(request):
+    """Long-poll: block until a notification newer than ?after= exists, or the timeout passes."""
+    user = await sync_to_async(authenticate)(request)
+    if user is None or not user.is_authenticated:
+        return _unauthorized()
+
+    watermark = request.GET.get('after')
+    if not watermark:
+        return JsonResponse({'results': [], 'watermark': encode_watermark(await sync_to_async(current_seq)(user.pk))})
+    try:
+        seq = decode_watermark(watermark)
+    except NotFound as exc:
+        return _invalid_watermark(exc)
+    try:
+        timeout = min(float(request.GET.get('timeout', 25)), LONG_POLL_MAX_TIMEOUT)
+    except ValueError:
+        timeout = LONG_POLL_MAX_TIMEOUT
+
+    with get_hub().subscribe(user.pk) as subscription:
+        batch, seq = await sync_to_async(fetch_since)(user.pk, seq)
+        if not batch and await subscription.wait(timeout):
+            batch, seq = await sync_to_async(fetch_since)(user.pk, seq)
+    return JsonResponse({'results': [data for _, data in batch], 'watermark': encode_watermark(seq)})
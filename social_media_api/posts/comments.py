@@ -0,0 +1,48 @@
+"""
+Comment previews for post representations.
+
+Posts embed only their PREVIEW_SIZE newest comments; the full list is paged
+through the post's comments endpoint. Previews for a whole page of posts
+come from one windowed query over the (post, -created_at, -id) index.
+"""
+from django.conf import settings
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Comment
+
+PREVIEW_SIZE = getattr(settings, 'POSTS_COMMENT_PREVIEW_SIZE', 3)
+
+
+def latest_comments(post_ids, limit=PREVIEW_SIZE):
+    """Return {post_id: [Comment, ...]}, each post's `limit` newest comments first."""
+    previews = {post_id: [] for post_id in post_ids}
+    if not previews or limit <= 0:
+        return previews
+    rank = Window(RowNumber(), partition_by=F('post_id'), order_by=[F('created_at').desc(), F('id').desc()])
+    comments = (
+        Comment.objects.filter(post_id__in=previews)
+        .annotate(rank=rank)
+        .filter(rank__lte=limit)
+        .select_related('author')
+        .order_by('post_id', 'rank')
+    )
+    for comment in comments:
+        previews[comment.post_id].append(comment)
+    return previews
+
+
+def attach_latest_comments(posts, limit=PREVIEW_SIZE):
+    """Set `latest_comments` on each post, for PostSerializer."""
+    previews = latest_comments([post.pk for post in posts], limit)
+    for post in posts:
+        post.latest_comments = previews[post.pk]
+    return posts
+
+
+def preview(post):
+    """The post's attached preview, or its newest comments if none was attached."""
+    comments = getattr(post, 'latest_comments', None)
+    if comments is None:
+        comments = latest_comments([post.pk])[post.pk]
+    return comments
@@ -0,0 +1,96 @@
+"""
+Like counter maintenance.
+
+In the default 'direct' mode every like updates Post.like_count in place. On
+a viral post that serializes all likers on one row lock, so the 'sharded'
+mode (POSTS_LIKE_COUNTER_MODE) spreads increments over
+POSTS_LIKE_COUNTER_SHARDS LikeCounterShard rows per post. The read path adds
+the unflushed shard deltas to the stored count, and flush_like_shards()
+periodically folds them back into the Post row.
+"""
+import random
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Post, LikeCounterShard
+
+MODE = getattr(settings, 'POSTS_LIKE_COUNTER_MODE', 'direct')
+SHARDS = getattr(settings, 'POSTS_LIKE_COUNTER_SHARDS', 16)
+
+
+def sharded():
+    return MODE == 'sharded'
+
+
+def record_like(post_id, delta):
+    if not sharded():
+        posts = Post.objects.filter(pk=post_id)
+        if delta < 0:
+            posts = posts.filter(like_count__gte=-delta)
+        posts.update(like_count=F('like_count') + delta)
+        return
+
+    shard = random.randrange(SHARDS)
+    shards = LikeCounterShard.objects.filter(post_id=post_id, shard=shard)
+    if shards.update(delta=F('delta') + delta):
+        return
+    try:
+        with transaction.atomic():
+            LikeCounterShard.objects.create(post_id=post_id, shard=shard, delta=delta)
+    except IntegrityError:
+        # Another request created the shard first.
+        shards.update(delta=F('delta') + delta)
+
+
+def pending_likes():
+    """Expression summing a post's unflushed shard deltas."""
+    pending = (
+        LikeCounterShard.objects.filter(post=OuterRef('pk'))
+        .order_by()
+        .values('post')
+        .annotate(total=Sum('delta'))
+        .values('total')
+    )
+    return Coalesce(Subquery(pending), Value(0))
+
+
+def with_pending_likes(queryset):
+    """Annotate posts with `pending_likes` when running in sharded mode."""
+    if not sharded():
+        return queryset
+    return queryset.annotate(pending_likes=pending_likes())
+
+
+def like_total(post):
+    return post.like_count + getattr(post, 'pending_likes', 0)
+
+
+def flush_like_shards(batch_size=500):
+    """Fold shard deltas into Post.like_count. Returns (posts, likes) flushed."""
+    posts_flushed, likes_flushed = 0, 0
+    while True:
+        with transaction.atomic():
+            shards = list(
+                LikeCounterShard.objects.select_for_update()
+                .exclude(delta=0)
+                .order_by('post_id', 'shard')[:batch_size]
+            )
+            if not shards:
+                break
+            totals = {}
+            for shard in shards:
+                totals[shard.post_id] = totals.get(shard.post_id, 0) + shard.delta
+
+            Post.objects.filter(pk__in=totals).update(like_count=Case(
+                *[When(pk=post_id, then=Greatest(F('like_count') + total, 0)) for post_id, total in totals.items()],
+                output_field=IntegerField(),
+            ))
+            LikeCounterShard.objects.filter(pk__in=[shard.pk for shard in shards]).update(delta=0)
+        posts_flushed += len(totals)
+        likes_flushed += sum(totals.values())
+        if len(shards) < batch_size:
+            break
+    return posts_flushed, likes_flushed
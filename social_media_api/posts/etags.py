@@ -0,0 +1,69 @@
+"""
+ETags for post and feed responses.
+
+A post's representation changes when it is edited or its comments change
+(both bump Post.version) or when its like total moves, so the pair
+(version, like total) stamps it. Stamps come from one indexed lookup on the
+post rows, taken before anything is serialized; a matching If-None-Match
+gets an empty 304.
+
+A feed page is stamped without reading a post: by the reader's feed
+version (posts.feed_cache), which every fan-out, edit, delete and follow
+turns over, plus the cached pull-model timeline entries the page draws on.
+For a reader of no pull-model authors that is a cache read and no query; a
+reader of some pays one indexed lookup for which of them they follow. Like
+and comment counts are not in the feed stamp: like cached pages, a client
+revalidating a feed can see them lag, here until the version expires
+(twice FEED_CACHE_TTL).
+
+Stamps are read before the response body is built, so a body can only be
+newer than its ETag, never older. A client that cached it revalidates and
+gets a 200 rather than keeping stale data.
+"""
+import hashlib
+
+from django.db.models import F
+from django.utils.http import parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from .counters import pending_likes, sharded
+from .models import Post
+
+
+def stamp_queryset(posts):
+    """`posts` as (pk, version, like total) rows."""
+    if sharded():
+        posts = posts.annotate(likes=F('like_count') + pending_likes())
+    else:
+        posts = posts.annotate(likes=F('like_count'))
+    return posts.values_list('pk', 'version', 'likes')
+
+
+def post_stamps(post_ids):
+    """Return {post_id: (version, like total)} for the posts that exist."""
+    rows = stamp_queryset(Post.objects.filter(pk__in=post_ids))
+    return {pk: (version, likes) for pk, version, likes in rows}
+
+
+def post_etag(post_id, stamp):
+    version, likes = stamp
+    return quote_etag(f'p{post_id}.{version}.{likes}')
+
+
+def feed_etag(version, size, cursor, pulled):
+    """ETag of a feed page: the reader's feed version, the page asked for and its pull-model entries."""
+    digest = hashlib.sha1(repr((version, size, cursor, pulled)).encode())
+    return quote_etag(f'f{digest.hexdigest()[:32]}')
+
+
+def not_modified(request, etag):
+    """A 304 response if the request's If-None-Match covers `etag`, else None."""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return None
+    etags = parse_etags(header)
+    # Weak comparison, as RFC 9110 requires for If-None-Match.
+    if '*' in etags or etag.removeprefix('W/') in {tag.removeprefix('W/') for tag in etags}:
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers={'ETag': etag})
+    return None
@@ -0,0 +1,66 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Post, FeedEntry
+from .timelines import pull_author_ids
+
+User = get_user_model()
+Follow = User.following.through
+
+FANOUT_BATCH_SIZE = getattr(settings, 'FEED_FANOUT_BATCH_SIZE', 1000)
+BACKFILL_LIMIT = getattr(settings, 'FEED_BACKFILL_LIMIT', 200)
+
+
+def _entry(user_id, post):
+    return FeedEntry(user_id=user_id, post_id=post.pk, author_id=post.author_id, created_at=post.created_at)
+
+
+def fanout_post(post, batch_size=FANOUT_BATCH_SIZE):
+    """Write `post` into the feed inbox of every follower of its author."""
+    if post.author_id in pull_author_ids():
+        return
+    follower_ids = (
+        Follow.objects.filter(to_user_id=post.author_id)
+        .order_by('from_user_id')
+        .values_list('from_user_id', flat=True)
+    )
+    batch = []
+    for follower_id in follower_ids.iterator(chunk_size=batch_size):
+        batch.append(_entry(follower_id, post))
+        if len(batch) >= batch_size:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def backfill_follow(user_id, author_ids, limit=BACKFILL_LIMIT):
+    """Copy the most recent posts of newly followed authors into a user's feed."""
+    pull_ids = pull_author_ids()
+    author_ids = [author_id for author_id in author_ids if author_id not in pull_ids]
+    if not author_ids:
+        return
+    # One windowed query for every author, so a bulk follow costs the same as a single one.
+    posts = (
+        Post.objects.filter(author_id__in=author_ids)
+        .annotate(rank=Window(
+            RowNumber(),
+            partition_by=[F('author_id')],
+            order_by=[F('created_at').desc(), F('id').desc()],
+        ))
+        .filter(rank__lte=limit)
+        .only('id', 'author_id', 'created_at')
+    )
+    FeedEntry.objects.bulk_create([_entry(user_id, post) for post in posts], ignore_conflicts=True)
+
+
+def prune_unfollow(user_id, author_ids):
+    FeedEntry.objects.filter(user_id=user_id, author_id__in=author_ids).delete()
+
+
+def rebuild_feed(user_id, limit=BACKFILL_LIMIT):
+    FeedEntry.objects.filter(user_id=user_id).delete()
+    author_ids = Follow.objects.filter(from_user_id=user_id).values_list('to_user_id', flat=True)
+    backfill_follow(user_id, list(author_ids), limit=limit)
@@ -0,0 +1,198 @@
+"""
+Cache of the first FEED_CACHE_PAGES serialized feed pages per user.
+
+A user's pages live in one cache entry per page size, tagged with the
+user's feed generation. A request fetches the generation and the entry in
+one get_many; a mismatch means the entry is stale. Invalidation just writes
+a fresh generation token, so it is one set_many per batch of users however
+many pages they had cached:
+
+* an author posting, editing or deleting a post resets every follower
+  (the fan-out), except for pull-model authors (posts.timelines), whose
+  audience is too large;
+* following or unfollowing resets the follower.
+
+The generation doubles as the user's feed version for ETags (posts.etags).
+Each cached page keeps the ETag it was built for and is only served for
+that ETag, so a page that drew on a pull-model timeline is rebuilt as soon
+as the timeline changes; such pages are also kept for FEED_CACHE_PULL_TTL
+only.
+
+The generation tokens are written by whichever process handles the post or
+follow, so the default cache must be shared by every worker (see
+social_media_api.caches); with a per-process cache other workers serve their
+old pages until the TTL. Like and comment counts inside cached pages can lag
+by up to the TTL.
+Concurrent misses for the same user take a cache.add() lock; losers wait
+briefly for the winner's entry instead of all rebuilding the page.
+"""
+import logging
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+
+from .timelines import pull_author_ids
+
+logger = logging.getLogger(__name__)
+
+User = get_user_model()
+Follow = User.following.through
+
+PAGES = getattr(settings, 'FEED_CACHE_PAGES', 3)
+TTL = getattr(settings, 'FEED_CACHE_TTL', 5 * 60)
+PULL_TTL = getattr(settings, 'FEED_CACHE_PULL_TTL', 30)
+LOCK_TIMEOUT = getattr(settings, 'FEED_CACHE_LOCK_TIMEOUT', 10)
+LOCK_WAIT = getattr(settings, 'FEED_CACHE_LOCK_WAIT', 2.0)
+FANOUT_BATCH_SIZE = getattr(settings, 'FEED_CACHE_FANOUT_BATCH_SIZE', 1000)
+REPORT_EVERY = getattr(settings, 'FEED_CACHE_REPORT_EVERY', 10_000)
+# Outlives any page entry written under it.
+GENERATION_TTL = 2 * max(TTL, PULL_TTL)
+
+
+def generation_key(user_id):
+    return f'posts:feed_gen:{user_id}'
+
+
+def pages_key(user_id, size):
+    return f'posts:feed_pages:{user_id}:{size}'
+
+
+def lock_key(user_id, size):
+    return f'posts:feed_lock:{user_id}:{size}'
+
+
+class FeedCacheMetrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.hits = self.misses = self.uncached = self.waits = 0
+        self.invalidations = self.invalidated_users = 0
+        self.stored_entries = self.stored_bytes = 0
+
+    def add(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+            lookups = self.hits + self.misses + self.uncached
+        if REPORT_EVERY and {'hits', 'misses', 'uncached'} & counts.keys() and lookups % REPORT_EVERY == 0:
+            logger.info('feed cache: %s', self.snapshot())
+
+    def snapshot(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'uncached': self.uncached,
+                'stampede_waits': self.waits,
+                'hit_ratio': self.hits / lookups if lookups else 0.0,
+                'invalidations': self.invalidations,
+                'mean_fanout': self.invalidated_users / self.invalidations if self.invalidations else 0.0,
+                'mean_entry_bytes': self.stored_bytes / self.stored_entries if self.stored_entries else 0.0,
+            }
+
+
+metrics = FeedCacheMetrics()
+
+
+def _current(user_id, size):
+    values = cache.get_many([generation_key(user_id), pages_key(user_id, size)])
+    generation = values.get(generation_key(user_id))
+    entry = values.get(pages_key(user_id, size))
+    if entry is None or entry['generation'] != generation:
+        entry = {'generation': generation, 'pages': {}, 'next': set()}
+    return generation, entry
+
+
+def feed_version(user_id):
+    """
+    The user's feed generation, created if missing, so that it also turns
+    over once it expires after GENERATION_TTL.
+    """
+    key = generation_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, GENERATION_TTL)
+        version = cache.get(key)
+    return version
+
+
+def cached_page(user_id, size, cursor, etag, build):
+    """
+    Return the cached feed page {'content', 'etag'} for `cursor` ('' for the
+    first page) and `etag`, calling build() on a miss. build() returns (page,
+    next cursor or None, follows pull authors). Returns None when the page
+    is not cached here and the caller should build it itself.
+    """
+    generation, entry = _current(user_id, size)
+    page = entry['pages'].get(cursor)
+    if page is not None and page['etag'] == etag:
+        metrics.add(hits=1)
+        return page
+    # Only page one and pages reached from a cached page are cached.
+    if cursor and cursor not in entry['next']:
+        metrics.add(uncached=1)
+        return None
+
+    metrics.add(misses=1)
+    if not cache.add(lock_key(user_id, size), 1, LOCK_TIMEOUT):
+        deadline = time.monotonic() + LOCK_WAIT
+        metrics.add(waits=1)
+        while time.monotonic() < deadline:
+            time.sleep(0.05)
+            _, entry = _current(user_id, size)
+            page = entry['pages'].get(cursor)
+            if page is not None and page['etag'] == etag:
+                return page
+        return None
+
+    try:
+        page, next_cursor, follows_pull = build()
+        # Re-read so pages stored meanwhile by other requests are kept.
+        latest_generation, entry = _current(user_id, size)
+        if latest_generation != generation:
+            return page
+        entry['pages'][cursor] = page
+        if next_cursor and len(entry['pages']) < PAGES:
+            entry['next'].add(next_cursor)
+        cache.set(pages_key(user_id, size), entry, PULL_TTL if follows_pull else TTL)
+        # Estimated from the rendered pages, which make up nearly all of an
+        # entry, rather than pickling it a second time.
+        metrics.add(stored_entries=1, stored_bytes=sum(len(page['content']) for page in entry['pages'].values()))
+        return page
+    finally:
+        cache.delete(lock_key(user_id, size))
+
+
+def invalidate_users(user_ids):
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+    token = uuid.uuid4().hex
+    cache.set_many({generation_key(user_id): token for user_id in user_ids}, GENERATION_TTL)
+    metrics.add(invalidations=1, invalidated_users=len(user_ids))
+
+
+def invalidate_followers(author_id, batch_size=FANOUT_BATCH_SIZE):
+    """Reset the cached feeds of everyone following `author_id`."""
+    if author_id in pull_author_ids():
+        return
+    follower_ids = Follow.objects.filter(to_user_id=author_id).order_by().values_list('from_user_id', flat=True)
+    token = uuid.uuid4().hex
+    batch, total = {}, 0
+    for follower_id in follower_ids.iterator(chunk_size=batch_size):
+        batch[generation_key(follower_id)] = token
+        if len(batch) >= batch_size:
+            cache.set_many(batch, GENERATION_TTL)
+            total += len(batch)
+            batch = {}
+    if batch:
+        cache.set_many(batch, GENERATION_TTL)
+        total += len(batch)
+    metrics.add(invalidations=1, invalidated_users=total)
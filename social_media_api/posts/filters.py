@@ -0,0 +1,21 @@
+from django.conf import settings
+from rest_framework.filters import BaseFilterBackend
+
+from .search import search
+
+SEARCH_FILTER_LIMIT = getattr(settings, 'POSTS_SEARCH_FILTER_LIMIT', 1000)
+
+
+class PostSearchFilter(BaseFilterBackend):
+    """
+    `?search=` on the post list, answered by the search index. The list keeps
+    its own ordering and is limited to the best SEARCH_FILTER_LIMIT matches;
+    use /search/ for relevance order.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        return queryset.filter(pk__in=[post_id for post_id, _ in search(query, SEARCH_FILTER_LIMIT)])
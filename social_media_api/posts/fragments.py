@@ -0,0 +1,172 @@
+"""
+Cached, pre-rendered JSON for posts and comments.
+
+Each post is rendered once per (id, version, like total) and each comment
+once per (id, updated_at). Both stamps move whenever the rendered
+representation would. Edits touch updated_at and bump Post.version, and
+comment changes bump the version of their post. Responses are assembled by
+joining the cached bytes, so on a hit the posts are neither loaded nor
+serialized.
+
+A post fragment is built from its fields plus the fragments of its
+comment preview (see posts.comments), so a post that gains a comment
+re-renders only the new comment. Author
+usernames inside fragments can lag by up to POSTS_FRAGMENT_TTL. Set
+POSTS_FRAGMENT_CACHE = False to render everything fresh each time.
+
+Fragments live in their own cache alias (POSTS_FRAGMENT_CACHE_ALIAS) so they
+neither evict nor are evicted by the feed, auth and unread entries. The keys
+are versioned, so that alias may be process-local.
+"""
+import json
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse
+from django.utils.connection import ConnectionProxy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .comments import latest_comments
+from .counters import like_total
+from .serializers import CommentSerializer, PostSerializer
+
+ENABLED = getattr(settings, 'POSTS_FRAGMENT_CACHE', True)
+TTL = getattr(settings, 'POSTS_FRAGMENT_TTL', 60 * 60)
+CACHE_ALIAS = getattr(settings, 'POSTS_FRAGMENT_CACHE_ALIAS', 'fragments')
+
+cache = ConnectionProxy(caches, CACHE_ALIAS)
+
+renderer = JSONRenderer()
+
+
+class PostFieldsSerializer(PostSerializer):
+    # 'latest_comments' is PostSerializer's last field, so appending the
+    # joined comment fragments afterwards reproduces its output exactly.
+    class Meta(PostSerializer.Meta):
+        fields = [field for field in PostSerializer.Meta.fields if field != 'latest_comments']
+
+
+def render(data):
+    # JSONRenderer renders None as an empty body rather than null.
+    return b'null' if data is None else renderer.render(data)
+
+
+def json_array(fragments):
+    return b'[' + b','.join(fragments) + b']'
+
+
+def post_key(post_id, stamp):
+    version, likes = stamp
+    return f'posts:fragment:post:{post_id}:{version}:{likes}'
+
+
+def comment_key(comment):
+    return f'posts:fragment:comment:{comment.pk}:{comment.updated_at.timestamp()}'
+
+
+def _cached(keys):
+    return cache.get_many(keys) if ENABLED and keys else {}
+
+
+def _store(fragments):
+    if ENABLED and fragments:
+        cache.set_many(fragments, TTL)
+
+
+def render_comments(comments):
+    """Return one JSON fragment per comment, in order."""
+    keys = [comment_key(comment) for comment in comments]
+    fragments = _cached(keys)
+    missing = [(comment, key) for comment, key in zip(comments, keys) if key not in fragments]
+    # One list serializer for the batch; instantiating one per object costs more than the rendering.
+    data = CommentSerializer([comment for comment, _ in missing], many=True).data
+    rendered = {key: render(item) for (_, key), item in zip(missing, data)}
+    _store(rendered)
+    fragments.update(rendered)
+    return [fragments[key] for key in keys]
+
+
+def post_fragments(post_ids, stamps, load):
+    """
+    Return {post_id: JSON fragment}. `stamps` maps ids to (version, like
+    total) (see posts.etags); load(ids) returns {id: Post} and is only
+    called for posts not in the cache. Posts without a stamp or that fail to
+    load are left out.
+    """
+    post_ids = [post_id for post_id in post_ids if post_id in stamps]
+    keys = {post_id: post_key(post_id, stamps[post_id]) for post_id in post_ids}
+    cached = _cached(list(keys.values()))
+    fragments = {post_id: cached[key] for post_id, key in keys.items() if key in cached}
+
+    missing = [post_id for post_id in post_ids if post_id not in fragments]
+    if missing:
+        posts = load(missing)
+        loaded = [posts[post_id] for post_id in missing if post_id in posts]
+        comments = latest_comments([post.pk for post in loaded])
+        comment_fragments = iter(render_comments([comment for post in loaded for comment in comments[post.pk]]))
+        rendered = {}
+        for post, data in zip(loaded, PostFieldsSerializer(loaded, many=True).data):
+            body = render(data)
+            nested = json_array([next(comment_fragments) for _ in comments[post.pk]])
+            fragments[post.pk] = append_member(body, 'latest_comments', nested)
+            # Keyed by the loaded row, which may be newer than the stamp read earlier.
+            rendered[post_key(post.pk, (post.version, like_total(post)))] = fragments[post.pk]
+        _store(rendered)
+    return fragments
+
+
+def render_posts(post_ids, stamps, load):
+    """post_fragments() as a list in `post_ids` order."""
+    fragments = post_fragments(post_ids, stamps, load)
+    return [fragments[post_id] for post_id in post_ids if post_id in fragments]
+
+
+def append_member(fragment, name, encoded):
+    """Append `name` with the already rendered value `encoded` to a rendered JSON object."""
+    return fragment[:-1] + b',' + render(name) + b':' + encoded + b'}'
+
+
+def with_member(fragment, name, value):
+    """Append `name: value` to a rendered JSON object."""
+    return append_member(fragment, name, render(value))
+
+
+def render_thread(comments):
+    """
+    Render a depth-first comment list (see posts.threads.load_subtrees) as
+    its top-level fragments, each reply nested under its parent's 'replies'.
+    reply_count is added here because it is not part of the cached fragment.
+    """
+    if not comments:
+        return []
+    top = comments[0].depth
+    replies = defaultdict(list)
+    nodes = []
+    # Replies follow their parent, so walking backwards finishes every
+    # comment's replies before reaching the comment itself.
+    for comment, fragment in reversed(list(zip(comments, render_comments(comments)))):
+        node = with_member(fragment, 'reply_count', comment.reply_count)
+        node = append_member(node, 'replies', json_array(replies.pop(comment.pk, [])[::-1]))
+        if comment.depth == top:
+            nodes.append(node)
+        else:
+            replies[comment.parent_id].append(node)
+    return nodes[::-1]
+
+
+def assemble(envelope, fragments, results_key='results'):
+    """Render `envelope` as a JSON object with `fragments` as its results array."""
+    members = []
+    for key, value in envelope.items():
+        encoded = json_array(fragments) if key == results_key else render(value)
+        members.append(render(key) + b':' + encoded)
+    return b'{' + b','.join(members) + b'}'
+
+
+def json_response(request, content, **kwargs):
+    """Send pre-rendered JSON as is, or as data for non-JSON renderers such as the browsable API."""
+    if getattr(request, 'accepted_renderer', None) is None or request.accepted_renderer.format == 'json':
+        return HttpResponse(content, content_type='application/json', **kwargs)
+    return Response(json.loads(content), **kwargs)
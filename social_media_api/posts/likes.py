@@ -0,0 +1,120 @@
+"""
+Like and unlike as single conflict-ignoring statements.
+
+Instead of fetching the post, get_or_create-ing the Like and loading the
+author separately, the insert selects from the post row (so a missing post
+simply inserts nothing), skips duplicates through the ('post', 'user')
+unique constraint and returns the post's author id. On PostgreSQL in direct
+counter mode the like_count bump rides along in the same statement as a
+data-modifying CTE.
+"""
+from django.db import connection
+from django.utils import timezone
+
+from . import counters
+from .models import Post, Like
+
+CREATED, EXISTS, MISSING = 'created', 'exists', 'missing'
+
+
+def _names():
+    qn = connection.ops.quote_name
+    return {
+        'like': qn(Like._meta.db_table),
+        'post': qn(Post._meta.db_table),
+        'like_post': qn(Like._meta.get_field('post').column),
+        'like_user': qn(Like._meta.get_field('user').column),
+        'like_created': qn(Like._meta.get_field('created_at').column),
+        'post_id': qn(Post._meta.pk.column),
+        'post_author': qn(Post._meta.get_field('author').column),
+        'like_count': qn(Post._meta.get_field('like_count').column),
+    }
+
+
+def _supports_upsert_returning():
+    return connection.vendor == 'postgresql' or (
+        connection.vendor == 'sqlite' and connection.features.can_return_rows_from_bulk_insert
+    )
+
+
+def _post_exists(post_id):
+    # Only reached when nothing changed; tells a duplicate from a bad id.
+    return Post.objects.filter(pk=post_id).exists()
+
+
+def add_like(user_id, post_id):
+    """Like a post. Returns (CREATED | EXISTS | MISSING, post author id or None)."""
+    if not _supports_upsert_returning():
+        post = Post.objects.filter(pk=post_id).only('author_id').first()
+        if post is None:
+            return MISSING, None
+        _, created = Like.objects.get_or_create(user_id=user_id, post_id=post_id)
+        if created:
+            counters.record_like(post_id, 1)
+        return (CREATED if created else EXISTS), post.author_id
+
+    names = _names()
+    insert = (
+        'INSERT INTO {like} ({like_post}, {like_user}, {like_created}) '
+        'SELECT {post_id}, %s, %s FROM {post} WHERE {post_id} = %s '
+        'ON CONFLICT ({like_post}, {like_user}) DO NOTHING'
+    ).format(**names)
+    params = [user_id, timezone.now(), post_id]
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql' and not counters.sharded():
+            cursor.execute(
+                ('WITH inserted AS ({insert} RETURNING {like_post}) '
+                 'UPDATE {post} SET {like_count} = {like_count} + 1 '
+                 'WHERE {post_id} IN (SELECT {like_post} FROM inserted) '
+                 'RETURNING {post_author}').format(insert=insert, **names),
+                params,
+            )
+            row = cursor.fetchone()
+            if row is None:
+                return (EXISTS if _post_exists(post_id) else MISSING), None
+            return CREATED, row[0]
+
+        cursor.execute(
+            ('{insert} RETURNING (SELECT {post_author} FROM {post} '
+             'WHERE {post}.{post_id} = {like}.{like_post})').format(insert=insert, **names),
+            params,
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return (EXISTS if _post_exists(post_id) else MISSING), None
+    counters.record_like(post_id, 1)
+    return CREATED, row[0]
+
+
+def remove_like(user_id, post_id):
+    """Unlike a post. Returns True if a like was deleted, False if there was none, None if the post is missing."""
+    if not _supports_upsert_returning():
+        deleted, _ = Like.objects.filter(user_id=user_id, post_id=post_id).delete()
+        if deleted:
+            counters.record_like(post_id, -1)
+            return True
+        return False if _post_exists(post_id) else None
+
+    names = _names()
+    delete = 'DELETE FROM {like} WHERE {like_post} = %s AND {like_user} = %s RETURNING {like_post}'.format(**names)
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql' and not counters.sharded():
+            cursor.execute(
+                ('WITH deleted AS ({delete}), '
+                 'bumped AS (UPDATE {post} SET {like_count} = {like_count} - 1 '
+                 'WHERE {post_id} IN (SELECT {like_post} FROM deleted) AND {like_count} > 0) '
+                 'SELECT {like_post} FROM deleted').format(delete=delete, **names),
+                [post_id, user_id],
+            )
+            if cursor.fetchone() is None:
+                return False if _post_exists(post_id) else None
+            return True
+
+        cursor.execute(delete, [post_id, user_id])
+        row = cursor.fetchone()
+    if row is None:
+        return False if _post_exists(post_id) else None
+    counters.record_like(post_id, -1)
+    return True
@@ -0,0 +1,137 @@
+import random
+import time
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import CharField, F, Value
+from django.db.models.functions import Cast, Concat, LPad
+from django.test.utils import CaptureQueriesContext
+
+from posts.models import Comment, Post
+from posts.threads import MAX_DEPTH, load_subtrees, subtree
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+def recursive_subtrees(siblings, depth, replies):
+    # The per-level alternative: one children query per level.
+    kept, frontier = list(siblings), [comment.pk for comment in siblings]
+    for _ in range(depth):
+        if not frontier:
+            break
+        level = Comment.objects.filter(parent_id__in=frontier).select_related('author').order_by('parent_id', 'id')
+        shown = Counter()
+        children = []
+        for comment in level:
+            shown[comment.parent_id] += 1
+            if shown[comment.parent_id] <= replies:
+                children.append(comment)
+        kept += children
+        frontier = [comment.pk for comment in children]
+    return kept
+
+
+class Command(BaseCommand):
+    help = "Measure reply thread fetches on a post with many threaded comments (fixtures are rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--comments', type=int, default=50_000)
+        parser.add_argument('--roots', type=float, default=0.05, help="Share of comments that are top-level.")
+        parser.add_argument('--page-size', type=int, default=20)
+        parser.add_argument('--depth', type=int, default=3)
+        parser.add_argument('--replies', type=int, default=5)
+        parser.add_argument('--runs', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                post, biggest = self.build(options)
+                self.measure(post, biggest, options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def build(self, options):
+        rng = random.Random(options['seed'])
+        author = User.objects.create_user(username='bench_thread_author')
+        post = Post.objects.create(author=author, title='bench', content='')
+
+        # Replies pick a parent in proportion to the replies it already has
+        # (plus one), so a few threads grow large, as on popular posts.
+        # Replies past MAX_DEPTH go to the deepest ancestor that may take them.
+        parents, depths, weights = [], [], []
+        for index in range(options['comments']):
+            parent = None
+            if weights and rng.random() >= options['roots']:
+                parent = rng.choice(weights)
+                while parent is not None and depths[parent] >= MAX_DEPTH:
+                    parent = parents[parent]
+            parents.append(parent)
+            depths.append(0 if parent is None else depths[parent] + 1)
+            weights.append(index)
+            if parent is not None:
+                weights.append(parent)
+        reply_counts = Counter(parent for parent in parents if parent is not None)
+
+        began = time.perf_counter()
+        pks, paths = [None] * len(parents), [None] * len(parents)
+        for depth in range(max(depths) + 1):
+            level = [index for index, value in enumerate(depths) if value == depth]
+            created = Comment.objects.bulk_create(
+                [
+                    Comment(
+                        post=post, author=author, content='lorem ipsum',
+                        parent_id=pks[parents[index]] if parents[index] is not None else None,
+                        path=paths[parents[index]] if parents[index] is not None else '',
+                        depth=depth, reply_count=reply_counts[index],
+                    )
+                    for index in level
+                ],
+                batch_size=2000,
+            )
+            # Same rule as Comment.save(), one statement per level.
+            Comment.objects.filter(post=post, depth=depth).update(
+                path=Concat(F('path'), LPad(Cast('id', CharField()), Comment.PATH_WIDTH, Value('0')))
+            )
+            for index, comment in zip(level, created):
+                prefix = paths[parents[index]] if parents[index] is not None else ''
+                pks[index], paths[index] = comment.pk, prefix + Comment.path_segment(comment.pk)
+        sizes = [1] * len(parents)
+        for index in reversed(range(len(parents))):
+            if parents[index] is not None:
+                sizes[parents[index]] += sizes[index]
+        biggest = max(range(len(parents)), key=sizes.__getitem__)
+        self.stdout.write(
+            f"{len(parents)} comments, largest thread {sizes[biggest]}, depth {max(depths)}: "
+            f"built in {time.perf_counter() - began:.1f}s"
+        )
+        return post, Comment.objects.get(pk=pks[biggest])
+
+    def measure(self, post, biggest, options):
+        page_size, depth, replies = options['page_size'], options['depth'], options['replies']
+        roots = list(Comment.objects.filter(post=post, parent__isnull=True).order_by('path')[:page_size])
+        cases = [
+            ('page, path', lambda: load_subtrees(post.pk, roots, depth, replies)),
+            ('page, per level', lambda: recursive_subtrees(roots, depth, replies)),
+            ('subtree, path', lambda: list(subtree(biggest).select_related('author').order_by('path'))),
+            ('subtree, per level', lambda: recursive_subtrees([biggest], MAX_DEPTH, float('inf'))),
+        ]
+        self.stdout.write(f"{'fetch':<20}{'rows':>8}{'queries':>9}{'p50 ms':>10}{'p99 ms':>10}")
+        for name, fetch in cases:
+            samples = []
+            for _ in range(options['runs']):
+                with CaptureQueriesContext(connection) as queries:
+                    began = time.perf_counter()
+                    rows = fetch()
+                    samples.append(time.perf_counter() - began)
+            samples.sort()
+            p50 = samples[len(samples) // 2] * 1000
+            p99 = samples[max(0, int(len(samples) * 0.99) - 1)] * 1000
+            self.stdout.write(f"{name:<20}{len(rows):>8}{len(queries):>9}{p50:>10.2f}{p99:>10.2f}")
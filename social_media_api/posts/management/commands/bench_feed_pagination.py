@@ -0,0 +1,95 @@
+import time
+from datetime import timedelta
+from statistics import median
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from posts.models import Post, FeedEntry
+from posts.pagination import FeedPagination
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare keyset and offset feed pagination latency at a shallow and a deep page."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=10000, help="Deepest page to measure.")
+        parser.add_argument('--page-size', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        # All fixture rows are created inside a transaction that is rolled back.
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        size, deep = options['page_size'], options['pages']
+        total = size * deep
+        reader = User.objects.create_user(username='bench_feed_reader')
+        author = User.objects.create_user(username='bench_feed_author')
+
+        self.stdout.write(f"Creating {total} posts and feed entries...")
+        posts = Post.objects.bulk_create(
+            [Post(author=author, title=f"post {i}", content='') for i in range(total)],
+            batch_size=5000,
+        )
+        start = timezone.now()
+        FeedEntry.objects.bulk_create(
+            [FeedEntry(user=reader, post=post, author=author, created_at=start - timedelta(seconds=i))
+             for i, post in enumerate(posts)],
+            batch_size=5000,
+        )
+
+        entries = FeedEntry.objects.filter(user=reader)
+        factory = APIRequestFactory()
+
+        def keyset(page):
+            params = {}
+            if page > 1:
+                paginator = FeedPagination()
+                last = entries.order_by(*paginator.ordering)[(page - 1) * size - 1]
+                params['cursor'] = paginator.encode_cursor(paginator.get_position(last))
+            request = Request(factory.get('/api/feed/', params))
+
+            def call():
+                paginator = FeedPagination()
+                paginator.page_size = size
+                return paginator.paginate_queryset(entries, request)
+            return call
+
+        def offset(page):
+            request = Request(factory.get('/api/feed/', {'page': page}))
+
+            def call():
+                paginator = PageNumberPagination()
+                paginator.page_size = size
+                return paginator.paginate_queryset(entries.order_by('-created_at', '-post_id'), request)
+            return call
+
+        self.stdout.write(f"{'mode':<8}{'page':>8}{'median ms':>12}")
+        for name, build in (('keyset', keyset), ('offset', offset)):
+            for page in (1, deep):
+                call = build(page)
+                call()  # warm up
+                timings = []
+                for _ in range(options['repeat']):
+                    began = time.perf_counter()
+                    rows = call()
+                    timings.append((time.perf_counter() - began) * 1000)
+                assert len(rows) == size
+                self.stdout.write(f"{name:<8}{page:>8}{median(timings):>12.3f}")
@@ -0,0 +1,76 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from posts import counters
+from posts.counters import flush_like_shards, record_like
+from posts.models import Post, Like
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Measure like throughput on a single post with many concurrent threads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=32)
+        parser.add_argument('--likes', type=int, default=2000)
+        parser.add_argument('--mode', choices=['direct', 'sharded', 'both'], default='both')
+
+    def handle(self, *args, **options):
+        modes = ['direct', 'sharded'] if options['mode'] == 'both' else [options['mode']]
+        # Threads use their own connections, so fixtures are committed and
+        # deleted afterwards instead of being rolled back.
+        users = User.objects.bulk_create(
+            [User(username=f'bench_liker_{i}') for i in range(options['likes'])], batch_size=1000
+        )
+        author = User.objects.create_user(username='bench_like_author')
+        original_mode = counters.MODE
+        try:
+            self.stdout.write(f"{'mode':<10}{'likes/s':>10}{'p99 ms':>10}{'count ok':>10}")
+            for mode in modes:
+                counters.MODE = mode
+                self.run(mode, author, users, options['threads'])
+        finally:
+            counters.MODE = original_mode
+            Post.objects.filter(author=author).delete()
+            User.objects.filter(pk__in=[user.pk for user in users] + [author.pk]).delete()
+
+    def run(self, mode, author, users, threads):
+        post = Post.objects.create(author=author, title='bench', content='')
+        latencies = []
+        lock = threading.Lock()
+
+        def like(user):
+            began = time.perf_counter()
+            with transaction.atomic():
+                Like.objects.create(post_id=post.pk, user_id=user.pk)
+                record_like(post.pk, 1)
+            elapsed = time.perf_counter() - began
+            with lock:
+                latencies.append(elapsed)
+            connection.close_if_unusable_or_obsolete()
+
+        def worker(chunk):
+            try:
+                for user in chunk:
+                    like(user)
+            finally:
+                connection.close()
+
+        chunks = [users[i::threads] for i in range(threads)]
+        began = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(worker, chunks))
+        elapsed = time.perf_counter() - began
+
+        flush_like_shards()
+        post.refresh_from_db()
+        latencies.sort()
+        p99 = latencies[int(len(latencies) * 0.99) - 1] * 1000
+        ok = post.like_count == len(users)
+        self.stdout.write(f"{mode:<10}{len(users) / elapsed:>10.0f}{p99:>10.2f}{str(ok):>10}")
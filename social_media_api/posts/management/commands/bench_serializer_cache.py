@@ -0,0 +1,86 @@
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from posts import fragments
+from posts.comments import attach_latest_comments
+from posts.counters import with_pending_likes
+from posts.etags import post_stamps
+from posts.models import Comment, Post
+from posts.serializers import PostSerializer
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "Compare CPU time of plain post serialization with cached fragments (cold and warm)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=100)
+        parser.add_argument('--comments', type=int, default=5, help="Comments per post.")
+        parser.add_argument('--rounds', type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['posts'], options['comments'], options['rounds'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, post_count, comment_count, rounds):
+        author = User.objects.create_user(username='bench_serializer_author')
+        posts = Post.objects.bulk_create(
+            [Post(author=author, title=f'bench {i}', content='lorem ipsum ' * 40) for i in range(post_count)]
+        )
+        Comment.objects.bulk_create(
+            [Comment(post=post, author=author, content='dolor sit amet ' * 8)
+             for post in posts for _ in range(comment_count)]
+        )
+        post_ids = [post.pk for post in posts]
+        loaded = with_pending_likes(Post.objects.select_related('author')).in_bulk(post_ids)
+        attach_latest_comments(list(loaded.values()))
+        stamps = post_stamps(post_ids)
+        renderer = JSONRenderer()
+
+        def plain():
+            return renderer.render(PostSerializer([loaded[post_id] for post_id in post_ids], many=True).data)
+
+        def cached():
+            return fragments.json_array(fragments.render_posts(post_ids, stamps, lambda ids: loaded))
+
+        def clear():
+            # The fixture ids are rolled back and may be reused, so nothing
+            # rendered here may outlive the run.
+            keys = [fragments.post_key(post_id, stamps[post_id]) for post_id in post_ids]
+            keys += [fragments.comment_key(comment) for post in loaded.values() for comment in post.latest_comments]
+            fragments.cache.delete_many(keys)
+
+        def cold():
+            clear()
+            return cached()
+
+        original = fragments.ENABLED
+        fragments.ENABLED = True
+        try:
+            if cold() != plain():
+                self.stderr.write("Fragment output differs from PostSerializer output")
+            self.stdout.write(f"{'mode':<8}{'ms/page':>10}{'speedup':>10}")
+            baseline = None
+            for name, render in [('plain', plain), ('cold', cold), ('warm', cached)]:
+                began = time.process_time()
+                for _ in range(rounds):
+                    render()
+                elapsed = (time.process_time() - began) / rounds * 1000
+                baseline = baseline or elapsed
+                self.stdout.write(f"{name:<8}{elapsed:>10.2f}{baseline / elapsed:>9.1f}x")
+        finally:
+            fragments.ENABLED = original
+            clear()
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.counters import flush_like_shards
+
+
+class Command(BaseCommand):
+    help = "Fold sharded like counter deltas into Post.like_count."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Keep running and flush every INTERVAL seconds.")
+
+    def handle(self, *args, **options):
+        while True:
+            began = time.monotonic()
+            posts, likes = flush_like_shards(batch_size=options['batch_size'])
+            if posts or not options['interval']:
+                self.stdout.write(f"Flushed {likes:+d} likes across {posts} posts "
+                                  f"in {(time.monotonic() - began) * 1000:.1f} ms.")
+            if not options['interval']:
+                break
+            time.sleep(max(0, options['interval'] - (time.monotonic() - began)))
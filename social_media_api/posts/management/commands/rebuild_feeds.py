@@ -0,0 +1,28 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.feed import rebuild_feed, BACKFILL_LIMIT
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = "Rebuild materialized feed inboxes from the follow graph."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='user_ids', help="Only rebuild these user ids.")
+        parser.add_argument('--limit', type=int, default=BACKFILL_LIMIT, help="Posts copied per followed author.")
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        user_ids = options['user_ids']
+        if not user_ids:
+            user_ids = User.objects.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=options['chunk_size'])
+
+        count = 0
+        for user_id in user_ids:
+            with transaction.atomic():
+                rebuild_feed(user_id, limit=options['limit'])
+            count += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} feeds."))
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from posts.search import CHUNK_SIZE, get_backend, iter_posts
+
+
+class Command(BaseCommand):
+    help = "Rebuild the post search index, streaming posts in primary-key chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--sleep', type=float, default=0, help="Seconds to pause between chunks.")
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        if not backend.shared:
+            self.stdout.write(
+                f"{type(backend).__name__} lives in each server process and is built on first "
+                "search; rebuilding it here would not reach them."
+            )
+            return
+
+        began = time.perf_counter()
+        backend.clear()
+        indexed = 0
+        for rows in iter_posts(options['chunk_size']):
+            backend.index(rows)
+            indexed += len(rows)
+            self.stdout.write(f"Indexed {indexed} posts ({indexed / (time.perf_counter() - began):.0f}/s).")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} posts in {time.perf_counter() - began:.1f}s."))
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import F
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -10,21 +11,75 @@ class Post(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Denormalized counters, kept in step with F() updates by the like and
+    # comment views; `manage.py reconcile_counters` repairs any drift.
+    like_count = models.PositiveIntegerField(default=0)
+    comment_count = models.PositiveIntegerField(default=0)
+    # Bumped whenever the post or its comments change; drives ETags (see posts.etags).
+    version = models.PositiveIntegerField(default=1)
+
+    # Only ever written with F() updates.
+    F_UPDATED_FIELDS = {'like_count', 'comment_count', 'version'}
 
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if not adding and kwargs.get('update_fields') is None:
+            # Writing back this instance's copies of the counters could undo
+            # concurrent F() updates, so a full save leaves them out.
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.F_UPDATED_FIELDS
+            ]
+        super().save(*args, **kwargs)
+        if not adding and set(kwargs['update_fields']) - self.F_UPDATED_FIELDS:
+            Post.objects.filter(pk=self.pk).update(version=F('version') + 1)
+
 
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Materialized path: the zero-padded ids of the root, ..., this comment.
+    # Sorting by path lists a thread depth-first, and a comment's subtree is
+    # one (post, path) index range; see posts.threads.
+    path = models.CharField(max_length=255, default='', editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
+    # Denormalized, kept in step with F() updates like Post.comment_count.
+    reply_count = models.PositiveIntegerField(default=0, editable=False)
+
+    PATH_WIDTH = 10
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['post', '-created_at', '-id'], name='posts_comment_post_recent_idx'),
+            models.Index(fields=['post', 'path'], name='posts_comment_post_path_idx'),
+            models.Index(fields=['post', 'depth', 'path'], name='posts_comment_post_level_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.author.username} on {self.post.title}"
 
+    @classmethod
+    def path_segment(cls, pk):
+        return str(pk).zfill(cls.PATH_WIDTH)
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding:
+            self.path = self.parent.path if self.parent_id else ''
+            self.depth = self.parent.depth + 1 if self.parent_id else 0
+        super().save(*args, **kwargs)
+        if adding:
+            # The last segment is this comment's own id, known only now.
+            self.path += self.path_segment(self.pk)
+            Comment.objects.filter(pk=self.pk).update(path=self.path)
+
 
 class Like(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='like_entries')
@@ -36,3 +91,54 @@ class Like(models.Model):
 
     def __str__(self):
         return f"{self.user.username} likes {self.post.title}"
+
+
+class LikeCounterShard(models.Model):
+    # Write-behind like deltas for hot posts. Likes increment a random shard
+    # instead of the Post row; `manage.py flush_like_counters` folds the
+    # shards into Post.like_count.
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='like_shards')
+    shard = models.PositiveSmallIntegerField()
+    delta = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('post', 'shard')
+
+    def __str__(self):
+        return f"{self.delta:+d} likes on {self.post_id} (shard {self.shard})"
+
+
+class FeedEntry(models.Model):
+    # Materialized home feed: one row per (follower, post), written on post
+    # creation so the feed endpoint reads a single per-user index range.
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='feed_entries')
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    created_at = models.DateTimeField()  # copy of post.created_at
+
+    class Meta:
+        unique_together = ('user', 'post')
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='posts_feed_user_recent_idx'),
+            models.Index(fields=['user', 'author'], name='posts_feed_user_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} in feed of {self.user_id}"
+
+
+class TrendingScore(models.Model):
+    # Time-decayed engagement per post, stored as a log so scores never
+    # overflow; see posts.trending. Only the ordering of log_score matters
+    # for ranking.
+    post = models.OneToOneField(Post, on_delete=models.CASCADE, primary_key=True, related_name='trending')
+    log_score = models.FloatField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-log_score'], name='posts_trending_score_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.post_id}: {self.log_score:.3f}"
@@ -0,0 +1,59 @@
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from social_media_api.pagination import KeysetPagination
+
+
+class FeedPagination(KeysetPagination):
+    ordering = ('-created_at', '-post_id')
+
+
+class CommentPagination(KeysetPagination):
+    ordering = ('-created_at', '-id')
+    page_size = 20
+
+
+class ThreadPagination(KeysetPagination):
+    # Siblings in thread order, oldest first; see posts.threads.
+    ordering = ('path',)
+    ordering_types = (str,)
+    page_size = 20
+
+
+class SearchPagination(BasePagination):
+    """
+    Numbered pages over ranked search hits. Relevance order has no stable
+    keyset, so pages are offsets, capped at max_results hits deep.
+    """
+    page_size = 10
+    max_page_size = 50
+    max_results = 1000
+    page_size_query_param = 'page_size'
+    page_query_param = 'page'
+
+    get_page_size = KeysetPagination.get_page_size
+
+    def paginate_hits(self, search, request):
+        """Call search(limit, offset) for the requested page and return its hits."""
+        self.request = request
+        size = self.get_page_size(request)
+        try:
+            self.page = max(1, int(request.query_params.get(self.page_query_param, 1)))
+        except ValueError:
+            self.page = 1
+        offset = (self.page - 1) * size
+        if offset >= self.max_results:
+            self.has_next = False
+            return []
+        hits = search(min(size + 1, self.max_results - offset), offset)
+        self.has_next = len(hits) > size and offset + size < self.max_results
+        return hits[:size]
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return replace_query_param(self.request.build_absolute_uri(), self.page_query_param, self.page + 1)
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
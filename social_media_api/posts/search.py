@@ -0,0 +1,216 @@
+"""
+Full-text search over Post.title and Post.content.
+
+The backend is chosen with POSTS_SEARCH_BACKEND:
+
+* SQLiteFTSBackend keeps an FTS5 table in its own SQLite file
+  (POSTS_SEARCH_SQLITE_PATH), whichever database holds the posts. It is
+  shared by every process on the host and survives restarts.
+* MemoryBackend is an in-process inverted index, built from the database on
+  first use. Each process keeps its own copy and only sees posts saved in
+  that process after it was built.
+
+Both rank with BM25 (title matches weigh TITLE_WEIGHT times as much as
+content matches) and require every query term to match. Signals keep the
+index current after each commit; `manage.py rebuild_search_index` rebuilds
+it from scratch.
+"""
+import math
+import re
+import sqlite3
+import threading
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import Post
+
+TITLE_WEIGHT = getattr(settings, 'POSTS_SEARCH_TITLE_WEIGHT', 2.0)
+CHUNK_SIZE = getattr(settings, 'POSTS_SEARCH_CHUNK_SIZE', 2000)
+
+TOKEN = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return TOKEN.findall(text.lower())
+
+
+def iter_posts(chunk_size=CHUNK_SIZE):
+    """Yield lists of (id, title, content), walking the primary key in chunks."""
+    last_id = 0
+    while True:
+        rows = list(
+            Post.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'title', 'content')[:chunk_size]
+        )
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+
+
+class SQLiteFTSBackend:
+    shared = True
+
+    def __init__(self):
+        self.path = str(getattr(settings, 'POSTS_SEARCH_SQLITE_PATH', settings.BASE_DIR / 'search.sqlite3'))
+        self.local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute(
+                'CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts '
+                "USING fts5(title, content, tokenize='unicode61')"
+            )
+            self.local.connection = connection
+        return connection
+
+    def index(self, rows):
+        with self.connection as connection:
+            connection.execute('BEGIN')
+            connection.executemany('DELETE FROM posts_fts WHERE rowid = ?', [(row[0],) for row in rows])
+            connection.executemany('INSERT INTO posts_fts (rowid, title, content) VALUES (?, ?, ?)', rows)
+
+    def remove(self, post_ids):
+        with self.connection as connection:
+            connection.execute('BEGIN')
+            connection.executemany('DELETE FROM posts_fts WHERE rowid = ?', [(pk,) for pk in post_ids])
+
+    def clear(self):
+        self.connection.execute('DELETE FROM posts_fts')
+
+    def search(self, query, limit, offset=0):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        # Quote every term so user input is never parsed as FTS5 query syntax.
+        match = ' '.join(f'"{term}"' for term in terms)
+        rows = self.connection.execute(
+            'SELECT rowid, bm25(posts_fts, ?, 1.0) AS rank FROM posts_fts WHERE posts_fts MATCH ? '
+            'ORDER BY rank, rowid DESC LIMIT ? OFFSET ?',
+            (TITLE_WEIGHT, match, limit, offset),
+        )
+        # FTS5 reports BM25 negated so that ascending order is best first.
+        return [(post_id, -rank) for post_id, rank in rows]
+
+
+class MemoryBackend:
+    shared = False
+    k1 = 1.2
+    b = 0.75
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.loaded = False
+        self.postings = defaultdict(dict)  # term -> {post_id: weighted term frequency}
+        self.lengths = {}  # post_id -> weighted document length
+        self.terms = {}  # post_id -> its distinct terms, for removal
+        self.total_length = 0.0
+
+    def ensure_loaded(self):
+        if not self.loaded:
+            with self.lock:
+                if not self.loaded:
+                    for rows in iter_posts():
+                        self._add(rows)
+                    self.loaded = True
+
+    def _terms(self, title, content):
+        terms = Counter()
+        for term in tokenize(title):
+            terms[term] += TITLE_WEIGHT
+        for term in tokenize(content):
+            terms[term] += 1
+        return terms
+
+    def _add(self, rows):
+        for post_id, title, content in rows:
+            self._discard(post_id)
+            terms = self._terms(title, content)
+            for term, frequency in terms.items():
+                self.postings[term][post_id] = frequency
+            length = sum(terms.values())
+            self.lengths[post_id] = length
+            self.terms[post_id] = tuple(terms)
+            self.total_length += length
+
+    def _discard(self, post_id):
+        length = self.lengths.pop(post_id, None)
+        if length is None:
+            return
+        self.total_length -= length
+        for term in self.terms.pop(post_id):
+            del self.postings[term][post_id]
+            if not self.postings[term]:
+                del self.postings[term]
+
+    def index(self, rows):
+        with self.lock:
+            if self.loaded:
+                self._add(rows)
+
+    def remove(self, post_ids):
+        with self.lock:
+            for post_id in post_ids:
+                self._discard(post_id)
+
+    def clear(self):
+        with self.lock:
+            self.postings.clear()
+            self.lengths.clear()
+            self.terms.clear()
+            self.total_length = 0.0
+            self.loaded = False
+
+    def search(self, query, limit, offset=0):
+        self.ensure_loaded()
+        terms = set(tokenize(query))
+        with self.lock:
+            if not terms or not self.lengths:
+                return []
+            postings = sorted((self.postings.get(term, {}) for term in terms), key=len)
+            if not postings[0]:
+                return []
+            candidates = set(postings[0]).intersection(*postings[1:])
+            count = len(self.lengths)
+            average = self.total_length / count
+            scores = dict.fromkeys(candidates, 0.0)
+            for docs in postings:
+                idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+                for post_id in candidates:
+                    frequency = docs[post_id]
+                    norm = self.k1 * (1 - self.b + self.b * self.lengths[post_id] / average)
+                    scores[post_id] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -item[0]))
+        return ranked[offset:offset + limit]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                backend = getattr(settings, 'POSTS_SEARCH_BACKEND', 'posts.search.SQLiteFTSBackend')
+                _backend = import_string(backend)()
+    return _backend
+
+
+def index_posts(posts):
+    get_backend().index([(post.pk, post.title, post.content) for post in posts])
+
+
+def remove_posts(post_ids):
+    get_backend().remove(list(post_ids))
+
+
+def search(query, limit, offset=0):
+    """Return [(post_id, score), ...] best first."""
+    return get_backend().search(query, limit, offset)
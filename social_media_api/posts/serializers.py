@@ -1,5 +1,8 @@
 from rest_framework import serializers
 from .models import Post, Comment, Like
+from .counters import like_total
+from .comments import preview
+from .threads import MAX_DEPTH
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -9,18 +12,47 @@ class CommentSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Comment
-        fields = ['id', 'post', 'author', 'author_username', 'content', 'created_at', 'updated_at']
-        read_only_fields = ['author', 'created_at', 'updated_at', 'author_username']
+        fields = ['id', 'post', 'parent', 'depth', 'author', 'author_username', 'content', 'created_at', 'updated_at']
+        read_only_fields = ['author', 'depth', 'created_at', 'updated_at', 'author_username']
+
+    def validate(self, attrs):
+        # Materialized paths fix a comment's place in its thread for good.
+        if self.instance is not None:
+            for field in ('post', 'parent'):
+                if field in attrs and attrs[field] != getattr(self.instance, field):
+                    raise serializers.ValidationError({field: "A comment cannot be moved."})
+            return attrs
+        parent = attrs.get('parent')
+        if parent is not None:
+            if parent.post_id != attrs['post'].pk:
+                raise serializers.ValidationError({'parent': "The parent comment belongs to another post."})
+            if parent.depth >= MAX_DEPTH:
+                raise serializers.ValidationError({'parent': f"Replies nest at most {MAX_DEPTH} levels deep."})
+        return attrs
 
 
 class PostSerializer(serializers.ModelSerializer):
     author_username = serializers.ReadOnlyField(source='author.username')
-    comments = CommentSerializer(many=True, read_only=True)
+    like_count = serializers.SerializerMethodField()
+    latest_comments = serializers.SerializerMethodField()
 
     class Meta:
         model = Post
-        fields = ['id', 'author', 'author_username', 'title', 'content', 'created_at', 'updated_at', 'comments']
-        read_only_fields = ['author', 'created_at', 'updated_at', 'author_username', 'comments']
+        fields = ['id', 'author', 'author_username', 'title', 'content', 'created_at', 'updated_at',
+                  'like_count', 'comment_count', 'latest_comments']
+        read_only_fields = ['author', 'created_at', 'updated_at', 'author_username', 'like_count', 'comment_count',
+                            'latest_comments']
+
+    def get_like_count(self, obj):
+        return like_total(obj)
+
+    def get_latest_comments(self, obj):
+        # Read and list responses are rendered by posts.fragments.post_fragments,
+        # which loads the previews of a whole page in one query; this path
+        # serves the single post returned by create and update. Callers that
+        # serialize many posts directly should attach previews first with
+        # posts.comments.attach_latest_comments.
+        return CommentSerializer(preview(obj), many=True).data
 
     def create(self, validated_data):
         user = self.context['request'].user
@@ -0,0 +1,77 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.contrib.auth import get_user_model
+
+from .models import Post, FeedEntry
+from .feed import fanout_post, backfill_follow, prune_unfollow
+from .timelines import add_to_timeline, invalidate_timeline
+from .search import index_posts, remove_posts
+from .feed_cache import invalidate_followers, invalidate_users
+
+User = get_user_model()
+
+
+@receiver(post_save, sender=Post)
+def fanout_new_post(sender, instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: fanout_post(instance))
+        transaction.on_commit(lambda: add_to_timeline(instance.author_id, instance.created_at, instance.pk))
+
+
+@receiver(post_delete, sender=Post)
+def drop_deleted_post(sender, instance, **kwargs):
+    transaction.on_commit(lambda: invalidate_timeline(instance.author_id))
+
+
+@receiver(post_save, sender=Post)
+def index_saved_post(sender, instance, update_fields, **kwargs):
+    if update_fields is None or {'title', 'content'} & set(update_fields):
+        transaction.on_commit(lambda: index_posts([instance]))
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_follower_feeds(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or set(update_fields) - Post.F_UPDATED_FIELDS:
+        transaction.on_commit(lambda: invalidate_followers(instance.author_id))
+
+
+@receiver(post_delete, sender=Post)
+def unindex_deleted_post(sender, instance, **kwargs):
+    post_id = instance.pk
+    transaction.on_commit(lambda: remove_posts([post_id]))
+
+
+@receiver(m2m_changed, sender=User.following.through)
+def sync_feed_on_follow(sender, instance, action, reverse, pk_set, **kwargs):
+    # reverse=False: instance.following changed, pk_set are authors.
+    # reverse=True: instance.followers changed, pk_set are followers.
+    if action == 'pre_clear' and reverse:
+        instance._cleared_follower_ids = list(
+            sender.objects.filter(to_user_id=instance.pk).values_list('from_user_id', flat=True)
+        )
+    elif action == 'post_add':
+        if reverse:
+            for follower_id in pk_set:
+                backfill_follow(follower_id, [instance.pk])
+        else:
+            backfill_follow(instance.pk, pk_set)
+    elif action == 'post_remove':
+        if reverse:
+            FeedEntry.objects.filter(user_id__in=pk_set, author_id=instance.pk).delete()
+        else:
+            prune_unfollow(instance.pk, pk_set)
+    elif action == 'post_clear':
+        if reverse:
+            FeedEntry.objects.filter(author_id=instance.pk).delete()
+        else:
+            FeedEntry.objects.filter(user_id=instance.pk).delete()
+
+    if action in ('post_add', 'post_remove'):
+        follower_ids = list(pk_set) if reverse else [instance.pk]
+    elif action == 'post_clear':
+        follower_ids = instance.__dict__.pop('_cleared_follower_ids', []) if reverse else [instance.pk]
+    else:
+        return
+    transaction.on_commit(lambda: invalidate_users(follower_ids))
@@ -1,3 +1,618 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import math
+import tempfile
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.exceptions import NotFound
+from rest_framework.test import APIClient
+
+from notifications.models import NotificationEvent
+from social_media_api.pagination import KeysetPagination
+from . import counters, feed_cache, fragments, search, timelines, trending
+from .comments import PREVIEW_SIZE
+from .counters import flush_like_shards
+from .etags import post_stamps
+from .feed import fanout_post, rebuild_feed
+from .models import Comment, FeedEntry, Like, LikeCounterShard, Post, TrendingScore
+from .threads import subtree
+from .trending import EPOCH, TrendingEngine, add_scores, log_add, log_weight
+
+User = get_user_model()
+
+
+def raw_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+class APITestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        fragments.cache.clear()
+        # Keep saved posts out of the on-disk search index.
+        search_backend = mock.patch.object(search, '_backend', search.MemoryBackend())
+        search_backend.start()
+        self.addCleanup(search_backend.stop)
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def post_as(self, user, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Post.objects.create(author=user, title=fields.get('title', 'title'), content=fields.get('content', ''))
+
+
+class FeedFanoutTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user(username='author')
+        self.followers = [User.objects.create_user(username=f'follower{i}') for i in range(3)]
+        self.stranger = User.objects.create_user(username='stranger')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.author.followers.add(*self.followers)
+
+    def inbox(self, user):
+        return list(FeedEntry.objects.filter(user=user).order_by('-created_at', '-post_id').values_list('post_id', flat=True))
+
+    def test_new_post_reaches_every_follower_once(self):
+        post = self.post_as(self.author)
+        for follower in self.followers:
+            self.assertEqual(self.inbox(follower), [post.pk])
+        self.assertEqual(self.inbox(self.stranger), [])
+        self.assertEqual(self.inbox(self.author), [])
+        fanout_post(post)
+        self.assertEqual(FeedEntry.objects.filter(post=post).count(), len(self.followers))
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        posts = [self.post_as(self.author, title=f'p{i}') for i in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stranger.following.add(self.author)
+        self.assertEqual(self.inbox(self.stranger), [post.pk for post in reversed(posts)])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.stranger.following.remove(self.author)
+        self.assertEqual(self.inbox(self.stranger), [])
+
+    def test_deleted_post_leaves_every_inbox(self):
+        post = self.post_as(self.author)
+        with self.captureOnCommitCallbacks(execute=True):
+            post.delete()
+        self.assertFalse(FeedEntry.objects.exists())
+
+    def test_rebuild_matches_fanout(self):
+        posts = [self.post_as(self.author, title=f'p{i}') for i in range(3)]
+        follower = self.followers[0]
+        FeedEntry.objects.filter(user=follower).delete()
+        rebuild_feed(follower.pk)
+        self.assertEqual(self.inbox(follower), [post.pk for post in reversed(posts)])
+
+
+class KeysetCursorTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader.following.add(self.author)
+        self.posts = [self.post_as(self.author, title=f'p{i}') for i in range(5)]
+        self.client = self.client_for(self.reader)
+
+    def collect(self, url):
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            seen += [item['id'] for item in response.json()['results']]
+            url = response.json()['next']
+        return seen
+
+    def test_cursor_round_trip(self):
+        pagination = KeysetPagination()
+        position = [self.posts[0].created_at, self.posts[0].pk]
+        self.assertEqual(pagination.decode_position(pagination.encode_cursor(position)), position)
+
+    def test_feed_pages_cover_every_post_once(self):
+        self.assertEqual(self.collect('/api/feed/?page_size=2'), [post.pk for post in reversed(self.posts)])
+
+    def test_comment_and_thread_pages_cover_every_comment_once(self):
+        post = self.posts[0]
+        comments = [Comment.objects.create(post=post, author=self.reader, content=str(i)) for i in range(5)]
+        ids = [comment.pk for comment in comments]
+        self.assertEqual(self.collect(f'/api/posts/{post.pk}/comments/?page_size=2'), ids[::-1])
+        self.assertEqual(self.collect(f'/api/posts/{post.pk}/thread/?page_size=2'), ids)
+
+    def test_malformed_cursors_are_not_found(self):
+        post = self.posts[0]
+        cases = {
+            '/api/feed/': [[1, 2], ['not a date', 1], ['2026-01-01T00:00:00Z', 'x'], [None, None], ['2026-13-45', 1]],
+            f'/api/posts/{post.pk}/comments/': [['x', 1], ['2026-01-01T00:00:00Z', True], ['2026-01-01', 2**64]],
+            f'/api/posts/{post.pk}/thread/': [[None], [1], [[]]],
+            f'/api/accounts/users/{self.author.pk}/followers/': [['x'], [1.5]],
+            '/api/notifications/': [[1, 2], ['x', 'y']],
+        }
+        for url, cursors in cases.items():
+            for values in cursors + ['not base64!', {'a': 1}, [1, 2, 3]]:
+                cursor = values if isinstance(values, str) else raw_cursor(values)
+                with self.subTest(url=url, cursor=values):
+                    response = self.client.get(url, {'cursor': cursor})
+                    self.assertEqual(response.status_code, 404)
+
+    def test_decode_position_rejects_wrong_types(self):
+        pagination = KeysetPagination()
+        for values in ([1, 2], ['2026-01-01T00:00:00Z', '1'], ['2026-01-01T00:00:00Z', False]):
+            with self.subTest(values=values), self.assertRaises(NotFound):
+                pagination.decode_position(raw_cursor(values))
+
+
+class FeedCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user(username='author')
+        self.other = User.objects.create_user(username='other')
+        self.reader = User.objects.create_user(username='reader')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader.following.add(self.author)
+        self.client = self.client_for(self.reader)
+
+    def feed_ids(self):
+        response = self.client.get('/api/feed/')
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.json()['results']]
+
+    def test_repeat_reads_are_served_from_cache(self):
+        first = self.post_as(self.author)
+        self.assertEqual(self.feed_ids(), [first.pk])
+        hits = feed_cache.metrics.hits
+        self.assertEqual(self.feed_ids(), [first.pk])
+        self.assertEqual(feed_cache.metrics.hits, hits + 1)
+
+    def test_stored_size_is_taken_from_the_rendered_pages(self):
+        self.post_as(self.author)
+        stored = feed_cache.metrics.stored_bytes
+        response = self.client.get('/api/feed/')
+        self.assertEqual(feed_cache.metrics.stored_bytes - stored, len(response.content))
+
+    def test_new_post_resets_follower_feeds(self):
+        first = self.post_as(self.author)
+        self.assertEqual(self.feed_ids(), [first.pk])
+        second = self.post_as(self.author)
+        self.assertEqual(self.feed_ids(), [second.pk, first.pk])
+
+    def test_follow_and_unfollow_reset_the_follower(self):
+        mine = self.post_as(self.author)
+        theirs = self.post_as(self.other)
+        self.assertEqual(self.feed_ids(), [mine.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader.following.add(self.other)
+        self.assertEqual(self.feed_ids(), [theirs.pk, mine.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader.following.remove(self.author)
+        self.assertEqual(self.feed_ids(), [theirs.pk])
+
+
+class PullTimelineTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        limit = mock.patch.object(timelines, 'FOLLOWER_LIMIT', 0)
+        limit.start()
+        self.addCleanup(limit.stop)
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.reader.following.add(self.author)
+        self.first = self.post_as(self.author)
+
+    def cached_timeline(self):
+        return cache.get(timelines.timeline_key(self.author.pk))
+
+    def test_new_post_is_inserted_into_cached_timeline(self):
+        timelines.author_timelines([self.author.pk])
+        second = self.post_as(self.author)
+        with self.assertNumQueries(0):
+            timeline = timelines.author_timelines([self.author.pk])[self.author.pk]
+        self.assertEqual([post_id for _, post_id in timeline], [second.pk, self.first.pk])
+
+    def test_pull_author_posts_reach_the_feed(self):
+        client = self.client_for(self.reader)
+        self.assertEqual([item['id'] for item in client.get('/api/feed/').json()['results']], [self.first.pk])
+        second = self.post_as(self.author)
+        # The cached page was built for the old timeline, so it is not served.
+        self.assertEqual(
+            [item['id'] for item in client.get('/api/feed/').json()['results']], [second.pk, self.first.pk]
+        )
+
+    def test_contended_insert_drops_the_timeline(self):
+        timelines.author_timelines([self.author.pk])
+        cache.add(f'{timelines.timeline_key(self.author.pk)}:lock', 1)
+        self.post_as(self.author)
+        self.assertIsNone(self.cached_timeline())
+
+    def test_delete_drops_the_timeline(self):
+        timelines.author_timelines([self.author.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first.delete()
+        self.assertIsNone(self.cached_timeline())
+
+
+class FragmentCacheTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user(username='author')
+        self.post = self.post_as(self.author)
+        self.client = self.client_for(self.author)
+        self.url = f'/api/posts/{self.post.pk}/'
+        trending_background = mock.patch.object(trending.engine, 'background', False)
+        trending_background.start()
+        self.addCleanup(trending_background.stop)
+
+    def test_fragments_match_plain_serialization(self):
+        Comment.objects.create(post=self.post, author=self.author, content='first')
+        cached = self.client.get(self.url).json()
+        with mock.patch.object(fragments, 'ENABLED', False):
+            self.assertEqual(self.client.get(self.url).json(), cached)
+
+    def test_warm_reads_skip_loading_the_post(self):
+        self.client.get(self.url)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(len(queries), 1)  # the stamp lookup
+
+    def test_fragments_use_their_own_cache(self):
+        self.client.get(self.url)
+        key = fragments.post_key(self.post.pk, post_stamps([self.post.pk])[self.post.pk])
+        self.assertIsNotNone(fragments.cache.get(key))
+        self.assertIsNone(cache.get(key))
+
+    def test_edits_and_comments_render_fresh_fragments(self):
+        self.client.get(self.url)
+        self.client.patch(self.url, {'title': 'edited'})
+        self.assertEqual(self.client.get(self.url).json()['title'], 'edited')
+        self.client.post('/api/comments/', {'post': self.post.pk, 'content': 'new'})
+        self.assertEqual([c['content'] for c in self.client.get(self.url).json()['latest_comments']], ['new'])
+
+
+class EngagementTestCase(APITestCase):
+    def setUp(self):
+        super().setUp()
+        trending_background = mock.patch.object(trending.engine, 'background', False)
+        trending_background.start()
+        self.addCleanup(trending_background.stop)
+        self.author = User.objects.create_user(username='author')
+        self.users = [User.objects.create_user(username=f'user{i}') for i in range(3)]
+        self.post = self.post_as(self.author)
+
+    def like(self, user, post=None):
+        return self.client_for(user).post(f'/api/posts/{(post or self.post).pk}/like/')
+
+    def unlike(self, user, post=None):
+        return self.client_for(user).post(f'/api/posts/{(post or self.post).pk}/unlike/')
+
+    def counts(self):
+        self.post.refresh_from_db()
+        return self.post.like_count, self.post.comment_count
+
+
+class CounterConsistencyTests(EngagementTestCase):
+    def test_like_count_follows_likes(self):
+        for user in self.users:
+            self.like(user)
+        self.like(self.users[0])
+        self.unlike(self.users[1])
+        self.unlike(self.users[1])
+        self.assertEqual(self.counts()[0], 2)
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 2)
+
+    def test_comment_count_follows_comments(self):
+        client = self.client_for(self.users[0])
+        ids = [client.post('/api/comments/', {'post': self.post.pk, 'content': str(i)}).json()['id'] for i in range(3)]
+        self.assertEqual(self.counts()[1], 3)
+        self.assertEqual(client.delete(f'/api/comments/{ids[0]}/').status_code, 204)
+        self.assertEqual(self.counts()[1], 2)
+
+    def test_reconcile_repairs_drift(self):
+        self.like(self.users[0])
+        Comment.objects.create(post=self.post, author=self.author, content='c')
+        Post.objects.filter(pk=self.post.pk).update(like_count=7, comment_count=0)
+        call_command('reconcile_counters', stdout=io.StringIO())
+        self.assertEqual(self.counts(), (1, 1))
+
+
+class IdempotentLikeTests(EngagementTestCase):
+    def test_repeated_like_and_unlike_change_nothing(self):
+        self.assertEqual(self.like(self.users[0]).json()['detail'], 'Post liked.')
+        self.assertEqual(self.like(self.users[0]).json()['detail'], 'You have already liked this post.')
+        self.assertEqual(NotificationEvent.objects.filter(recipient=self.author, verb='liked').count(), 1)
+        self.assertEqual(self.unlike(self.users[0]).json()['detail'], 'Post unliked.')
+        self.assertEqual(self.unlike(self.users[0]).json()['detail'], 'You have not liked this post.')
+        self.assertEqual(self.counts()[0], 0)
+        self.assertFalse(Like.objects.exists())
+
+    def test_missing_post_is_not_found(self):
+        missing = Post(pk=10**9)
+        self.assertEqual(self.like(self.users[0], missing).status_code, 404)
+        self.assertEqual(self.unlike(self.users[0], missing).status_code, 404)
+        self.assertFalse(Like.objects.exists())
+
+    def test_liking_own_post_notifies_nobody(self):
+        self.like(self.author)
+        self.assertEqual(self.counts()[0], 1)
+        self.assertFalse(NotificationEvent.objects.exists())
+
+
+class ConditionalGetTests(EngagementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.url = f'/api/posts/{self.post.pk}/'
+        self.client = self.client_for(self.users[0])
+
+    def etag(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response['ETag']
+
+    def test_matching_etag_is_not_modified(self):
+        etag = self.etag(self.url)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual((response.status_code, response.content), (304, b''))
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=f'W/{etag}').status_code, 304)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH='"other"').status_code, 200)
+
+    def test_likes_edits_and_comments_change_the_etag(self):
+        etags = [self.etag(self.url)]
+        self.like(self.users[1])
+        etags.append(self.etag(self.url))
+        self.client_for(self.author).patch(self.url, {'title': 'edited'})
+        etags.append(self.etag(self.url))
+        self.client.post('/api/comments/', {'post': self.post.pk, 'content': 'c'})
+        etags.append(self.etag(self.url))
+        self.assertEqual(len(set(etags)), 4)
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etags[0]).status_code, 200)
+
+    def test_feed_etag_changes_with_its_posts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[0].following.add(self.author)
+        etag = self.etag('/api/feed/')
+        self.assertEqual(self.client.get('/api/feed/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.post_as(self.author)
+        self.assertEqual(self.client.get('/api/feed/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        etag = self.etag('/api/feed/')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[0].following.remove(self.author)
+        self.assertEqual(self.client.get('/api/feed/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_feed_304_reads_no_posts(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.users[0].following.add(self.author)
+        etag = self.etag('/api/feed/')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/feed/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # Cold pull-author set: one query, then cached for every reader.
+        cache.delete(timelines.PULL_AUTHORS_KEY)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/feed/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_feed_304_for_a_pull_author_reader_is_one_lookup(self):
+        with mock.patch.object(timelines, 'FOLLOWER_LIMIT', 0):
+            cache.delete(timelines.PULL_AUTHORS_KEY)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.users[0].following.add(self.author)
+            etag = self.etag('/api/feed/')
+            with self.assertNumQueries(1):
+                self.assertEqual(self.client.get('/api/feed/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            # Pull-model posts are not fanned out; the pulled entries change the ETag.
+            self.post_as(self.author)
+            self.assertEqual(self.client.get('/api/feed/', HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class CommentPreviewTests(EngagementTestCase):
+    def test_posts_embed_only_the_newest_comments(self):
+        other = self.post_as(self.author)
+        comments = [Comment.objects.create(post=self.post, author=self.author, content=str(i)) for i in range(5)]
+        Comment.objects.create(post=other, author=self.author, content='other')
+        results = {item['id']: item for item in self.client_for(self.author).get('/api/posts/').json()['results']}
+        newest = [comment.pk for comment in reversed(comments)][:PREVIEW_SIZE]
+        self.assertEqual([item['id'] for item in results[self.post.pk]['latest_comments']], newest)
+        self.assertEqual([item['content'] for item in results[other.pk]['latest_comments']], ['other'])
+
+    def test_preview_query_count_does_not_grow_with_posts(self):
+        client = self.client_for(self.author)
+        with CaptureQueriesContext(connection) as one:
+            client.get('/api/posts/')
+        for index in range(4):
+            post = self.post_as(self.author, title=f'p{index}')
+            Comment.objects.create(post=post, author=self.author, content='c')
+        fragments.cache.clear()
+        with CaptureQueriesContext(connection) as many:
+            client.get('/api/posts/')
+        self.assertEqual(len(many), len(one))
+
+
+class ThreadTests(EngagementTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client = self.client_for(self.users[0])
+        # root -> (a -> (a1, a2 -> a2x), b)
+        self.root = self.reply('root')
+        self.a = self.reply('a', self.root)
+        self.a1 = self.reply('a1', self.a)
+        self.a2 = self.reply('a2', self.a)
+        self.a2x = self.reply('a2x', self.a2)
+        self.b = self.reply('b', self.root)
+
+    def reply(self, content, parent=None):
+        data = {'post': self.post.pk, 'content': content}
+        if parent is not None:
+            data['parent'] = parent.pk
+        response = self.client.post('/api/comments/', data)
+        self.assertEqual(response.status_code, 201)
+        return Comment.objects.get(pk=response.json()['id'])
+
+    def reply_counts(self):
+        return dict(Comment.objects.values_list('content', 'reply_count'))
+
+    def test_paths_and_counts(self):
+        self.assertEqual(
+            list(subtree(self.a).order_by('path').values_list('content', flat=True)), ['a', 'a1', 'a2', 'a2x']
+        )
+        self.assertEqual(self.a2x.depth, 3)
+        self.assertEqual(self.reply_counts(), {'root': 2, 'a': 2, 'a1': 0, 'a2': 1, 'a2x': 0, 'b': 0})
+        self.assertEqual(self.counts()[1], 6)
+
+    def test_deleting_a_reply_removes_its_subtree_from_the_counts(self):
+        self.assertEqual(self.client.delete(f'/api/comments/{self.a.pk}/').status_code, 204)
+        self.assertEqual(self.reply_counts(), {'root': 1, 'b': 0})
+        self.assertEqual(self.counts()[1], 2)
+        self.client.delete(f'/api/comments/{self.root.pk}/')
+        self.assertEqual(self.counts()[1], 0)
+        self.assertFalse(Comment.objects.exists())
+
+    def test_thread_page_nests_and_prunes(self):
+        def shape(nodes):
+            return [(node['content'], node['reply_count'], shape(node['replies'])) for node in nodes]
+
+        response = self.client.get(f'/api/posts/{self.post.pk}/thread/', {'depth': 2, 'replies': 1})
+        self.assertEqual(shape(response.json()['results']), [('root', 2, [('a', 2, [('a1', 0, [])])])])
+        response = self.client.get(f'/api/posts/{self.post.pk}/thread/', {'parent': self.a.pk})
+        self.assertEqual(shape(response.json()['results']), [('a1', 0, []), ('a2', 1, [('a2x', 0, [])])])
+
+    def test_replies_cannot_cross_posts_or_move(self):
+        other = self.post_as(self.author)
+        response = self.client.post('/api/comments/', {'post': other.pk, 'content': 'x', 'parent': self.a.pk})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.patch(f'/api/comments/{self.a1.pk}/', {'parent': self.b.pk})
+        self.assertEqual(response.status_code, 400)
+
+
+class ShardedLikeCounterTests(EngagementTestCase):
+    def setUp(self):
+        super().setUp()
+        sharded_mode = mock.patch.object(counters, 'MODE', 'sharded')
+        sharded_mode.start()
+        self.addCleanup(sharded_mode.stop)
+
+    def served_likes(self):
+        return self.client_for(self.author).get(f'/api/posts/{self.post.pk}/').json()['like_count']
+
+    def test_reads_include_unflushed_deltas(self):
+        for user in self.users:
+            self.like(user)
+        self.unlike(self.users[0])
+        self.assertEqual(self.counts()[0], 0)
+        self.assertEqual(self.served_likes(), 2)
+
+    def test_flush_folds_deltas_into_the_post(self):
+        for user in self.users:
+            self.like(user)
+        self.assertEqual(flush_like_shards(), (1, 3))
+        self.assertEqual(self.counts()[0], 3)
+        self.assertFalse(LikeCounterShard.objects.exclude(delta=0).exists())
+        self.unlike(self.users[0])
+        self.assertEqual(self.served_likes(), 2)
+        flush_like_shards()
+        self.assertEqual(self.counts()[0], 2)
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.author = User.objects.create_user(username='author')
+        self.posts = [
+            self.post_as(self.author, title='Django tips', content='caching querysets'),
+            self.post_as(self.author, title='Cooking', content='django reinhardt played jazz guitar'),
+            self.post_as(self.author, title='Gardening', content='tomatoes'),
+        ]
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f'{directory.name}/search.sqlite3'
+
+    def backends(self):
+        with override_settings(POSTS_SEARCH_SQLITE_PATH=self.path):
+            sqlite = search.SQLiteFTSBackend()
+        sqlite.index([(post.pk, post.title, post.content) for post in self.posts])
+        self.addCleanup(lambda: sqlite.connection.close())
+        return [search._backend, sqlite]
+
+    def ids(self, backend, query):
+        return [post_id for post_id, _ in backend.search(query, 10)]
+
+    def test_title_matches_rank_first_and_all_terms_must_match(self):
+        for backend in self.backends():
+            with self.subTest(backend=type(backend).__name__):
+                self.assertEqual(self.ids(backend, 'django'), [self.posts[0].pk, self.posts[1].pk])
+                self.assertEqual(self.ids(backend, 'django jazz'), [self.posts[1].pk])
+                self.assertEqual(self.ids(backend, 'NEAR OR "'), [])
+
+    def test_index_follows_edits_and_deletes(self):
+        first, second = self.posts[:2]
+        with self.captureOnCommitCallbacks(execute=True):
+            first.title = 'Flask tips'
+            first.content = 'nothing here'
+            first.save()
+            second.delete()
+        self.assertEqual(self.ids(search._backend, 'django'), [])
+        self.assertEqual(self.ids(search._backend, 'flask'), [first.pk])
+
+    def test_search_endpoint_pages_by_relevance(self):
+        client = self.client_for(self.author)
+        response = client.get('/api/search/', {'q': 'django'})
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.posts[0].pk, self.posts[1].pk])
+        response = client.get('/api/posts/', {'search': 'tomatoes'})
+        self.assertEqual([item['id'] for item in response.json()['results']], [self.posts[2].pk])
+
+
+class TrendingScoreTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.posts = [Post.objects.create(author=cls.author, title=f'p{i}', content='') for i in range(5)]
+
+    def test_add_scores_creates_and_merges_rows(self):
+        first, second = self.posts[0].pk, self.posts[1].pk
+        add_scores({first: 1.0})
+        add_scores({first: 2.0, second: 3.0})
+        scores = dict(TrendingScore.objects.values_list('post_id', 'log_score'))
+        self.assertAlmostEqual(scores[first], log_add(1.0, 2.0))
+        self.assertAlmostEqual(scores[second], 3.0)
+
+    def test_add_scores_survives_large_gaps(self):
+        # Engagement months apart puts the exponent far below exp()'s range.
+        post_id = self.posts[0].pk
+        add_scores({post_id: 0.0})
+        add_scores({post_id: 2000.0})
+        self.assertAlmostEqual(TrendingScore.objects.get(post_id=post_id).log_score, 2000.0)
+
+    def test_add_scores_batches_statements(self):
+        with CaptureQueriesContext(connection) as one:
+            add_scores({self.posts[0].pk: 1.0})
+        with CaptureQueriesContext(connection) as many:
+            add_scores({post.pk: 1.0 for post in self.posts})
+        self.assertEqual(len(many), len(one))
+
+    def test_add_scores_skips_deleted_posts(self):
+        add_scores({self.posts[0].pk: 1.0, 10**9: 1.0})
+        self.assertEqual(list(TrendingScore.objects.values_list('post_id', flat=True)), [self.posts[0].pk])
+
+    def test_record_does_not_write(self):
+        engine = TrendingEngine(background=False)
+        with self.assertNumQueries(0):
+            engine.record(self.posts[0].pk, 'like')
+        engine.flush()
+        self.assertEqual(TrendingScore.objects.count(), 1)
+        self.assertEqual(engine.trending(10)[0][0], self.posts[0].pk)
+
+    def test_later_engagement_ranks_higher(self):
+        engine = TrendingEngine(background=False)
+        engine.record(self.posts[0].pk, 'comment', at=EPOCH)
+        engine.record(self.posts[1].pk, 'like', at=EPOCH + timedelta(days=1))
+        self.assertEqual([post_id for post_id, _ in engine.trending(2)], [self.posts[1].pk, self.posts[0].pk])
+        self.assertTrue(math.isfinite(log_weight('like', EPOCH + timedelta(days=3650))))
@@ -0,0 +1,82 @@
+"""
+Reply threads.
+
+Comments form trees through Comment.parent. Each comment also stores its
+materialized path (the zero-padded ids from its root down to itself) and
+its depth, so:
+
+* ordering by path lists a thread depth-first, siblings oldest first;
+* a comment's whole subtree is the path range [path, path_end(path)), one
+  scan of the (post, path) index however deep or wide it is;
+* one level of that subtree is a range of the (post, depth, path) index, so
+  a page of siblings is a single keyset range and a subtree cut at some
+  depth costs one range per level, never reading the levels below.
+
+A thread page is a page of siblings under an anchor (a comment, or the post
+itself for top-level comments) plus their subtrees, cut at `depth` levels
+below the siblings and `replies` children per comment. One windowed scan
+over those levels picks the ids to show and a second query loads just
+those comments, however large the thread. Comments left out are still counted in their parent's
+reply_count; clients page through them by anchoring on that parent.
+"""
+from django.conf import settings
+from django.db.models import F, Q, Window
+from django.db.models.functions import RowNumber
+
+from .models import Comment
+
+# Paths hold at most 255 // Comment.PATH_WIDTH ids, so depth stays below 25.
+MAX_DEPTH = min(getattr(settings, 'POSTS_COMMENT_MAX_DEPTH', 16), 255 // Comment.PATH_WIDTH - 1)
+THREAD_DEPTH = getattr(settings, 'POSTS_THREAD_DEPTH', 3)
+REPLY_LIMIT = getattr(settings, 'POSTS_THREAD_REPLIES', 5)
+MAX_REPLY_LIMIT = getattr(settings, 'POSTS_THREAD_MAX_REPLIES', 50)
+
+
+def path_end(path):
+    """The smallest path past every path in `path`'s subtree."""
+    width = Comment.PATH_WIDTH
+    return path[:-width] + Comment.path_segment(int(path[-width:]) + 1)
+
+
+def subtree(comment):
+    """`comment` and all of its replies, at any depth."""
+    return Comment.objects.filter(post_id=comment.post_id, path__gte=comment.path, path__lt=path_end(comment.path))
+
+
+def children(post_id, parent=None):
+    """Replies to `parent`, or the post's top-level comments."""
+    if parent is None:
+        return Comment.objects.filter(post_id=post_id, depth=0)
+    return Comment.objects.filter(
+        post_id=post_id, depth=parent.depth + 1, path__gt=parent.path, path__lt=path_end(parent.path)
+    )
+
+
+def load_subtrees(post_id, siblings, depth=THREAD_DEPTH, replies=REPLY_LIMIT):
+    """
+    Return `siblings` (one page of comments sharing a parent, in path order)
+    and their replies down to `depth` levels below them, at most `replies`
+    per comment, as a depth-first list.
+    """
+    if not siblings:
+        return []
+    top = siblings[0].depth
+    rank = Window(RowNumber(), partition_by=F('parent_id'), order_by=F('path').asc())
+    rows = (
+        Comment.objects.filter(
+            post_id=post_id,
+            path__gte=siblings[0].path,
+            path__lt=path_end(siblings[-1].path),
+            depth__in=range(top, top + depth + 1),
+        )
+        .annotate(sibling_rank=rank)
+        .filter(Q(depth=top) | Q(sibling_rank__lte=replies))
+        .order_by('path')
+        .values_list('pk', 'parent_id', 'depth')
+    )
+    # A reply within the limit is still dropped if its parent was.
+    kept = set()
+    for pk, parent_id, comment_depth in rows:
+        if comment_depth == top or parent_id in kept:
+            kept.add(pk)
+    return list(Comment.objects.filter(pk__in=kept).select_related('author').order_by('path'))
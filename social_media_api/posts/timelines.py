@@ -0,0 +1,134 @@
+"""
+Pull-model feed support for authors with very large audiences.
+
+Fanning a post out to millions of inboxes is too expensive, so authors above
+FEED_FANOUT_FOLLOWER_LIMIT are skipped by posts.feed.fanout_post. Their recent
+posts are instead kept as a bounded per-author timeline in the cache and
+merged into each reader's feed at request time.
+
+A new post is inserted into its author's cached timeline rather than
+dropping it, so a popular author posting does not send every reader to the
+database at once. Deleting a post still drops the timeline.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Post
+
+User = get_user_model()
+Follow = User.following.through
+
+FOLLOWER_LIMIT = getattr(settings, 'FEED_FANOUT_FOLLOWER_LIMIT', 10000)
+TIMELINE_LENGTH = getattr(settings, 'FEED_TIMELINE_LENGTH', 500)
+TIMELINE_TTL = getattr(settings, 'FEED_TIMELINE_TTL', 60 * 60)
+PULL_AUTHORS_TTL = getattr(settings, 'FEED_PULL_AUTHORS_TTL', 10 * 60)
+MAX_PULL_AUTHORS = getattr(settings, 'FEED_PULL_MAX_AUTHORS', 200)
+TIMELINE_LOCK_TIMEOUT = getattr(settings, 'FEED_TIMELINE_LOCK_TIMEOUT', 10)
+
+PULL_AUTHORS_KEY = 'posts:pull_authors'
+
+
+def timeline_key(author_id):
+    return f'posts:timeline:{author_id}'
+
+
+def pull_author_ids():
+    """Ids of authors whose posts are pulled at read time rather than fanned out."""
+    author_ids = cache.get(PULL_AUTHORS_KEY)
+    if author_ids is None:
+        author_ids = frozenset(
+            User.objects.filter(followers_count__gt=FOLLOWER_LIMIT).values_list('pk', flat=True)
+        )
+        cache.set(PULL_AUTHORS_KEY, author_ids, PULL_AUTHORS_TTL)
+    return author_ids
+
+
+def invalidate_timeline(author_id):
+    cache.delete(timeline_key(author_id))
+
+
+def add_to_timeline(author_id, created_at, post_id):
+    """Insert a committed post into its author's cached timeline, if one is cached."""
+    key = timeline_key(author_id)
+    lock = f'{key}:lock'
+    if not cache.add(lock, 1, TIMELINE_LOCK_TIMEOUT):
+        # Another post by the same author is being inserted; rather than
+        # risk losing one of them, let the next read reload the timeline.
+        cache.delete(key)
+        return
+    try:
+        timeline = cache.get(key)
+        if timeline is None:
+            return
+        entry = (created_at, post_id)
+        if entry not in timeline:
+            timeline = sorted([entry, *timeline], reverse=True)[:TIMELINE_LENGTH]
+            cache.set(key, timeline, TIMELINE_TTL)
+    finally:
+        cache.delete(lock)
+
+
+def author_timelines(author_ids):
+    """
+    Return {author_id: [(created_at, post_id), ...]} newest first, at most
+    TIMELINE_LENGTH entries each. Cold authors are loaded together in one
+    windowed query and written back to the cache.
+    """
+    keys = {timeline_key(author_id): author_id for author_id in author_ids}
+    cached = cache.get_many(keys)
+    timelines = {keys[key]: value for key, value in cached.items()}
+
+    cold = [author_id for author_id in author_ids if author_id not in timelines]
+    if cold:
+        loaded = {author_id: [] for author_id in cold}
+        rows = (
+            Post.objects.filter(author_id__in=cold)
+            .annotate(rank=Window(
+                RowNumber(),
+                partition_by=[F('author_id')],
+                order_by=[F('created_at').desc(), F('id').desc()],
+            ))
+            .filter(rank__lte=TIMELINE_LENGTH)
+            .order_by('author_id', '-created_at', '-id')
+            .values_list('author_id', 'created_at', 'id')
+        )
+        for author_id, created_at, post_id in rows:
+            loaded[author_id].append((created_at, post_id))
+        cache.set_many({timeline_key(author_id): value for author_id, value in loaded.items()}, TIMELINE_TTL)
+        timelines.update(loaded)
+    return timelines
+
+
+def followed_pull_authors(user_id, limit=MAX_PULL_AUTHORS):
+    pull_ids = pull_author_ids()
+    if not pull_ids:
+        return []
+    return list(
+        Follow.objects.filter(from_user_id=user_id, to_user_id__in=pull_ids)
+        .order_by('-id')
+        .values_list('to_user_id', flat=True)[:limit]
+    )
+
+
+def merge_timelines(timelines, before=None, limit=None):
+    """
+    k-way merge of newest-first (created_at, post_id) lists using a heap,
+    yielding only entries strictly older than `before`.
+    """
+    streams = timelines
+    if before is not None:
+        streams = [(entry for entry in timeline if entry < before) for timeline in timelines]
+    return list(islice(heapq.merge(*streams, reverse=True), limit))
+
+
+def pull_entries(author_ids, before=None, limit=None):
+    """Merged timelines of `author_ids` (from followed_pull_authors)."""
+    if not author_ids:
+        return []
+    return merge_timelines(author_timelines(author_ids).values(), before=before, limit=limit)
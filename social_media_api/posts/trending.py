@@ -0,0 +1,166 @@
+"""
+Trending posts ranked by time-decayed engagement.
+
+Every like or comment adds weight * 2 ** ((t - EPOCH) / HALF_LIFE) to its
+post's score. The common decay factor 2 ** (-(now - EPOCH) / HALF_LIFE) is
+the same for all posts, so it is left out: scores only ever grow, ranking
+needs no periodic re-decay, and the current decayed value is recovered on
+read with decayed(). Scores are kept as natural logs and combined with
+log-add-exp so they stay finite however far from EPOCH events land.
+
+Each process buffers log-score deltas in memory; a background thread adds
+them to the TrendingScore rows every TRENDING_FLUSH_INTERVAL seconds, a
+batch of posts per statement, so requests never wait on a flush. It also
+holds the TRENDING_TOP_K best rows, reloaded after each flush and at least
+every TRENDING_REFRESH_INTERVAL seconds, so the trending list is served from
+memory. Deltas still buffered when a process exits are lost;
+`manage.py replay_trending` rebuilds every score from Like and Comment rows.
+"""
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, F, Value, When
+from django.db.models.functions import Abs, Exp, Greatest, Ln
+from django.utils import timezone
+
+from .models import Post, TrendingScore
+
+logger = logging.getLogger(__name__)
+
+HALF_LIFE = getattr(settings, 'TRENDING_HALF_LIFE', 6 * 60 * 60)
+WEIGHTS = getattr(settings, 'TRENDING_WEIGHTS', {'like': 1.0, 'comment': 3.0})
+TOP_K = getattr(settings, 'TRENDING_TOP_K', 100)
+FLUSH_INTERVAL = getattr(settings, 'TRENDING_FLUSH_INTERVAL', 10)
+FLUSH_BATCH_SIZE = getattr(settings, 'TRENDING_FLUSH_BATCH_SIZE', 500)
+BACKGROUND_FLUSH = getattr(settings, 'TRENDING_BACKGROUND_FLUSH', True)
+REFRESH_INTERVAL = getattr(settings, 'TRENDING_REFRESH_INTERVAL', 30)
+
+EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+RATE = math.log(2) / HALF_LIFE
+# exp() underflows (PostgreSQL raises) below about -745; log1p(exp(-700))
+# is already 0 in double precision, so clamping changes no result.
+MIN_EXPONENT = -700.0
+# Score of a row created only to be merged into; any delta dominates it.
+FLOOR = -1e300
+
+
+def log_weight(kind, at):
+    return math.log(WEIGHTS[kind]) + RATE * (at - EPOCH).total_seconds()
+
+
+def log_add(a, b):
+    if a is None:
+        return b
+    high, low = max(a, b), min(a, b)
+    return high + math.log1p(math.exp(low - high))
+
+
+def decayed(log_score, now=None):
+    """The score's value at `now`, in weighted events."""
+    now = now or timezone.now()
+    return math.exp(log_score - RATE * (now - EPOCH).total_seconds())
+
+
+def merge_expression(log_delta):
+    # log_add(log_score, delta) in SQL.
+    delta = Value(log_delta)
+    exponent = Greatest(-Abs(F('log_score') - delta), Value(MIN_EXPONENT))
+    return Greatest(F('log_score'), delta) + Ln(Value(1.0) + Exp(exponent))
+
+
+def add_scores(deltas, batch_size=FLUSH_BATCH_SIZE):
+    """Add {post_id: log_delta} to the stored scores, creating rows as needed."""
+    post_ids = sorted(Post.objects.filter(pk__in=deltas).values_list('pk', flat=True))
+    for start in range(0, len(post_ids), batch_size):
+        batch = post_ids[start:start + batch_size]
+        with transaction.atomic():
+            # Missing rows are created at FLOOR so that one UPDATE can merge
+            # every delta; rows are locked in post order to avoid deadlocks
+            # between processes flushing overlapping batches.
+            TrendingScore.objects.bulk_create(
+                [TrendingScore(post_id=post_id, log_score=FLOOR) for post_id in batch], ignore_conflicts=True
+            )
+            list(TrendingScore.objects.select_for_update().filter(post_id__in=batch).order_by('post_id')
+                 .values_list('post_id', flat=True))
+            TrendingScore.objects.filter(post_id__in=batch).update(
+                log_score=Case(*[When(post_id=post_id, then=merge_expression(deltas[post_id])) for post_id in batch])
+            )
+
+
+class TrendingEngine:
+    def __init__(self, top_k=TOP_K, background=True):
+        self.top_k = top_k
+        self.background = background
+        self.lock = threading.Lock()
+        self.pending = {}  # post_id -> log delta not yet written
+        self.top = []  # [(log_score, post_id), ...] best first, as last read
+        self.last_refresh = None
+        self.flusher = None
+
+    def record(self, post_id, kind, at=None):
+        term = log_weight(kind, at or timezone.now())
+        with self.lock:
+            self.pending[post_id] = log_add(self.pending.get(post_id), term)
+            start = self.background and (self.flusher is None or not self.flusher.is_alive())
+            if start:
+                self.flusher = threading.Thread(target=self.run_flusher, name='trending-flush', daemon=True)
+        if start:
+            self.flusher.start()
+
+    def run_flusher(self):
+        while True:
+            time.sleep(FLUSH_INTERVAL)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Trending flush failed; deltas kept for the next one')
+            finally:
+                # This thread's own connection; don't hold it between flushes.
+                connection.close()
+
+    def flush(self):
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if pending:
+            try:
+                add_scores(pending)
+            except Exception:
+                with self.lock:
+                    for post_id, term in pending.items():
+                        self.pending[post_id] = log_add(self.pending.get(post_id), term)
+                raise
+        self.refresh()
+
+    def refresh(self):
+        rows = TrendingScore.objects.order_by('-log_score').values_list('log_score', 'post_id')[:self.top_k]
+        top = list(rows)
+        with self.lock:
+            self.top = top
+            self.last_refresh = time.monotonic()
+
+    def trending(self, limit):
+        """Return [(post_id, log_score), ...] best first, at most `limit` (<= top_k)."""
+        if self.last_refresh is None or time.monotonic() - self.last_refresh >= REFRESH_INTERVAL:
+            self.refresh()
+        with self.lock:
+            scores = {post_id: log_score for log_score, post_id in self.top}
+            # Unflushed local activity: added to stored scores where known,
+            # otherwise counted on its own (a lower bound).
+            for post_id, term in self.pending.items():
+                scores[post_id] = log_add(scores.get(post_id), term)
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:min(limit, self.top_k)]
+
+
+engine = TrendingEngine(background=BACKGROUND_FLUSH)
+
+
+def record_engagement(post_id, kind):
+    """Count a like or comment on `post_id` once the current transaction commits."""
+    at = timezone.now()
+    transaction.on_commit(lambda: engine.record(post_id, kind, at))
@@ -4,6 +4,10 @@ from .views import (
     PostViewSet,
     CommentViewSet,
     feed,
+    search_posts,
+    trending,
+    post_comments,
+    post_thread,
     like_post,
     unlike_post
 )
@@ -15,6 +19,10 @@ router.register(r'comments', CommentViewSet, basename='comments')
 urlpatterns = [
     path('', include(router.urls)),
     path('feed/', feed, name='feed'),
+    path('search/', search_posts, name='search-posts'),
+    path('trending/', trending, name='trending'),
+    path('posts/<int:pk>/comments/', post_comments, name='post-comments'),
+    path('posts/<int:pk>/thread/', post_thread, name='post-thread'),
     path('posts/<int:pk>/like/', like_post, name='like-post'),
     path('posts/<int:pk>/unlike/', unlike_post, name='unlike-post'),
 ]
@@ -1,41 +1,271 @@
-from rest_framework import status, permissions
+import heapq
+
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.http import Http404
+from django_filters.rest_framework import DjangoFilterBackend
+from rest_framework import status, permissions, viewsets
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.pagination import PageNumberPagination
-from rest_framework import generics
-from .models import Post, Like
-from .serializers import PostSerializer
-from notifications.models import Notification
+from .models import Post, Comment, FeedEntry
+from .serializers import PostSerializer, CommentSerializer
+from .pagination import CommentPagination, FeedPagination, SearchPagination, ThreadPagination
+from .filters import PostSearchFilter
+from .search import search
+from .etags import post_stamps, post_etag, feed_etag, not_modified, stamp_queryset
+from .fragments import (
+    assemble, json_response, post_fragments, render_comments, render_posts, render_thread, with_member,
+)
+from .threads import MAX_DEPTH, MAX_REPLY_LIMIT, REPLY_LIMIT, THREAD_DEPTH, children, load_subtrees, subtree
+from .trending import TOP_K, decayed, engine as trending_engine, record_engagement
+from .timelines import followed_pull_authors, pull_entries
+from .feed_cache import cached_page, feed_version
+from .counters import with_pending_likes
+from .likes import add_like, remove_like, EXISTS, MISSING
+from notifications.outbox import enqueue as enqueue_notification
+
+
+class IsAuthorOrReadOnly(permissions.BasePermission):
+    def has_object_permission(self, request, view, obj):
+        if request.method in permissions.SAFE_METHODS:
+            return True
+        return obj.author == request.user
+
+
+class PostViewSet(viewsets.ModelViewSet):
+    queryset = Post.objects.select_related('author').order_by('-created_at')
+    serializer_class = PostSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+    filter_backends = [DjangoFilterBackend, PostSearchFilter]
+
+    def get_queryset(self):
+        return with_pending_likes(super().get_queryset())
+
+    def load_posts(self, post_ids):
+        return self.get_queryset().in_bulk(post_ids)
+
+    def list(self, request, *args, **kwargs):
+        # Paginate bare (id, version, likes) stamps; whole posts are only
+        # loaded for fragments missing from the cache (see posts.fragments).
+        stamps = self.paginate_queryset(stamp_queryset(self.filter_queryset(Post.objects.order_by('-created_at'))))
+        fragments = render_posts(
+            [pk for pk, _, _ in stamps], {pk: (version, likes) for pk, version, likes in stamps}, self.load_posts
+        )
+        envelope = self.get_paginated_response(None).data
+        return json_response(request, assemble(envelope, fragments))
+
+    def retrieve(self, request, *args, **kwargs):
+        # Decide on a 304 from the post's stamp before loading or serializing it.
+        try:
+            pk = int(kwargs['pk'])
+        except ValueError:
+            raise Http404
+        stamp = post_stamps([pk]).get(pk)
+        if stamp is None:
+            raise Http404
+        etag = post_etag(pk, stamp)
+        response = not_modified(request, etag)
+        if response is None:
+            fragments = render_posts([pk], {pk: stamp}, self.load_posts)
+            if not fragments:
+                raise Http404
+            response = json_response(request, fragments[0])
+        response['ETag'] = etag
+        return response
+
+
+class CommentViewSet(viewsets.ModelViewSet):
+    queryset = Comment.objects.select_related('author').order_by('-created_at')
+    serializer_class = CommentSerializer
+    permission_classes = [permissions.IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly]
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.filter_queryset(self.get_queryset()))
+        envelope = self.get_paginated_response(None).data
+        return json_response(request, assemble(envelope, render_comments(page)))
+
+    @transaction.atomic
+    def perform_create(self, serializer):
+        comment = serializer.save(author=self.request.user)
+        Post.objects.filter(pk=comment.post_id).update(
+            comment_count=F('comment_count') + 1, version=F('version') + 1
+        )
+        if comment.parent_id:
+            Comment.objects.filter(pk=comment.parent_id).update(reply_count=F('reply_count') + 1)
+        record_engagement(comment.post_id, 'comment')
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        comment = serializer.save()
+        Post.objects.filter(pk=comment.post_id).update(version=F('version') + 1)
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        # Replies are deleted along with the comment.
+        removed = subtree(instance).count()
+        instance.delete()
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=Greatest(F('comment_count') - removed, 0), version=F('version') + 1
+        )
+        if instance.parent_id:
+            Comment.objects.filter(pk=instance.parent_id).update(reply_count=Greatest(F('reply_count') - 1, 0))
+
+
+def _feed_page(request, paginator, size, position, pull_authors, pulled, etag):
+    """
+    Build a feed page {'content', 'etag'}, content being the rendered JSON;
+    returns (page, next cursor, follows pull authors).
+    """
+    entries = FeedEntry.objects.filter(user=request.user).order_by(*paginator.ordering)
+    if position is not None:
+        entries = entries.filter(paginator.filter_after(position))
+    inbox = [(entry.created_at, entry.post_id) for entry in entries.only('created_at', 'post_id')[:size + 1]]
+
+    rows, seen = [], set()
+    for created_at, post_id in heapq.merge(inbox, pulled, reverse=True):
+        if post_id not in seen:
+            seen.add(post_id)
+            rows.append(FeedEntry(post_id=post_id, created_at=created_at))
+    result_page = paginator.paginate_rows(rows[:size + 1], request, size)
+    post_ids = [entry.post_id for entry in result_page]
+    next_cursor = paginator.encode_cursor(paginator.next_position) if paginator.next_position else None
+
+    posts = with_pending_likes(Post.objects.select_related('author'))
+    fragments = render_posts(post_ids, post_stamps(post_ids), posts.in_bulk)
+    content = assemble({'next': paginator.get_next_link(), 'results': None}, fragments)
+    return {'content': content, 'etag': etag}, next_cursor, bool(pull_authors)
 
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def feed(request):
-    following_users = request.user.following.all()
-    posts = Post.objects.filter(author__in=following_users).order_by('-created_at')
+    # Posts of regular authors come from the user's materialized inbox (see
+    # posts.feed); posts of high-follower authors are merged in from cached
+    # per-author timelines (see posts.timelines). The first pages are served
+    # from a per-user cache (see posts.feed_cache).
+    paginator = FeedPagination()
+    size = paginator.get_page_size(request)
+    cursor = request.query_params.get(paginator.cursor_query_param, '')
+    position = paginator.decode_cursor(request)
+
+    # The ETag needs only the feed version and the pulled entries, so a 304
+    # is decided before the inbox or any post is read (see posts.etags).
+    pull_authors = followed_pull_authors(request.user.pk)
+    pulled = pull_entries(pull_authors, before=tuple(position) if position else None, limit=size + 1)
+    etag = feed_etag(feed_version(request.user.pk), size, cursor, pulled)
+    response = not_modified(request, etag)
+    if response is None:
+        def build():
+            return _feed_page(request, paginator, size, position, pull_authors, pulled, etag)
 
-    paginator = PageNumberPagination()
-    paginator.page_size = 10
-    result_page = paginator.paginate_queryset(posts, request)
-    serializer = PostSerializer(result_page, many=True)
-    return paginator.get_paginated_response(serializer.data)
+        page = cached_page(request.user.pk, size, cursor, etag, build)
+        if page is None:
+            page = build()[0]
+        response = json_response(request, page['content'])
+    response['ETag'] = etag
+    return response
+
+
+def _scored_fragments(hits):
+    """Post fragments for [(post_id, score), ...], each with a 'score' member."""
+    post_ids = [post_id for post_id, _ in hits]
+    posts = with_pending_likes(Post.objects.select_related('author'))
+    fragments = post_fragments(post_ids, post_stamps(post_ids), posts.in_bulk)
+    return [
+        with_member(fragments[post_id], 'score', round(score, 4)) for post_id, score in hits if post_id in fragments
+    ]
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticatedOrReadOnly])
+def search_posts(request):
+    # Ranked ids come from the search index (see posts.search); the page's
+    # posts are then rendered from cached fragments or loaded in one query.
+    query = request.query_params.get('q', '').strip()
+    paginator = SearchPagination()
+    hits = paginator.paginate_hits(lambda limit, offset: search(query, limit, offset), request)
+    fragments = _scored_fragments(hits)
+    return json_response(request, assemble(paginator.get_paginated_response(None).data, fragments))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticatedOrReadOnly])
+def trending(request):
+    try:
+        limit = max(1, min(int(request.query_params.get('limit', 20)), TOP_K))
+    except ValueError:
+        limit = 20
+    ranked = trending_engine.trending(limit)
+    fragments = _scored_fragments([(post_id, decayed(log_score)) for post_id, log_score in ranked])
+    return json_response(request, assemble({'results': None}, fragments))
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticatedOrReadOnly])
+def post_comments(request, pk):
+    # Everything past the preview embedded in the post, newest first, one
+    # (post, -created_at, -id) index range per page.
+    if not Post.objects.filter(pk=pk).exists():
+        raise Http404
+    paginator = CommentPagination()
+    page = paginator.paginate_queryset(Comment.objects.filter(post_id=pk).select_related('author'), request)
+    return json_response(request, assemble(paginator.get_paginated_response(None).data, render_comments(page)))
+
+
+def _bounded_param(request, name, default, high):
+    try:
+        return max(0, min(int(request.query_params.get(name, default)), high))
+    except ValueError:
+        return default
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticatedOrReadOnly])
+def post_thread(request, pk):
+    # A page of top-level comments, or of the replies to ?parent=<comment
+    # id>, each with its replies nested ?depth= levels deep and at most
+    # ?replies= per comment. See posts.threads.
+    parent_id = request.query_params.get('parent')
+    if parent_id:
+        try:
+            parent = Comment.objects.only('pk', 'path', 'depth').get(pk=int(parent_id), post_id=pk)
+        except (ValueError, Comment.DoesNotExist):
+            raise Http404
+    elif Post.objects.filter(pk=pk).exists():
+        parent = None
+    else:
+        raise Http404
+    siblings = children(pk, parent).only('pk', 'path', 'depth')
+
+    paginator = ThreadPagination()
+    page = paginator.paginate_queryset(siblings, request)
+    depth = _bounded_param(request, 'depth', THREAD_DEPTH, MAX_DEPTH)
+    replies = _bounded_param(request, 'replies', REPLY_LIMIT, MAX_REPLY_LIMIT)
+    comments = load_subtrees(pk, page, depth, replies)
+    return json_response(request, assemble(paginator.get_paginated_response(None).data, render_thread(comments)))
 
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@transaction.atomic
 def like_post(request, pk):
-    post = generics.get_object_or_404(Post, pk=pk)  
-
-    like, created = Like.objects.get_or_create(user=request.user, post=post) 
-    if not created:
-        return Response({'detail': 'You have already liked this post.'}, status=status.HTTP_400_BAD_REQUEST)
+    # One conflict-ignoring insert that also yields the author id; see posts.likes.
+    result, author_id = add_like(request.user.pk, pk)
+    if result == MISSING:
+        raise Http404
+    if result == EXISTS:
+        return Response({'detail': 'You have already liked this post.'}, status=status.HTTP_200_OK)
 
-    if post.author != request.user:
-        Notification.objects.create(
-            recipient=post.author,
-            actor=request.user,
+    record_engagement(pk, 'like')
+    if author_id != request.user.pk:
+        enqueue_notification(
+            recipient_id=author_id,
+            actor_id=request.user.pk,
             verb='liked',
-            target=post
+            target_type=ContentType.objects.get_for_model(Post),
+            target_id=pk,
         )
 
     return Response({'detail': 'Post liked.'}, status=status.HTTP_200_OK)
@@ -43,12 +273,11 @@ def like_post(request, pk):
 
 @api_view(['POST'])
 @permission_classes([permissions.IsAuthenticated])
+@transaction.atomic
 def unlike_post(request, pk):
-    post = generics.get_object_or_404(Post, pk=pk) 
-    try:
-        like = Like.objects.get(user=request.user, post=post) 
-    except Like.DoesNotExist:
-        return Response({'detail': 'Like not found.'}, status=status.HTTP_404_NOT_FOUND)
-
-    like.delete()
+    removed = remove_like(request.user.pk, pk)
+    if removed is None:
+        raise Http404
+    if not removed:
+        return Response({'detail': 'You have not liked this post.'}, status=status.HTTP_200_OK)
     return Response({'detail': 'Post unliked.'}, status=status.HTTP_200_OK)
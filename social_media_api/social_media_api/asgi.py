@@ -13,4 +13,17 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_media_api.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+from notifications.asgi import StreamingASGIHandler  # noqa: E402  (needs apps loaded)
+
+streaming_application = StreamingASGIHandler()
+
+# Long-lived notification endpoints bypass the sync-only middleware stack.
+STREAMING_PATHS = ('/api/notifications/stream/', '/api/notifications/poll/')
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] in STREAMING_PATHS:
+        return await streaming_application(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -0,0 +1,28 @@
+"""
+The default cache must be shared by every process.
+
+Feed pages, author timelines, authenticated users and unread counts are
+cached in it and invalidated by whichever process handles the change: any
+web worker, or the notification outbox drainer. With a process-local backend
+other processes keep serving what they cached until it expires.
+"""
+from django.core import checks
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+
+
+def is_process_local(alias='default'):
+    return isinstance(caches[alias], LocMemCache)
+
+
+def check_shared_cache(app_configs, **kwargs):
+    if not is_process_local():
+        return []
+    return [
+        checks.Warning(
+            "The default cache is process-local.",
+            hint="Configure a shared backend such as Redis (REDIS_URL); feed, timeline, auth and unread count "
+                 "invalidations are not seen by other processes otherwise.",
+            id='social_media_api.W001',
+        )
+    ]
@@ -0,0 +1,133 @@
+import base64
+import json
+from datetime import datetime, timezone as dt_timezone
+
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Opaque cursor pagination over a composite, unique ordering such as
+    ('-created_at', '-id'). Each page is a single range scan starting after
+    the last row of the previous page, so there is no COUNT(*) and no OFFSET,
+    and rows inserted while a client is paging never shift page boundaries.
+    """
+    page_size = 10
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    ordering = ('-created_at', '-id')
+    # Type of each ordering column: datetime, int or str.
+    ordering_types = (datetime, int)
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, position):
+        values = [value.isoformat() if isinstance(value, datetime) else value for value in position]
+        return base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode()).decode()
+
+    def decode_raw(self, encoded):
+        try:
+            return base64.urlsafe_b64decode(encoded.encode()).decode()
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        return self.decode_position(encoded)
+
+    def decode_position(self, encoded):
+        try:
+            values = json.loads(self.decode_raw(encoded))
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return [self.parse_value(value, kind) for value, kind in zip(values, self.ordering_types)]
+
+    def parse_value(self, value, kind):
+        # Cursors come from clients: anything that is not a value the
+        # ordering column could hold is rejected before it reaches a query.
+        if kind is datetime and isinstance(value, str):
+            try:
+                parsed = parse_datetime(value)
+            except ValueError:
+                parsed = None
+            if parsed is not None:
+                return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed, dt_timezone.utc)
+        elif kind is int and type(value) is int and -2**63 <= value < 2**63:
+            return value
+        elif kind is str and isinstance(value, str):
+            return value
+        raise NotFound(self.invalid_cursor_message)
+
+    def get_position(self, obj):
+        if isinstance(obj, dict):
+            return [obj[field.lstrip('-')] for field in self.ordering]
+        return [getattr(obj, field.lstrip('-')) for field in self.ordering]
+
+    def filter_after(self, position):
+        # (a, b) after (x, y) == a beyond x OR (a = x AND b beyond y). The
+        # redundant inclusive bound on the leading column lets the database
+        # seek straight into the index instead of evaluating the OR per row.
+        condition = Q()
+        equal = {}
+        for field, value in zip(self.ordering, position):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        lead = self.ordering[0]
+        bound = Q(**{f"{lead.lstrip('-')}__{'lte' if lead.startswith('-') else 'gte'}": position[0]})
+        return bound & condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        size = self.get_page_size(request)
+        position = self.decode_cursor(request)
+
+        queryset = queryset.order_by(*self.ordering)
+        if position is not None:
+            queryset = queryset.filter(self.filter_after(position))
+
+        return self.paginate_rows(list(queryset[:size + 1]), request, size)
+
+    def paginate_rows(self, rows, request, size):
+        """Cut a page from up to size + 1 rows already fetched in cursor order."""
+        self.request = request
+        self.has_next = len(rows) > size
+        rows = rows[:size]
+        self.next_position = self.get_position(rows[-1]) if self.has_next else None
+        return rows
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
@@ -111,6 +111,28 @@ DATABASES = {
 }
 
 
+# Cache
+# Must be shared by all processes (web workers and the notification outbox
+# drainer): feed pages, timelines, auth lookups and unread counts are
+# invalidated through it. See social_media_api/caches.py.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0'),
+        'KEY_PREFIX': 'social_media_api',
+    },
+    # Pre-rendered post and comment JSON (posts.fragments). Keys are
+    # versioned, so a process-local cache is fine here.
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'TIMEOUT': 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 20_000},
+    },
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
 
@@ -161,10 +183,10 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 10,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
-        'rest_framework.filters.SearchFilter'
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
+        'accounts.authentication.CachedTokenAuthentication',
     ),
 }
 
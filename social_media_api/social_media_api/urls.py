@@ -23,5 +23,6 @@ urlpatterns = [
     path('', home, name='home'),
     path('admin/', admin.site.urls),
     path('api/accounts/', include('accounts.urls')),
+    path('api/notifications/', include('notifications.urls')),
     path('api/', include('posts.urls')),
 ]